@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
-from datetime import datetime, timedelta
-import io
+from datetime import datetime
+
+import strava_dashboard as core
+from strava_dashboard import charts
 
 # Page configuration
 st.set_page_config(
@@ -37,151 +37,204 @@ st.markdown("""
 st.markdown('<div class="header-title">🏃 Strava Activities Dashboard</div>', unsafe_allow_html=True)
 st.markdown("Analyze your fitness data with interactive charts and insights")
 
+# Opt-in timings of each stage of this rerun (STRAVA_DASHBOARD_PROFILE or
+# STRAVA_DASHBOARD_PROFILE_LOG), shown under Performance; None when off
+timer = core.StageTimer.from_env()
+
+# (title, serialized size) of each chart sent to the browser, listed under
+# Performance; only measured when profiling, as it serializes the chart again
+chart_payloads = []
+
+
+def show_chart(fig):
+    with core.stage(timer, f"serialize: {fig.layout.title.text}"):
+        if timer is not None:
+            chart_payloads.append((fig.layout.title.text, charts.payload_bytes(fig)))
+        st.plotly_chart(fig, use_container_width=True)
+
+
 # Sidebar for file upload
 st.sidebar.header("📁 Upload Your Data")
 uploaded_file = st.sidebar.file_uploader(
-    "Upload your Strava activities CSV file",
-    type=['csv'],
-    help="Export your activities from Strava and upload the CSV file here"
+    "Upload your Strava activities CSV file or export ZIP",
+    type=['csv', 'zip'],
+    help="Export your activities from Strava and upload the archive's ZIP file, or the activities.csv inside it"
 )
 
 # Initialize session state for data
 if uploaded_file is not None:
     # Load and process data
+    # (the resolved column schema is cached together with the frame, and
+    # the processed frame is also kept in an on-disk cache shared across
+    # restarts and replicas)
+    @st.cache_resource
+    def get_activity_cache():
+        return core.ActivityCache.from_env()
+
+    # (``_timer`` is not part of the cache key; its stages only show up when
+    # the file is actually parsed)
     @st.cache_data
-    def load_data(file):
-        df = pd.read_csv(file)
-        return df
-    
-    df = load_data(uploaded_file)
-    
-    # Data preprocessing
+    def load_dataset(file, _timer=None):
+        return core.load_dataset(
+            file, cache=get_activity_cache(), memory_budget=core.memory_budget_from_env(), timer=_timer
+        )
+
+    # With STRAVA_DASHBOARD_STORE set, each export is merged into a saved
+    # history and only activities not seen before are parsed
     @st.cache_data
-    def preprocess_data(df):
-        df_processed = df.copy()
-        
-        # Convert date column to datetime
-        if 'Activity Date' in df_processed.columns:
-            df_processed['Activity Date'] = pd.to_datetime(df_processed['Activity Date'])
-        elif 'Date' in df_processed.columns:
-            df_processed['Date'] = pd.to_datetime(df_processed['Date'])
-        
-        # Handle distance column - convert to numeric
-        distance_cols = [col for col in df_processed.columns if 'distance' in col.lower()]
-        for col in distance_cols:
-            if df_processed[col].dtype == 'object':
-                df_processed[col] = pd.to_numeric(df_processed[col].str.replace(',', ''), errors='coerce')
-        
-        # Handle elevation column
-        elevation_cols = [col for col in df_processed.columns if 'elevation' in col.lower()]
-        for col in elevation_cols:
-            if df_processed[col].dtype == 'object':
-                df_processed[col] = pd.to_numeric(df_processed[col].str.replace(',', ''), errors='coerce')
-        
-        # Handle calories column
-        calorie_cols = [col for col in df_processed.columns if 'calories' in col.lower() or 'kilocalories' in col.lower()]
-        for col in calorie_cols:
-            if df_processed[col].dtype == 'object':
-                df_processed[col] = pd.to_numeric(df_processed[col].str.replace(',', ''), errors='coerce')
-        
-        # Handle HR columns
-        hr_cols = [col for col in df_processed.columns if 'heart rate' in col.lower() or 'avg hr' in col.lower() or 'max hr' in col.lower()]
-        for col in hr_cols:
-            if df_processed[col].dtype == 'object':
-                df_processed[col] = pd.to_numeric(df_processed[col].str.replace(',', ''), errors='coerce')
-        
-        # Handle time columns
-        time_cols = [col for col in df_processed.columns if 'moving time' in col.lower() or 'elapsed time' in col.lower()]
-        for col in time_cols:
-            if df_processed[col].dtype == 'object':
-                try:
-                    df_processed[col] = pd.to_timedelta(df_processed[col])
-                except:
-                    pass
-        
-        return df_processed
-    
-    df = preprocess_data(df)
-    
+    def ingest_dataset(file, _timer=None):
+        return core.ActivityStore.from_env().ingest(file, memory_budget=core.memory_budget_from_env(), timer=_timer)
+
+    try:
+        if core.ActivityStore.from_env() is not None:
+            with core.stage(timer, "load"):
+                df, schema, added = ingest_dataset(uploaded_file, timer)
+            st.sidebar.caption(f"{added} new activities imported ({len(df)} in history)")
+        else:
+            with core.stage(timer, "load"):
+                df, schema = load_dataset(uploaded_file, timer)
+    except MemoryError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+
+    # Durations that could not be read are left empty rather than dropped silently
+    unparsed_durations = {col: count for col, count in df.attrs.get('unparsed_durations', {}).items() if count}
+    if unparsed_durations:
+        st.sidebar.warning(
+            "⚠️ Unreadable durations left empty: "
+            + ", ".join(f"{col} ({count})" for col, count in unparsed_durations.items())
+        )
+
+    # An export ZIP also holds each activity's GPX/FIT/TCX file; they are
+    # indexed from the ZIP directory and only decompressed when parsed
+    @st.cache_resource(max_entries=8)
+    def open_archive(_file, dataset_key):
+        data = _file.getvalue()
+        return core.StravaArchive(data) if core.is_zip(data) else None
+
+    # Parsed GPS tracks, full and simplified, shared by every session
+    @st.cache_resource
+    def get_track_store():
+        return core.TrackStore.from_env()
+
+    dataset_key = df.attrs['content_hash']
+    archive = open_archive(uploaded_file, dataset_key)
+    track_store = get_track_store() if archive is not None else None
+
+    # GPS files not processed yet are parsed across worker processes, then
+    # each activity gets its GPS distance, moving time, elevation gain and
+    # start position
+    if track_store is not None and schema.filename:
+        missing_files = track_store.missing_files(archive)
+        if missing_files:
+            track_progress = st.sidebar.progress(0.0, text=f"Processing {len(missing_files):,} GPS files...")
+            with core.stage(timer, "tracks"):
+                track_store.process(
+                    archive,
+                    missing_files,
+                    progress=lambda done, total: track_progress.progress(
+                        done / total, text=f"Processed {done:,} of {total:,} GPS files"
+                    )
+                )
+            track_progress.empty()
+
+        @st.cache_resource(max_entries=8)
+        def add_track_summaries(_df, _schema, _archive, dataset_key):
+            return core.add_track_summaries(_df, _schema, _archive, track_store)
+
+        with core.stage(timer, "track summaries"):
+            df = add_track_summaries(df, schema, archive, dataset_key)
+        schema = core.resolve_schema(df.columns)
+        dataset_key = f"{dataset_key}-gps"
+
     # Get column names dynamically
-    date_col = 'Activity Date' if 'Activity Date' in df.columns else 'Date' if 'Date' in df.columns else None
-    
-    distance_col = None
-    for col in df.columns:
-        if 'distance' in col.lower():
-            distance_col = col
-            break
-    
-    activity_col = 'Activity Type' if 'Activity Type' in df.columns else 'Type' if 'Type' in df.columns else None
-    
-    elevation_col = None
-    for col in df.columns:
-        if 'elevation' in col.lower():
-            elevation_col = col
-            break
-    
-    moving_time_col = None
-    for col in df.columns:
-        if 'moving time' in col.lower():
-            moving_time_col = col
-            break
-    
-    # Get calorie column
-    calorie_col = None
-    for col in df.columns:
-        if 'calories' in col.lower() or 'kilocalories' in col.lower():
-            calorie_col = col
-            break
-    
-    # Get HR columns
-    avg_hr_col = None
-    max_hr_col = None
-    for col in df.columns:
-        if 'avg' in col.lower() and 'heart rate' in col.lower():
-            avg_hr_col = col
-        if 'max' in col.lower() and 'heart rate' in col.lower():
-            max_hr_col = col
-    
-    # Get gear column
-    gear_col = None
-    for col in df.columns:
-        if 'gear' in col.lower():
-            gear_col = col
-            break
-    
-    # Add day of week column
-    if date_col and date_col in df.columns:
-        df['Day of Week'] = df[date_col].dt.day_name()
-    
+    date_col = schema.date
+    distance_col = schema.distance
+    activity_col = schema.activity
+    elevation_col = schema.elevation
+    moving_time_col = schema.moving_time
+    calorie_col = schema.calories
+    avg_hr_col = schema.avg_hr
+    max_hr_col = schema.max_hr
+    gear_col = schema.gear
+
+    # Date-sorted, indexed copy of the data, built once per upload
+    @st.cache_resource(max_entries=8)
+    def build_filter_index(_df, _schema, dataset_key):
+        return core.FilterIndex(_df, _schema)
+
+    # Per day/type/gear totals, also built once per upload
+    @st.cache_resource(max_entries=8)
+    def build_rollup(_df, _schema, dataset_key):
+        return core.RollupCube.build(_df, _schema)
+
+    # Top activities per record, type and year; a store keeps its index up
+    # to date on import, otherwise it is built once per upload
+    @st.cache_resource(max_entries=8)
+    def build_records(_df, _schema, dataset_key):
+        store = core.ActivityStore.from_env()
+        records = store.load_records(_schema) if store is not None else None
+        return records if records is not None else core.RecordsIndex.build(_df, _schema)
+
+    # With STRAVA_DASHBOARD_SQL set, a copy in an embedded database answers
+    # the filters and figures instead of the filter index, rollup and pandas
+    @st.cache_resource(max_entries=8)
+    def build_sql_dataset(_df, _schema, dataset_key):
+        return core.SqlDataset.from_env(_df, _schema, dataset_key)
+
+    with core.stage(timer, "sql copy"):
+        sql_dataset = build_sql_dataset(df, schema, dataset_key)
+    rollup = None
+    if sql_dataset is not None:
+        # Same interface, with the masks compiled to a WHERE clause
+        filter_index = sql_dataset
+    else:
+        with core.stage(timer, "filter index"):
+            filter_index = build_filter_index(df, schema, dataset_key)
+        df = filter_index.df
+        with core.stage(timer, "rollup"):
+            rollup = build_rollup(df, schema, dataset_key)
+    with core.stage(timer, "records"):
+        records = build_records(df, schema, dataset_key)
+
     # Sidebar filters
     st.sidebar.header("🔍 Filters")
     
+    # Widget values making up the filter state, for caching aggregations
+    filter_state = []
+    selected_activities = selected_gear = date_range = None
+    
+    activity_mask = None
     if activity_col and activity_col in df.columns:
+        activity_options = filter_index.activity_options()
         selected_activities = st.sidebar.multiselect(
             "Activity Type",
-            options=df[activity_col].unique(),
-            default=df[activity_col].unique()
+            options=activity_options,
+            default=activity_options
         )
-        df_filtered = df[df[activity_col].isin(selected_activities)]
-    else:
-        df_filtered = df
+        with core.stage(timer, "filter: activity"):
+            activity_mask = filter_index.activity_mask(selected_activities)
+        filter_state.append(('activity', tuple(selected_activities)))
     
     # Gear filter
-    if gear_col and gear_col in df_filtered.columns:
-        gear_options = [x for x in df_filtered[gear_col].unique() if pd.notna(x)]
+    gear_mask = None
+    if gear_col and gear_col in df.columns:
+        gear_options = filter_index.gear_options(activity_mask)
         if gear_options:
             selected_gear = st.sidebar.multiselect(
                 "Gear",
                 options=gear_options,
                 default=gear_options
             )
-            df_filtered = df_filtered[df_filtered[gear_col].isin(selected_gear)]
+            with core.stage(timer, "filter: gear"):
+                gear_mask = filter_index.gear_mask(selected_gear)
+            filter_state.append(('gear', tuple(selected_gear)))
+    
+    mask = filter_index.combine(activity_mask, gear_mask)
     
     # Date range filter
-    if date_col and date_col in df_filtered.columns:
-        min_date = df_filtered[date_col].min()
-        max_date = df_filtered[date_col].max()
-        
+    min_date, max_date = filter_index.date_bounds(mask)
+    if min_date is not None:
         date_range = st.sidebar.date_input(
             "Date Range",
             value=(min_date, max_date),
@@ -189,17 +242,13 @@ if uploaded_file is not None:
             max_value=max_date
         )
         
-        if len(date_range) == 2:
-            df_filtered = df_filtered[
-                (df_filtered[date_col].dt.date >= date_range[0]) &
-                (df_filtered[date_col].dt.date <= date_range[1])
-            ]
+        with core.stage(timer, "filter: date"):
+            mask = filter_index.combine(mask, filter_index.date_mask(date_range))
+        filter_state.append(('date', tuple(date_range)))
     
     # Distance range filter
-    if distance_col and distance_col in df_filtered.columns:
-        min_dist = float(df_filtered[distance_col].min())
-        max_dist = float(df_filtered[distance_col].max())
-        
+    min_dist, max_dist = filter_index.distance_bounds(mask)
+    if min_dist is not None:
         dist_range = st.sidebar.slider(
             "Distance Range (km)",
             min_value=min_dist,
@@ -208,26 +257,61 @@ if uploaded_file is not None:
             step=0.1
         )
         
-        df_filtered = df_filtered[
-            (df_filtered[distance_col] >= dist_range[0]) &
-            (df_filtered[distance_col] <= dist_range[1])
-        ]
+        with core.stage(timer, "filter: distance"):
+            mask = filter_index.combine(mask, filter_index.distance_mask(dist_range))
+        filter_state.append(('distance', tuple(dist_range)))
+    
+    # All filters are applied to the data in one go, and aggregations are
+    # memoised per (dataset, filter state) so revisiting a state is free
+    @st.cache_resource
+    def get_aggregate_cache():
+        return core.AggregateCache(maxsize=32)
+    
+    # Totals come from the rollup cube unless the distance filter removes
+    # activities, which only the raw rows can tell
+    rollup_slice = None
+    if rollup is not None and filter_index.distance_complete and (
+        min_dist is None or tuple(dist_range) == (min_dist, max_dist)
+    ):
+        rollup_slice = rollup.slice(selected_activities, selected_gear, date_range)
+    
+    # Record candidates are filtered like the rows, distance range included
+    records_slice = records.slice(
+        selected_activities, selected_gear, date_range, dist_range if min_dist is not None else None
+    )
+
+    if sql_dataset is not None:
+        aggregates = get_aggregate_cache().build(
+            (dataset_key, tuple(filter_state), sql_dataset.backend),
+            lambda: core.SqlAggregates(df, schema, sql_dataset, mask, records_slice)
+        )
+    else:
+        aggregates = get_aggregate_cache().get(
+            (dataset_key, tuple(filter_state)),
+            lambda: filter_index.take(mask),
+            schema,
+            rollup_slice,
+            records_slice
+        )
     
     # Display data summary
     st.header("📊 Summary Statistics")
     
+    with core.stage(timer, "summary"):
+        summary = aggregates.summary
+    
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         st.metric(
             label="Total Activities",
-            value=len(df_filtered),
-            delta=f"{len(df_filtered)} activities"
+            value=summary['activities'],
+            delta=f"{summary['activities']} activities"
         )
     
     with col2:
-        if distance_col and distance_col in df_filtered.columns:
-            total_distance = df_filtered[distance_col].sum()
+        if summary['distance'] is not None:
+            total_distance = summary['distance']
             st.metric(
                 label="Total Distance",
                 value=f"{total_distance:.1f} km",
@@ -235,8 +319,8 @@ if uploaded_file is not None:
             )
     
     with col3:
-        if elevation_col and elevation_col in df_filtered.columns:
-            total_elevation = df_filtered[elevation_col].sum()
+        if summary['elevation'] is not None:
+            total_elevation = summary['elevation']
             st.metric(
                 label="Total Elevation",
                 value=f"{total_elevation:.0f} m",
@@ -244,8 +328,8 @@ if uploaded_file is not None:
             )
     
     with col4:
-        if calorie_col and calorie_col in df_filtered.columns:
-            total_calories = df_filtered[calorie_col].sum()
+        if summary['calories'] is not None:
+            total_calories = summary['calories']
             st.metric(
                 label="Total Calories",
                 value=f"{total_calories:.0f} kcal",
@@ -253,8 +337,8 @@ if uploaded_file is not None:
             )
     
     with col5:
-        if avg_hr_col and avg_hr_col in df_filtered.columns:
-            avg_hr = df_filtered[avg_hr_col].mean()
+        if summary['avg_hr'] is not None:
+            avg_hr = summary['avg_hr']
             st.metric(
                 label="Avg Heart Rate",
                 value=f"{avg_hr:.0f} bpm",
@@ -264,299 +348,656 @@ if uploaded_file is not None:
     # Charts section
     st.header("📈 Visualizations")
     
+    granularity = st.radio(
+        "Timeline granularity",
+        options=["Activity", "Day", "Week", "Month"],
+        horizontal=True,
+        help="Plot every activity, or totals per day, week or month"
+    )
+    granularity = granularity.lower()
+    max_points = core.max_points_from_env()
+    
     # Create tabs for different views
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
-        ["Distance Trends", "Activity Breakdown", "Heart Rate Analysis", "Calorie Burn", "Elevation Analysis", "Weekly Performance", "Data Table"]
+    # Only the selected tab runs its body, so a rerun builds one view's figures
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11 = st.tabs(
+        ["Distance Trends", "Activity Breakdown", "Heart Rate Analysis", "Calorie Burn", "Elevation Analysis", "Weekly Performance", "Training Load", "Routes", "Heatmap", "Best Efforts", "Data Table"],
+        key="view",
+        on_change="rerun"
     )
     
-    with tab1:
-        st.subheader("Distance Over Time")
-        if date_col and distance_col and date_col in df_filtered.columns and distance_col in df_filtered.columns:
-            df_sorted = df_filtered.sort_values(date_col)
-            
-            fig = px.line(
-                df_sorted,
-                x=date_col,
-                y=distance_col,
-                title="Activity Distance Timeline",
-                labels={distance_col: "Distance (km)", date_col: "Date"},
-                markers=True,
-                color_discrete_sequence=["#FC5200"]
-            )
-            fig.update_layout(hovermode='x unified', height=500)
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Cumulative distance
-            df_sorted['Cumulative Distance'] = df_sorted[distance_col].cumsum()
-            fig_cumulative = px.line(
-                df_sorted,
-                x=date_col,
-                y='Cumulative Distance',
-                title="Cumulative Distance Over Time",
-                labels={'Cumulative Distance': "Cumulative Distance (km)", date_col: "Date"},
-                color_discrete_sequence=["#00A8E8"]
-            )
-            fig_cumulative.update_layout(hovermode='x unified', height=500)
-            st.plotly_chart(fig_cumulative, use_container_width=True)
+    with tab1, core.stage(timer, "tab: Distance Trends"):
+        if tab1.open:
+            st.subheader("Distance Over Time")
+            df_sorted = aggregates.chart_points(granularity, distance_col, max_points)
+            if df_sorted is not None and distance_col:
+                fig = px.line(
+                    df_sorted,
+                    x=date_col,
+                    y=distance_col,
+                    title="Activity Distance Timeline",
+                    labels={distance_col: "Distance (km)", date_col: "Date"},
+                    markers=True,
+                    color_discrete_sequence=["#FC5200"]
+                )
+                fig.update_layout(hovermode='x unified', height=500)
+                show_chart(fig)
+                if granularity == "activity" and len(df_sorted) < summary['activities']:
+                    st.caption(
+                        f"Showing {len(df_sorted):,} of {summary['activities']:,} activities; "
+                        "the timeline is downsampled for display, keeping its shape and peaks."
+                    )
+                
+                # Cumulative distance
+                fig_cumulative = px.line(
+                    aggregates.chart_points(granularity, 'Cumulative Distance', max_points),
+                    x=date_col,
+                    y='Cumulative Distance',
+                    title="Cumulative Distance Over Time",
+                    labels={'Cumulative Distance': "Cumulative Distance (km)", date_col: "Date"},
+                    color_discrete_sequence=["#00A8E8"]
+                )
+                fig_cumulative.update_layout(hovermode='x unified', height=500)
+                show_chart(fig_cumulative)
     
-    with tab2:
-        st.subheader("Activity Type Distribution")
-        if activity_col and activity_col in df_filtered.columns:
-            activity_counts = df_filtered[activity_col].value_counts()
-            
-            fig = px.pie(
-                values=activity_counts.values,
-                names=activity_counts.index,
-                title="Activities by Type",
-                color_discrete_sequence=px.colors.qualitative.Set2
-            )
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Distance by activity type
-            if distance_col and distance_col in df_filtered.columns:
-                activity_distance = df_filtered.groupby(activity_col)[distance_col].sum().sort_values(ascending=False)
+    with tab2, core.stage(timer, "tab: Activity Breakdown"):
+        if tab2.open:
+            st.subheader("Activity Type Distribution")
+            activity_counts = aggregates.activity_counts
+            if activity_counts is not None:
+
+                fig = px.pie(
+                    values=activity_counts.values,
+                    names=activity_counts.index,
+                    title="Activities by Type",
+                    color_discrete_sequence=px.colors.qualitative.Set2
+                )
+                show_chart(fig)
                 
-                fig_bar = px.bar(
-                    x=activity_distance.values,
-                    y=activity_distance.index,
-                    orientation='h',
-                    title="Total Distance by Activity Type",
-                    labels={'x': "Distance (km)", 'y': "Activity Type"},
-                    color=activity_distance.values,
-                    color_continuous_scale="Viridis"
+                # Distance by activity type
+                activity_distance = aggregates.total_by_activity('distance')
+                if activity_distance is not None:
+                    fig_bar = px.bar(
+                        x=activity_distance.values,
+                        y=activity_distance.index,
+                        orientation='h',
+                        title="Total Distance by Activity Type",
+                        labels={'x': "Distance (km)", 'y': "Activity Type"},
+                        color=activity_distance.values,
+                        color_continuous_scale="Viridis"
+                    )
+                    show_chart(fig_bar)
+    
+    with tab3, core.stage(timer, "tab: Heart Rate Analysis"):
+        if tab3.open:
+            st.subheader("Heart Rate Analysis")
+            if avg_hr_col and avg_hr_col in df.columns:
+                # HR distribution histogram
+                fig_hr_dist = charts.histogram(
+                    aggregates.histogram('avg_hr'),
+                    title="Average Heart Rate Distribution",
+                    x_label="Average Heart Rate (bpm)",
+                    color="#E63946"
                 )
-                st.plotly_chart(fig_bar, use_container_width=True)
-    
-    with tab3:
-        st.subheader("Heart Rate Analysis")
-        if avg_hr_col and avg_hr_col in df_filtered.columns:
-            # HR distribution histogram
-            fig_hr_dist = px.histogram(
-                df_filtered,
-                x=avg_hr_col,
-                nbins=30,
-                title="Average Heart Rate Distribution",
-                labels={avg_hr_col: "Average Heart Rate (bpm)", 'count': "Number of Activities"},
-                color_discrete_sequence=["#E63946"]
-            )
-            st.plotly_chart(fig_hr_dist, use_container_width=True)
+                show_chart(fig_hr_dist)
+                
+                # HR over time
+                df_sorted_hr = aggregates.chart_points(granularity, avg_hr_col, max_points)
+                if df_sorted_hr is not None:
+                    fig_hr_time = px.line(
+                        df_sorted_hr,
+                        x=date_col,
+                        y=avg_hr_col,
+                        title="Average Heart Rate Over Time",
+                        labels={avg_hr_col: "Avg HR (bpm)", date_col: "Date"},
+                        markers=True,
+                        color_discrete_sequence=["#E63946"]
+                    )
+                    fig_hr_time.update_layout(hovermode='x unified', height=500)
+                    show_chart(fig_hr_time)
             
-            # HR over time
-            if date_col and date_col in df_filtered.columns:
-                df_sorted_hr = df_filtered.sort_values(date_col)
-                fig_hr_time = px.line(
-                    df_sorted_hr,
-                    x=date_col,
-                    y=avg_hr_col,
-                    title="Average Heart Rate Over Time",
-                    labels={avg_hr_col: "Avg HR (bpm)", date_col: "Date"},
-                    markers=True,
-                    color_discrete_sequence=["#E63946"]
+            # Max HR analysis
+            max_hr = aggregates.max_hr
+            if max_hr is not None:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric(
+                        label="Max Heart Rate",
+                        value=f"{max_hr['max']:.0f} bpm"
+                    )
+                with col2:
+                    st.metric(
+                        label="Avg Max Heart Rate",
+                        value=f"{max_hr['mean']:.0f} bpm"
+                    )
+    
+    with tab4, core.stage(timer, "tab: Calorie Burn"):
+        if tab4.open:
+            st.subheader("Calorie Burn Analysis")
+            if calorie_col and calorie_col in df.columns:
+                # Calorie distribution
+                fig_cal_dist = charts.histogram(
+                    aggregates.histogram('calories'),
+                    title="Calorie Burn Distribution",
+                    x_label="Calories (kcal)",
+                    color="#F77F00"
                 )
-                fig_hr_time.update_layout(hovermode='x unified', height=500)
-                st.plotly_chart(fig_hr_time, use_container_width=True)
-        
-        # Max HR analysis
-        if max_hr_col and max_hr_col in df_filtered.columns:
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric(
-                    label="Max Heart Rate",
-                    value=f"{df_filtered[max_hr_col].max():.0f} bpm"
+                show_chart(fig_cal_dist)
+                
+                # Calories over time
+                df_sorted_cal = aggregates.chart_points(granularity, calorie_col, max_points)
+                if df_sorted_cal is not None:
+                    fig_cal_time = px.line(
+                        df_sorted_cal,
+                        x=date_col,
+                        y=calorie_col,
+                        title="Calorie Burn Over Time",
+                        labels={calorie_col: "Calories (kcal)", date_col: "Date"},
+                        markers=True,
+                        color_discrete_sequence=["#F77F00"]
+                    )
+                    fig_cal_time.update_layout(hovermode='x unified', height=500)
+                    show_chart(fig_cal_time)
+                
+                # Calories by activity type
+                cal_by_activity = aggregates.total_by_activity('calories')
+                if cal_by_activity is not None:
+                    fig_cal_activity = px.bar(
+                        x=cal_by_activity.values,
+                        y=cal_by_activity.index,
+                        orientation='h',
+                        title="Total Calories Burned by Activity Type",
+                        labels={'x': "Calories (kcal)", 'y': "Activity Type"},
+                        color=cal_by_activity.values,
+                        color_continuous_scale="Oranges"
+                    )
+                    show_chart(fig_cal_activity)
+    
+    with tab5, core.stage(timer, "tab: Elevation Analysis"):
+        if tab5.open:
+            st.subheader("Elevation Analysis")
+            if elevation_col and elevation_col in df.columns:
+                fig = charts.histogram(
+                    aggregates.histogram('elevation'),
+                    title="Elevation Gain Distribution",
+                    x_label="Elevation Gain (m)",
+                    color="#06A77D"
                 )
-            with col2:
-                st.metric(
-                    label="Avg Max Heart Rate",
-                    value=f"{df_filtered[max_hr_col].mean():.0f} bpm"
+                show_chart(fig)
+                
+                # Elevation vs Distance scatter
+                if distance_col and distance_col in df.columns:
+                    fig_scatter = charts.scatter(
+                        aggregates.select([distance_col, elevation_col, activity_col]),
+                        x=distance_col,
+                        y=elevation_col,
+                        title="Elevation Gain vs Distance",
+                        x_label="Distance (km)",
+                        y_label="Elevation Gain (m)",
+                        color="#D62828",
+                        size=distance_col,
+                        hover=activity_col
+                    )
+                    show_chart(fig_scatter)
+    
+    with tab6, core.stage(timer, "tab: Weekly Performance"):
+        if tab6.open:
+            st.subheader("Best Performing Days of the Week")
+            weekday = aggregates.weekday
+            if weekday is not None:
+                day_order = core.DAY_ORDER
+                
+                # Activities by day of week
+                fig_day_count = px.bar(
+                    x=day_order,
+                    y=weekday['count'].tolist(),
+                    title="Number of Activities by Day of Week",
+                    labels={'x': "Day of Week", 'y': "Number of Activities"},
+                    color=weekday['count'].tolist(),
+                    color_continuous_scale="Blues"
                 )
+                show_chart(fig_day_count)
+                
+                # Distance by day of week
+                if 'distance' in weekday.columns:
+                    fig_day_dist = px.bar(
+                        x=day_order,
+                        y=weekday['distance'].tolist(),
+                        title="Total Distance by Day of Week",
+                        labels={'x': "Day of Week", 'y': "Distance (km)"},
+                        color=weekday['distance'].tolist(),
+                        color_continuous_scale="Greens"
+                    )
+                    show_chart(fig_day_dist)
+                
+                # Calories by day of week
+                if 'calories' in weekday.columns:
+                    fig_day_cal = px.bar(
+                        x=day_order,
+                        y=weekday['calories'].tolist(),
+                        title="Total Calories Burned by Day of Week",
+                        labels={'x': "Day of Week", 'y': "Calories (kcal)"},
+                        color=weekday['calories'].tolist(),
+                        color_continuous_scale="Oranges"
+                    )
+                    show_chart(fig_day_cal)
+                
+                # Average HR by day of week
+                if 'avg_hr' in weekday.columns:
+                    fig_day_hr = px.bar(
+                        x=day_order,
+                        y=weekday['avg_hr'].tolist(),
+                        title="Average Heart Rate by Day of Week",
+                        labels={'x': "Day of Week", 'y': "Avg HR (bpm)"},
+                        color=weekday['avg_hr'].tolist(),
+                        color_continuous_scale="Reds"
+                    )
+                    show_chart(fig_day_hr)
     
-    with tab4:
-        st.subheader("Calorie Burn Analysis")
-        if calorie_col and calorie_col in df_filtered.columns:
-            # Calorie distribution
-            fig_cal_dist = px.histogram(
-                df_filtered,
-                x=calorie_col,
-                nbins=30,
-                title="Calorie Burn Distribution",
-                labels={calorie_col: "Calories (kcal)", 'count': "Number of Activities"},
-                color_discrete_sequence=["#F77F00"]
-            )
-            st.plotly_chart(fig_cal_dist, use_container_width=True)
-            
-            # Calories over time
-            if date_col and date_col in df_filtered.columns:
-                df_sorted_cal = df_filtered.sort_values(date_col)
-                fig_cal_time = px.line(
-                    df_sorted_cal,
+    with tab7, core.stage(timer, "tab: Training Load"):
+        if tab7.open:
+            st.subheader("Training Load")
+            load = aggregates.training_load
+            if load is not None:
+                latest = load.iloc[-1]
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric(label="Acute Load (7 days)", value=f"{latest['acute']:.0f}")
+                with col2:
+                    st.metric(label="Chronic Load (42 days)", value=f"{latest['chronic']:.0f}")
+                with col3:
+                    st.metric(label="Acute:Chronic Ratio", value=f"{latest['ratio']:.2f}")
+
+                # One row per day; the acute line, the more variable one, picks the points kept
+                load_days = load.rename_axis('Date').reset_index()
+                fig_load = px.line(
+                    core.downsample(load_days, 'Date', 'acute', max_points),
+                    x='Date',
+                    y=['acute', 'chronic'],
+                    title="Acute and Chronic Training Load (TRIMP)",
+                    labels={'value': "Load", 'variable': ""},
+                    color_discrete_sequence=["#E63946", "#00A8E8"]
+                )
+                fig_load.update_layout(hovermode='x unified', height=500)
+                show_chart(fig_load)
+
+                fig_ratio = px.line(
+                    core.downsample(load_days, 'Date', 'ratio', max_points),
+                    x='Date',
+                    y='ratio',
+                    title="Acute:Chronic Workload Ratio",
+                    labels={'ratio': "Ratio"},
+                    color_discrete_sequence=["#6A4C93"]
+                )
+                # Band usually taken as a safe progression
+                fig_ratio.add_hrect(y0=0.8, y1=1.3, fillcolor="#06A77D", opacity=0.15, line_width=0)
+                fig_ratio.update_layout(hovermode='x unified', height=400)
+                show_chart(fig_ratio)
+                st.caption(
+                    "Loads are exponentially weighted daily sums of Banister's TRIMP, from average heart rate "
+                    f"and moving time with a resting HR of {core.DEFAULT_REST_HR} bpm."
+                )
+            else:
+                st.info("Training load needs the date, moving time and average heart rate columns.")
+
+            # Speed of each activity; pace and speed are per activity, not per period
+            speed_points = aggregates.chart_points('activity', core.SPEED_COL, max_points)
+            if speed_points is not None and core.SPEED_COL in speed_points.columns:
+                fig_speed = px.line(
+                    speed_points,
                     x=date_col,
-                    y=calorie_col,
-                    title="Calorie Burn Over Time",
-                    labels={calorie_col: "Calories (kcal)", date_col: "Date"},
+                    y=core.SPEED_COL,
+                    title="Average Speed per Activity",
+                    labels={core.SPEED_COL: "Speed (km/h)", date_col: "Date"},
                     markers=True,
-                    color_discrete_sequence=["#F77F00"]
+                    color_discrete_sequence=["#06A77D"]
                 )
-                fig_cal_time.update_layout(hovermode='x unified', height=500)
-                st.plotly_chart(fig_cal_time, use_container_width=True)
+                fig_speed.update_layout(hovermode='x unified', height=500)
+                show_chart(fig_speed)
+
+    with tab8, core.stage(timer, "tab: Routes"):
+        if tab8.open:
+            st.subheader("Routes")
             
-            # Calories by activity type
-            if activity_col and activity_col in df_filtered.columns:
-                cal_by_activity = df_filtered.groupby(activity_col)[calorie_col].sum().sort_values(ascending=False)
-                fig_cal_activity = px.bar(
-                    x=cal_by_activity.values,
-                    y=cal_by_activity.index,
-                    orientation='h',
-                    title="Total Calories Burned by Activity Type",
-                    labels={'x': "Calories (kcal)", 'y': "Activity Type"},
-                    color=cal_by_activity.values,
-                    color_continuous_scale="Oranges"
-                )
-                st.plotly_chart(fig_cal_activity, use_container_width=True)
-    
-    with tab5:
-        st.subheader("Elevation Analysis")
-        if elevation_col and elevation_col in df_filtered.columns:
-            fig = px.histogram(
-                df_filtered,
-                x=elevation_col,
-                nbins=30,
-                title="Elevation Gain Distribution",
-                labels={elevation_col: "Elevation Gain (m)", 'count': "Number of Activities"},
-                color_discrete_sequence=["#06A77D"]
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            filename_col = schema.filename
+            if archive is None or track_store is None or filename_col not in df.columns:
+                st.info("Upload the Strava export ZIP, rather than activities.csv alone, to see your routes.")
+            else:
+                routes = aggregates.select([filename_col])
+                routes = routes[routes[filename_col].isin(list(archive.tracks))]
+                if not len(routes):
+                    st.info("None of the filtered activities have a GPS file in the archive.")
+                else:
+                    # Most recent first; files are parsed once and kept in the track store
+                    route_count = st.number_input(
+                        f"Routes to show (most recent of {len(routes):,})",
+                        min_value=1,
+                        max_value=len(routes),
+                        value=min(200, len(routes)),
+                        step=50
+                    )
+                    with core.stage(timer, "tracks"), st.spinner(f"Reading {route_count:,} routes..."):
+                        tracks = track_store.load(archive, routes[filename_col].iloc[-route_count:])
+                    lat, lon = core.route_lines(tracks, max_points=core.ROUTE_POINT_BUDGET)
+                    show_chart(charts.route_map(lat, lon, f"{route_count:,} Most Recent Routes"))
+                    st.caption(
+                        f"{sum(track is not None and len(track.lat) > 0 for track in tracks):,} routes with GPS data, "
+                        f"{len(lat) - np.isnan(lat).sum():,} points drawn"
+                    )
+
+    # Heatmaps are drawn from the cells stored with every track, once per
+    # (dataset, filter state); only the image reaches the browser
+    @st.cache_data(max_entries=16)
+    def render_heatmap(_track_store, _keys, dataset_key, filter_state):
+        heatmap = core.render_heatmap(_track_store, _keys)
+        if heatmap is None:
+            return None
+        return core.encode_png(core.colorize(heatmap.counts)), heatmap.bounds, heatmap.zoom, heatmap.counts.shape
+
+    with tab9, core.stage(timer, "tab: Heatmap"):
+        if tab9.open:
+            st.subheader("Heatmap")
             
-            # Elevation vs Distance scatter
-            if distance_col and distance_col in df_filtered.columns:
-                fig_scatter = px.scatter(
-                    df_filtered,
-                    x=distance_col,
-                    y=elevation_col,
-                    title="Elevation Gain vs Distance",
-                    labels={distance_col: "Distance (km)", elevation_col: "Elevation Gain (m)"},
-                    color_discrete_sequence=["#D62828"],
-                    size=distance_col,
-                    hover_data=[activity_col] if activity_col else None
+            filename_col = schema.filename
+            if archive is None or track_store is None or filename_col not in df.columns:
+                st.info("Upload the Strava export ZIP, rather than activities.csv alone, to see where you train.")
+            else:
+                files = [archive.track(filename) for filename in aggregates.select([filename_col])[filename_col].unique()]
+                keys = [core.track_key(file) for file in files if file is not None]
+                with core.stage(timer, "heatmap"), st.spinner(f"Drawing {len(keys):,} routes..."):
+                    heatmap = render_heatmap(track_store, keys, dataset_key, tuple(filter_state)) if keys else None
+                if heatmap is None:
+                    st.info("None of the filtered activities have GPS data in the archive.")
+                else:
+                    png, bounds, zoom, (height, width) = heatmap
+                    show_chart(charts.heatmap_map(png, bounds, f"Heatmap of {len(keys):,} Activities"))
+                    st.caption(
+                        f"Drawn at map zoom {zoom} as a {width:,}×{height:,} image "
+                        f"({core.format_bytes(len(png))}), around {core.HEATMAP_COVERAGE:.0%} of the route points; "
+                        "brighter means more activities passed there. Narrow the filters to look elsewhere."
+                    )
+
+    # Best efforts are found per activity when its file is parsed and kept
+    # with its track; here they are only looked up, once per upload
+    @st.cache_resource(max_entries=8)
+    def get_activity_efforts(_df, _schema, _archive, _track_store, dataset_key):
+        return core.activity_efforts(_df, _schema, _archive, _track_store)
+
+    with tab10, core.stage(timer, "tab: Best Efforts"):
+        if tab10.open:
+            st.subheader("Best Efforts")
+            
+            efforts = None
+            if archive is not None and track_store is not None:
+                efforts = get_activity_efforts(df, schema, archive, track_store, dataset_key)
+            if efforts is None:
+                st.info("Upload the Strava export ZIP, rather than activities.csv alone, to see your best efforts.")
+            else:
+                df_filtered = aggregates.df
+                efforts = efforts.loc[df_filtered.index]
+                activity_col = schema.activity
+                if activity_col in df_filtered.columns:
+                    # Efforts are only compared within one activity type
+                    has_efforts = efforts.notna().any(axis=1)
+                    types = sorted(df_filtered.loc[has_efforts, activity_col].dropna().unique())
+                    effort_type = st.selectbox(
+                        "Activity type",
+                        options=types,
+                        index=types.index('Run') if 'Run' in types else 0
+                    ) if types else None
+                    efforts = efforts[df_filtered[activity_col] == effort_type]
+                bests = core.all_time_bests(efforts)
+                
+                if not len(bests):
+                    st.info("None of the filtered activities have GPS or sensor data in the archive.")
+                else:
+                    rows = df_filtered.loc[bests['row']]
+                    bests['Date'] = rows[schema.date].dt.strftime('%Y-%m-%d').fillna('').to_numpy()
+                    bests['Activity'] = (
+                        rows[schema.name].fillna('').astype(str).to_numpy() if schema.name in rows.columns else ''
+                    )
+                    
+                    fastest = bests[bests['kind'] == 'fastest']
+                    if len(fastest):
+                        pace = fastest['value'] / 60 / (fastest['amount'] / 1000)
+                        show_chart(charts.effort_curve(
+                            fastest['label'], pace, fastest['Date'],
+                            "Fastest Pace by Distance", "Pace (min/km)", reversed_axis=True
+                        ))
+                        st.dataframe(pd.DataFrame({
+                            "Distance": fastest['label'],
+                            "Time": fastest['value'].map(core.format_duration),
+                            "Pace (min/km)": pace.round(2),
+                            "Speed (km/h)": (fastest['amount'] / fastest['value'] * 3.6).round(1),
+                            "Date": fastest['Date'],
+                            "Activity": fastest['Activity'],
+                        }), hide_index=True, use_container_width=True)
+                    
+                    col1, col2 = st.columns(2)
+                    for column, kind, title, unit, color in (
+                        (col1, 'power', "Best Average Power", "Power (W)", '#636EFA'),
+                        (col2, 'heart_rate', "Best Average Heart Rate", "Heart Rate (bpm)", '#EF553B'),
+                    ):
+                        curve = bests[bests['kind'] == kind]
+                        with column:
+                            if len(curve):
+                                show_chart(charts.effort_curve(
+                                    curve['label'], curve['value'], curve['Date'] + ' ' + curve['Activity'],
+                                    title, unit, color=color
+                                ))
+                            else:
+                                st.write(f"No {unit.split(' (')[0].lower()} data in the filtered activities.")
+                    st.caption(
+                        "All-time bests of the filtered activities: the fastest stretch of each distance within "
+                        "one activity, timed on its elapsed time, and the best average over each duration. "
+                        f"Missing power counts as zero; a heart rate gap over {core.MAX_SAMPLE_GAP} s ends a window."
+                    )
+
+    with tab11, core.stage(timer, "tab: Data Table"):
+        if tab11.open:
+            st.subheader("Detailed Activity Data")
+            
+            # Display filtered data one page at a time; sorting and search run
+            # here over all filtered rows and only the page is sent
+            display_cols = [col for col in df.columns if col not in ['Day of Week']]
+            search_options = [col for col in core.searchable_columns(df) if col in display_cols]
+            
+            col1, col2, col3, col4 = st.columns([2, 3, 2, 1])
+            with col1:
+                search_col = st.selectbox("Search in", options=search_options) if search_options else None
+            with col2:
+                search = st.text_input("Search", placeholder="Text to look for", disabled=search_col is None)
+            with col3:
+                sort_by = st.selectbox(
+                    "Sort by",
+                    options=[None] + display_cols,
+                    format_func=lambda col: "Date" if col is None else col
                 )
-                st.plotly_chart(fig_scatter, use_container_width=True)
-    
-    with tab6:
-        st.subheader("Best Performing Days of the Week")
-        if 'Day of Week' in df_filtered.columns:
-            # Define day order
-            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+            with col4:
+                ascending = st.toggle("Ascending", value=True)
             
-            # Activities by day of week
-            day_activity_count = df_filtered['Day of Week'].value_counts().reindex(day_order, fill_value=0)
+            rows = aggregates.table_rows(sort_by, ascending, search_col, search)
             
-            fig_day_count = px.bar(
-                x=day_order,
-                y=[day_activity_count[day] for day in day_order],
-                title="Number of Activities by Day of Week",
-                labels={'x': "Day of Week", 'y': "Number of Activities"},
-                color=[day_activity_count[day] for day in day_order],
-                color_continuous_scale="Blues"
+            col1, col2 = st.columns([3, 1])
+            with col2:
+                page_size = st.selectbox("Rows per page", options=[50, 100, 250, 500], index=1)
+            pages = core.page_bounds(len(rows), 1, page_size)[2]
+            with col1:
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+            start, stop, pages = core.page_bounds(len(rows), page, page_size)
+            
+            page_rows = aggregates.take(rows[start:stop])
+            st.dataframe(
+                page_rows[display_cols],
+                use_container_width=True,
+                height=400,
+                hide_index=True
             )
-            st.plotly_chart(fig_day_count, use_container_width=True)
+            if len(rows):
+                st.caption(f"Rows {start + 1:,}-{stop:,} of {len(rows):,}")
+            else:
+                st.caption("No matching activities")
             
-            # Distance by day of week
-            if distance_col and distance_col in df_filtered.columns:
-                day_distance = df_filtered.groupby('Day of Week')[distance_col].sum().reindex(day_order, fill_value=0)
-                
-                fig_day_dist = px.bar(
-                    x=day_order,
-                    y=[day_distance[day] for day in day_order],
-                    title="Total Distance by Day of Week",
-                    labels={'x': "Day of Week", 'y': "Distance (km)"},
-                    color=[day_distance[day] for day in day_order],
-                    color_continuous_scale="Greens"
-                )
-                st.plotly_chart(fig_day_dist, use_container_width=True)
+            # Activity files of the rows on this page, from the export ZIP
+            filename_col = schema.filename
+            if archive is not None and filename_col in df.columns:
+                page_files = page_rows[filename_col].map(archive.track)
+                page_rows = page_rows[page_files.notna()]
+                with st.expander(f"🗂️ Activity Files ({len(page_rows)} on this page)"):
+                    if len(page_rows):
+                        def file_label(i):
+                            row = page_rows.iloc[i]
+                            parts = [row[col] for col in (date_col, activity_col, schema.name) if col and pd.notna(row[col])]
+                            return " · ".join(str(part) for part in parts) or str(row[filename_col])
+                        
+                        selected_file = st.selectbox("Activity", options=range(len(page_rows)), format_func=file_label)
+                        track = archive.track(page_rows[filename_col].iloc[selected_file])
+                        st.caption(
+                            f"{track.path} · {track.format.upper()} · {core.format_bytes(track.size)}"
+                            f" ({core.format_bytes(track.compressed_size)} in the archive)"
+                        )
+                        st.download_button(
+                            label=f"📥 Download {track.format.upper()} File",
+                            data=lambda: archive.read_track(track.path),
+                            file_name=track.path.rsplit('/', 1)[-1].removesuffix('.gz'),
+                            mime="application/octet-stream",
+                            on_click="ignore"
+                        )
+                        if track_store is not None:
+                            route = track_store.load(archive, [track.path], simplified=False)[0]
+                            if route is not None and len(route.lat):
+                                lat, lon = core.route_lines([route])
+                                show_chart(charts.route_map(lat, lon, file_label(selected_file), height=400))
+                            else:
+                                st.caption("No GPS data in this file")
+                    else:
+                        st.caption("None of the activities on this page have a file in the archive")
             
-            # Calories by day of week
-            if calorie_col and calorie_col in df_filtered.columns:
-                day_calories = df_filtered.groupby('Day of Week')[calorie_col].sum().reindex(day_order, fill_value=0)
-                
-                fig_day_cal = px.bar(
-                    x=day_order,
-                    y=[day_calories[day] for day in day_order],
-                    title="Total Calories Burned by Day of Week",
-                    labels={'x': "Day of Week", 'y': "Calories (kcal)"},
-                    color=[day_calories[day] for day in day_order],
-                    color_continuous_scale="Oranges"
-                )
-                st.plotly_chart(fig_day_cal, use_container_width=True)
+            # Download button; the file is only written when clicked and
+            # kept per filter state and format
+            @st.cache_resource
+            def get_export_cache():
+                return core.ExportCache(maxsize=4)
             
-            # Average HR by day of week
-            if avg_hr_col and avg_hr_col in df_filtered.columns:
-                day_avg_hr = df_filtered.groupby('Day of Week')[avg_hr_col].mean().reindex(day_order, fill_value=0)
-                
-                fig_day_hr = px.bar(
-                    x=day_order,
-                    y=[day_avg_hr[day] for day in day_order],
-                    title="Average Heart Rate by Day of Week",
-                    labels={'x': "Day of Week", 'y': "Avg HR (bpm)"},
-                    color=[day_avg_hr[day] for day in day_order],
-                    color_continuous_scale="Reds"
-                )
-                st.plotly_chart(fig_day_hr, use_container_width=True)
-    
-    with tab7:
-        st.subheader("Detailed Activity Data")
-        
-        # Display filtered data
-        display_cols = [col for col in df_filtered.columns if col not in ['Day of Week']]
-        st.dataframe(df_filtered[display_cols], use_container_width=True, height=400)
-        
-        # Download button
-        csv = df_filtered.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Filtered Data as CSV",
-            data=csv,
-            file_name=f"strava_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+            export_format = st.radio(
+                "Export format",
+                options=list(core.EXPORT_FORMATS),
+                format_func=lambda fmt: core.EXPORT_FORMATS[fmt][0],
+                horizontal=True
+            )
+            export_label, export_extension, export_mime = core.EXPORT_FORMATS[export_format]
+            export_key = (dataset_key, tuple(filter_state), export_format)
+            st.download_button(
+                label=f"📥 Download Filtered Data as {export_label}",
+                data=lambda: get_export_cache().get(export_key, lambda: aggregates.df, export_format),
+                file_name=f"strava_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}{export_extension}",
+                mime=export_mime,
+                on_click="ignore"
+            )
     
     # Additional insights
     st.header("💡 Key Insights")
     
+    with core.stage(timer, "insights"):
+        insights = aggregates.insights
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if distance_col and distance_col in df_filtered.columns:
-            longest_activity = df_filtered.loc[df_filtered[distance_col].idxmax()]
+        if insights['distance'] is not None:
+            value, activity = insights['distance']
             st.info(f"""
-            **Longest Activity**: {longest_activity[distance_col]:.1f} km
-            {f"({longest_activity[activity_col]})" if activity_col and activity_col in df_filtered.columns else ""}
+            **Longest Activity**: {value:.1f} km
+            {f"({activity})" if activity is not None else ""}
             """)
     
     with col2:
-        if elevation_col and elevation_col in df_filtered.columns:
-            highest_elevation = df_filtered.loc[df_filtered[elevation_col].idxmax()]
+        if insights['elevation'] is not None:
+            value, activity = insights['elevation']
             st.info(f"""
-            **Highest Elevation Gain**: {highest_elevation[elevation_col]:.0f} m
-            {f"({highest_elevation[activity_col]})" if activity_col and activity_col in df_filtered.columns else ""}
+            **Highest Elevation Gain**: {value:.0f} m
+            {f"({activity})" if activity is not None else ""}
             """)
     
     with col3:
-        if calorie_col and calorie_col in df_filtered.columns:
-            highest_calories = df_filtered.loc[df_filtered[calorie_col].idxmax()]
+        if insights['calories'] is not None:
+            value, activity = insights['calories']
             st.info(f"""
-            **Most Calories Burned**: {highest_calories[calorie_col]:.0f} kcal
-            {f"({highest_calories[activity_col]})" if activity_col and activity_col in df_filtered.columns else ""}
+            **Most Calories Burned**: {value:.0f} kcal
+            {f"({activity})" if activity is not None else ""}
             """)
+
+    # Best of each record per activity type, from the records index
+    with st.expander("🏆 Personal Records"):
+        with core.stage(timer, "personal records"):
+            personal_records = aggregates.personal_records
+        if len(personal_records):
+            labels = {
+                'distance': "Longest (km)",
+                'elevation': "Most Elevation (m)",
+                'calories': "Most Calories (kcal)",
+            }
+            labels.update({band: f"Fastest Pace {band} (min/km)" for band in core.PACE_BAND_LABELS})
+            st.dataframe(
+                personal_records.rename(columns=labels).rename_axis("Activity Type"),
+                use_container_width=True
+            )
+        else:
+            st.write("No records for the selected activities.")
     
     # Show data info
     with st.expander("📋 Data Information"):
         st.write(f"**Total rows loaded**: {len(df)}")
-        st.write(f"**Rows after filtering**: {len(df_filtered)}")
+        st.write(f"**Rows after filtering**: {summary['activities']}")
         st.write(f"**Columns in dataset**: {len(df.columns)}")
+        ingest = df.attrs.get('ingest')
+        if ingest:
+            st.write(
+                f"**Parsed in**: {ingest['chunks']} chunks, "
+                f"peak memory {core.format_bytes(ingest['peak_rss'])}"
+            )
+        if sql_dataset is not None:
+            st.write(f"**Filters and aggregations run in**: {'DuckDB' if sql_dataset.backend == 'duckdb' else 'SQLite'}")
+        if archive is not None:
+            st.write(f"**GPS files in the archive**: {len(archive.tracks):,}")
+        if unparsed_durations:
+            st.write("**Unparsable durations:**")
+            st.write(unparsed_durations)
         st.write("**Column names:**")
         st.write(df.columns.tolist())
+    
+    # Per-stage timings of this rerun, when profiling is enabled
+    if timer is not None:
+        with st.expander("⏱️ Performance"):
+            st.write(
+                f"**Rerun time**: {timer.elapsed() * 1000:.0f} ms, "
+                f"memory {core.format_bytes(core.current_rss())} "
+                f"(peak {core.format_bytes(core.peak_rss())})"
+            )
+            st.dataframe(
+                pd.DataFrame({
+                    "Stage": [record['stage'] for record in timer.records()],
+                    "Calls": [record['calls'] for record in timer.records()],
+                    "Time (ms)": [round(record['seconds'] * 1000, 2) for record in timer.records()],
+                    "Memory change": [core.format_bytes(record['rss_delta']) for record in timer.records()],
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+            if chart_payloads:
+                st.write("**Chart payloads:**")
+                st.dataframe(
+                    pd.DataFrame({
+                        "Chart": [title for title, _ in chart_payloads],
+                        "Payload": [core.format_bytes(size) for _, size in chart_payloads],
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        timer.log(dataset=dataset_key, rows=len(df), filtered_rows=summary['activities'])
 
 else:
     # Show welcome message when no file is uploaded
-    st.info("👈 Please upload a Strava activities CSV file using the sidebar to get started!")
+    st.info("👈 Please upload your Strava export ZIP or activities CSV file using the sidebar to get started!")
     
     st.markdown("""
     ## How to use this dashboard:
@@ -566,9 +1007,9 @@ else:
        - Navigate to "My Account" → "Download or Delete Your Account"
        - Click "Request your archive"
        - You'll receive an email with a download link (may take a few hours)
-       - Extract the ZIP file and look for the activities CSV file
+       - No need to extract it: the ZIP can be uploaded as it is (or the activities.csv inside it)
     
-    2. **Upload the CSV file** using the file uploader in the sidebar
+    2. **Upload the ZIP or CSV file** using the file uploader in the sidebar
     
     3. **Explore your data**:
        - Use the filters to narrow down by activity type, date range, distance, or gear
@@ -586,5 +1027,6 @@ else:
     - 📅 Weekly performance insights - best performing days
     - 🎽 Filterable by gear type
     - 📥 Download filtered data
+    - 🗺️ Route maps from the GPS files of the export ZIP
     - 🔍 Customizable filters for date range, activity type, distance, and gear
     """)
@@ -0,0 +1,450 @@
+"""
+Benchmarks for the dashboard's data pipeline at several dataset sizes.
+
+Times loading, preprocessing, schema resolution, filtering and every tab's
+aggregation on CSVs from ``sample_data_generator`` and stores the results
+as JSON, so a later run can be compared against them:
+
+    python -m benchmarks.run                          # 1k, 100k and 1M rows
+    python -m benchmarks.run --sizes 1000,100000 --output benchmarks/results/mine.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Generated CSVs are kept in ``benchmarks/.data`` so they are only written
+once per size, layout and seed. Each benchmark reports the best of
+``--repeat`` runs.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+import sample_data_generator
+import strava_dashboard as core
+from strava_dashboard import schema as schema_module
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, '.data')
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+
+# A run this many times slower than the stored result counts as a regression
+REGRESSION_RATIO = 1.25
+
+# Activity files in the export the track benchmarks parse
+EXPORT_TRACKS = 200
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register ``fn(ctx)`` as the benchmark called ``name``."""
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+class Context:
+    """The data one dataset size is benchmarked on, prepared once."""
+
+    def __init__(self, data):
+        self.data = data
+        self.raw = core.load_data(io.BytesIO(data))
+        self.schema = core.detect_columns(self.raw)
+        self.df = core.add_derived_metrics(core.preprocess_data(self.raw), self.schema)
+        # Moving times as 'H:MM:SS' text, whatever the layout wrote
+        seconds = self.df[self.schema.moving_time].astype('int64')
+        self.duration_text = (
+            (seconds // 3600).astype(str) + ':' + (seconds // 60 % 60).astype(str).str.zfill(2)
+            + ':' + (seconds % 60).astype(str).str.zfill(2)
+        )
+        self.index = core.FilterIndex(self.df, self.schema)
+        self.rollup = core.RollupCube.build(self.index.df, self.schema)
+        self.records = core.RecordsIndex.build(self.index.df, self.schema)
+
+        # A typical sidebar state: the two most common types, the later half
+        # of the date range and distances up to the 90th percentile
+        self.activity_types = self.index.activity_options()[:2]
+        first, last = self.index.date_bounds()
+        self.date_range = ((first + (last - first) / 2).date(), last.date())
+        low, _ = self.index.distance_bounds()
+        self.distance_range = (low, float(self.df[self.schema.distance].quantile(0.9)))
+
+    @cached_property
+    def zip_data(self):
+        """The CSV deflated into an export-like ZIP, as ``activities.csv``."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('export/activities.csv', self.data)
+        return buffer.getvalue()
+
+    @cached_property
+    def track(self):
+        """A two-hour random-walk GPS track with one point per second, with heart rate and power."""
+        rng = np.random.default_rng(0)
+        n = 7200
+        lat = 47 + np.cumsum(rng.normal(0, 2e-5, n))
+        lon = 8 + np.cumsum(rng.normal(0, 2e-5, n))
+        return core.Track(
+            time=1.6e9 + np.arange(n, dtype='float64'),
+            lat=lat,
+            lon=lon,
+            elevation=400 + np.cumsum(rng.normal(0, 0.3, n)),
+            distance=np.r_[0, np.cumsum(core.haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]))],
+            heart_rate=np.clip(140 + np.cumsum(rng.normal(0, 0.3, n)), 100, 190),
+            power=rng.normal(200, 40, n),
+        )
+
+    @cached_property
+    def export(self):
+        """An export ZIP with EXPORT_TRACKS GPX/FIT tracks, the same for every size."""
+        buffer = io.BytesIO()
+        sample_data_generator.write_sample_export(buffer, EXPORT_TRACKS, seed=0, track_points=1000)
+        return core.StravaArchive(buffer.getvalue())
+
+    @cached_property
+    def track_store(self):
+        """A track store holding every track of the export."""
+        self._track_dir = tempfile.TemporaryDirectory()
+        store = core.TrackStore(self._track_dir.name)
+        store.process(self.export, workers=0)
+        return store
+
+    @cached_property
+    def sql_dir(self):
+        return tempfile.TemporaryDirectory()
+
+    @cached_property
+    def sql_dataset(self):
+        return self.build_sql_dataset()
+
+    def build_sql_dataset(self):
+        """A new SqlDataset of the frame with the backend from STRAVA_DASHBOARD_SQL, DuckDB if unset."""
+        backend = core.backend_from_env() or core.DEFAULT_SQL_BACKEND
+        path = os.path.join(self.sql_dir.name, f'{time.perf_counter_ns()}{core.SQL_BACKENDS[backend]}')
+        return core.SqlDataset.build(self.index.df, self.schema, backend, path)
+
+    def process_tracks(self, workers):
+        with tempfile.TemporaryDirectory() as directory:
+            core.TrackStore(directory).process(self.export, workers=workers)
+
+    def filtered(self):
+        mask = self.index.combine(
+            self.index.activity_mask(self.activity_types),
+            self.index.date_mask(self.date_range),
+            self.index.distance_mask(self.distance_range),
+        )
+        return self.index.take(mask)
+
+    def aggregates(self):
+        return core.Aggregates(self.index.df, self.schema)
+
+
+@benchmark('load')
+def _load(ctx):
+    core.load_data(io.BytesIO(ctx.data))
+
+
+@benchmark('load_chunked')
+def _load_chunked(ctx):
+    core.load_chunked(io.BytesIO(ctx.data))
+
+
+@benchmark('load_chunked_zip')
+def _load_chunked_zip(ctx):
+    core.load_chunked(core.open_csv(ctx.zip_data))
+
+
+@benchmark('preprocess')
+def _preprocess(ctx):
+    core.preprocess_data(ctx.raw)
+
+
+@benchmark('derived_metrics')
+def _derived_metrics(ctx):
+    core.add_derived_metrics(ctx.df, ctx.schema)
+
+
+@benchmark('parse_durations')
+def _parse_durations(ctx):
+    core.parse_durations(ctx.duration_text)
+
+
+@benchmark('resolve_schema')
+def _resolve_schema(ctx):
+    schema_module._resolve.cache_clear()
+    core.resolve_schema(ctx.raw.columns)
+
+
+@benchmark('filter_index_build')
+def _filter_index_build(ctx):
+    core.FilterIndex(ctx.df, ctx.schema)
+
+
+@benchmark('filter_index')
+def _filter_index(ctx):
+    ctx.filtered()
+
+
+@benchmark('apply_filters')
+def _apply_filters(ctx):
+    core.apply_filters(ctx.df, ctx.schema, ctx.activity_types, None, ctx.date_range, ctx.distance_range)
+
+
+@benchmark('rollup_build')
+def _rollup_build(ctx):
+    core.RollupCube.build(ctx.index.df, ctx.schema)
+
+
+@benchmark('rollup_slice_summary')
+def _rollup_slice_summary(ctx):
+    ctx.rollup.slice(ctx.activity_types, None, ctx.date_range).summary()
+
+
+@benchmark('tab_summary')
+def _tab_summary(ctx):
+    ctx.aggregates().summary
+
+
+@benchmark('tab_distance')
+def _tab_distance(ctx):
+    aggregates = ctx.aggregates()
+    aggregates.chart_points('activity', ctx.schema.distance)
+    aggregates.chart_points('activity', 'Cumulative Distance')
+
+
+@benchmark('tab_distance_weekly')
+def _tab_distance_weekly(ctx):
+    core.Aggregates(ctx.index.df, ctx.schema, ctx.rollup).chart_points('week', ctx.schema.distance)
+
+
+@benchmark('tab_activities')
+def _tab_activities(ctx):
+    aggregates = ctx.aggregates()
+    aggregates.activity_counts
+    aggregates.total_by_activity('distance')
+
+
+@benchmark('tab_heart_rate')
+def _tab_heart_rate(ctx):
+    aggregates = ctx.aggregates()
+    aggregates.histogram('avg_hr')
+    aggregates.chart_points('activity', ctx.schema.avg_hr)
+    aggregates.max_hr
+
+
+@benchmark('tab_calories')
+def _tab_calories(ctx):
+    aggregates = ctx.aggregates()
+    aggregates.histogram('calories')
+    aggregates.chart_points('activity', ctx.schema.calories)
+    aggregates.total_by_activity('calories')
+
+
+@benchmark('tab_elevation')
+def _tab_elevation(ctx):
+    ctx.aggregates().histogram('elevation')
+
+
+@benchmark('tab_weekly')
+def _tab_weekly(ctx):
+    ctx.aggregates().weekday
+
+
+@benchmark('tab_table_sorted_page')
+def _tab_table(ctx):
+    rows = ctx.aggregates().table_rows(ctx.schema.distance, False)
+    ctx.index.df.iloc[rows[:100]]
+
+
+@benchmark('tab_training_load')
+def _tab_training_load(ctx):
+    aggregates = ctx.aggregates()
+    aggregates.training_load
+    aggregates.chart_points('activity', core.SPEED_COL)
+
+
+@benchmark('insights')
+def _insights(ctx):
+    ctx.aggregates().insights
+
+
+@benchmark('sql_build')
+def _sql_build(ctx):
+    ctx.build_sql_dataset()
+
+
+@benchmark('sql_tabs')
+def _sql_tabs(ctx):
+    dataset = ctx.sql_dataset
+    where = dataset.where(ctx.activity_types, None, ctx.date_range, ctx.distance_range)
+    aggregates = core.SqlAggregates(ctx.index.df, ctx.schema, dataset, where)
+    aggregates.summary
+    aggregates.series('week')
+    aggregates.activity_summary
+    for field in ('avg_hr', 'calories', 'elevation'):
+        aggregates.histogram(field)
+    aggregates.max_hr
+    aggregates.weekday
+    aggregates.chart_points('activity', ctx.schema.distance)
+    aggregates.training_load
+    aggregates.insights
+
+
+@benchmark('records_build')
+def _records_build(ctx):
+    core.RecordsIndex.build(ctx.index.df, ctx.schema)
+
+
+@benchmark('records_insights')
+def _records_insights(ctx):
+    records = ctx.records.slice(ctx.activity_types, None, ctx.date_range, ctx.distance_range)
+    aggregates = core.Aggregates(ctx.filtered, ctx.schema, records=records)
+    aggregates.insights
+    aggregates.personal_records
+
+
+@benchmark('track_simplify')
+def _track_simplify(ctx):
+    core.simplified(ctx.track)
+
+
+@benchmark('route_lines')
+def _route_lines(ctx):
+    core.route_lines([core.simplified(ctx.track)] * 1000, max_points=core.ROUTE_POINT_BUDGET)
+
+
+@benchmark('tracks_process_serial')
+def _tracks_process_serial(ctx):
+    ctx.process_tracks(workers=0)
+
+
+@benchmark('tracks_process_parallel')
+def _tracks_process_parallel(ctx):
+    ctx.process_tracks(workers=None)
+
+
+@benchmark('heatmap_rasterize')
+def _heatmap_rasterize(ctx):
+    core.rasterize(ctx.track)
+
+
+@benchmark('heatmap_render')
+def _heatmap_render(ctx):
+    keys = [core.track_key(file) for file in ctx.export.tracks.values()]
+    heatmap = core.render_heatmap(ctx.track_store, keys)
+    core.encode_png(core.colorize(heatmap.counts))
+
+
+@benchmark('best_efforts')
+def _best_efforts(ctx):
+    core.best_efforts(ctx.track)
+
+
+def dataset(rows, layout, seed):
+    """Bytes of a generated CSV, written to DATA_DIR on first use."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'{layout}-{rows}-{seed}.csv')
+    if not os.path.exists(path):
+        print(f"Generating {rows:,} {layout} activities...", file=sys.stderr)
+        sample_data_generator.write_sample_csv(path, rows, seed=seed, layout=layout)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def best_time(fn, ctx, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(ctx)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sizes, layout, seed, repeat, only=None):
+    results = {}
+    for rows in sizes:
+        ctx = Context(dataset(rows, layout, seed))
+        timings = {}
+        for name, fn in BENCHMARKS:
+            if only and name not in only:
+                continue
+            # Large inputs take long enough that one run is representative
+            timings[name] = best_time(fn, ctx, repeat if rows < 1_000_000 else 1)
+            print(f"{rows:>10,} {name:<24} {timings[name] * 1000:10.2f} ms", file=sys.stderr)
+        results[str(rows)] = timings
+    return results
+
+
+def compare(results, baseline):
+    """Print each timing against ``baseline``; returns the regressions."""
+    regressions = []
+    print(f"{'rows':>10} {'benchmark':<24} {'baseline ms':>12} {'now ms':>10} {'ratio':>7}")
+    for rows, timings in results.items():
+        for name, seconds in timings.items():
+            before = baseline.get(rows, {}).get(name)
+            if before is None:
+                continue
+            ratio = seconds / before if before else float('inf')
+            flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+            print(f"{int(rows):>10,} {name:<24} {before * 1000:12.2f} {seconds * 1000:10.2f} {ratio:7.2f}{flag}")
+            if flag:
+                regressions.append((rows, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma separated dataset sizes")
+    parser.add_argument('--layout', choices=sample_data_generator.LAYOUTS, default='strava')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help="comma separated benchmark names to run")
+    parser.add_argument('--output', help="where to store the results (default benchmarks/results/latest.json)")
+    parser.add_argument('--compare', help="results file to compare against; exits with 1 on regressions")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    results = run(sizes, args.layout, args.seed, args.repeat, only)
+
+    output = args.output or os.path.join(RESULTS_DIR, 'latest.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'layout': args.layout,
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'machine': platform.platform(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
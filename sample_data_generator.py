@@ -1,60 +1,371 @@
 """
 Sample Strava data generator for testing the dashboard without real Strava data.
 Run this script to generate a sample CSV file.
+
+Every column is generated with vectorized NumPy/pandas operations, so
+even a million activities are mostly spent in pandas' CSV writer, and a seed
+makes the output reproducible.
+Three header layouts are available:
+
+- ``sample``: the columns of ``sample_strava_data.csv``
+- ``strava``: Strava's bulk export (activities.csv), with its repeated
+  Distance / Elapsed Time / Max Heart Rate columns, times in seconds and
+  thousands separators in Elevation Gain and Calories
+- ``legacy``: short headers, HH:MM:SS times and thousands separators
+
+``write_sample_export`` wraps the ``strava`` layout in an export ZIP with
+a GPX or gzipped FIT track per activity.
+
+Examples:
+    python sample_data_generator.py
+    python sample_data_generator.py --rows 1000000 --layout strava --seed 1 -o big.csv
+    python sample_data_generator.py --rows 500 --seed 1 --export -o export.zip
 """
 
-import pandas as pd
+import argparse
+import gzip
+import struct
+import zipfile
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pandas as pd
 
-def generate_sample_data(num_activities=100):
-    """Generate sample Strava activities data."""
-    
-    # Define activity types and gear
-    activity_types = ['Run', 'Ride', 'Swim', 'Hike', 'Walk']
-    gear_types = ['Running Shoes', 'Road Bike', 'Mountain Bike', 'Swimsuit', 'Hiking Boots', None]
-    
-    # Generate dates (last 6 months)
-    start_date = datetime.now() - timedelta(days=180)
-    dates = [start_date + timedelta(days=random.randint(0, 180)) for _ in range(num_activities)]
-    dates.sort()
-    
-    data = {
-        'Activity Date': dates,
-        'Activity Type': [random.choice(activity_types) for _ in range(num_activities)],
-        'Distance (km)': np.random.uniform(2, 50, num_activities),
-        'Elevation Gain (m)': np.random.uniform(0, 500, num_activities),
-        'Moving Time': [f"{random.randint(15, 180)}:00" for _ in range(num_activities)],
-        'Elapsed Time': [f"{random.randint(20, 200)}:00" for _ in range(num_activities)],
-        'Avg Heart Rate (bpm)': np.random.uniform(100, 180, num_activities),
-        'Max Heart Rate (bpm)': np.random.uniform(150, 200, num_activities),
-        'Calories (kcal)': np.random.uniform(100, 1000, num_activities),
-        'Gear': [random.choice(gear_types) for _ in range(num_activities)],
+LAYOUTS = ('sample', 'strava', 'legacy')
+
+DEFAULT_START = '2016-01-01'
+DEFAULT_END = '2026-01-01'
+
+# Activity type -> (share, median distance km, distance spread, speed km/h,
+#                   elevation m per km, average HR, kcal per hour, gear)
+ACTIVITY_MODEL = {
+    'Run': (0.38, 8.0, 0.4, 11.0, 10.0, 150, 700, ('Pegasus 40', 'Vaporfly 3', 'Trail Shoes')),
+    'Ride': (0.24, 40.0, 0.5, 25.0, 12.0, 135, 600, ('Road Bike', 'Gravel Bike')),
+    'Virtual Ride': (0.06, 30.0, 0.3, 30.0, 8.0, 140, 650, ('Trainer',)),
+    'Swim': (0.07, 2.0, 0.4, 3.0, 0.0, 130, 500, ('Swimsuit',)),
+    'Hike': (0.06, 12.0, 0.4, 4.5, 60.0, 120, 450, ('Hiking Boots',)),
+    'Walk': (0.15, 5.0, 0.4, 5.0, 5.0, 105, 280, ()),
+    'Weight Training': (0.04, np.nan, 0.0, np.nan, 0.0, 115, 350, ()),
+}
+
+# Share of activities recorded without gear or without a heart rate strap
+MISSING_GEAR = 0.1
+MISSING_HR = 0.1
+
+_MONTHS = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+_PARTS_OF_DAY = np.array(['Night'] * 5 + ['Morning'] * 7 + ['Afternoon'] * 5 + ['Evening'] * 4 + ['Night'] * 3)
+
+
+def _text(values):
+    return pd.Series(values).astype(str)
+
+
+def _zfill(values, width):
+    return _text(values).str.zfill(width)
+
+
+def _blank_missing(text, missing):
+    return text.where(~np.asarray(missing), '')
+
+
+def _hms(seconds):
+    """Durations as H:MM:SS strings."""
+    seconds = np.asarray(seconds, dtype='int64')
+    return _text(seconds // 3600) + ':' + _zfill(seconds // 60 % 60, 2) + ':' + _zfill(seconds % 60, 2)
+
+
+def _thousands(values, decimals=0):
+    """Numbers formatted like '1,120.0'; missing values become ''."""
+    values = np.asarray(values, dtype='float64')
+    missing = np.isnan(values)
+    scaled = np.rint(np.where(missing, 0, np.abs(values)) * 10 ** decimals).astype('int64')
+    whole, frac = scaled // 10 ** decimals, scaled % 10 ** decimals
+
+    text = _text(whole % 1000)
+    rest = whole // 1000
+    while rest.any():
+        has_more = rest > 0
+        grouped = _text(rest % 1000) + ',' + text.str.zfill(3)
+        text = text.where(~has_more, grouped)
+        rest = rest // 1000
+    if decimals:
+        text = text + '.' + _zfill(frac, decimals)
+    text = text.where(~(values < 0), '-' + text)
+    return _blank_missing(text, missing)
+
+
+def _strava_dates(dates):
+    """Dates as Strava writes them, e.g. 'Jan 5, 2020, 7:01:02 AM'."""
+    hour12 = (dates.hour + 11) % 12 + 1
+    return (
+        _text(_MONTHS[dates.month - 1]) + ' ' + _text(dates.day) + ', ' + _text(dates.year) + ', '
+        + _text(hour12) + ':' + _zfill(dates.minute, 2) + ':' + _zfill(dates.second, 2)
+        + ' ' + _text(np.where(dates.hour < 12, 'AM', 'PM'))
+    )
+
+
+def _activities(rng, n, start, end, first_id):
+    """Columns of ``n`` activities between ``start`` and ``end``, in date order."""
+    types = list(ACTIVITY_MODEL)
+    params = list(ACTIVITY_MODEL.values())
+    share, median_km, spread, speed, climb, hr, kcal_per_hour = (
+        np.array([p[i] for p in params], dtype='float64') for i in range(7)
+    )
+    gear = [p[7] for p in params]
+
+    offsets = np.sort(rng.integers(0, int((end - start).total_seconds()), n))
+    dates = pd.DatetimeIndex(start + pd.to_timedelta(offsets, unit='s'))
+    ids = first_id + np.cumsum(rng.integers(1, 1000, n))
+
+    kind = rng.choice(len(types), n, p=share / share.sum())
+    distance = median_km[kind] * np.exp(rng.normal(0, 1, n) * spread[kind])
+    moving = np.where(
+        np.isnan(distance),
+        rng.normal(45, 10, n).clip(10) * 60,
+        distance / speed[kind] * 3600 * rng.normal(1, 0.1, n).clip(0.5),
+    ).clip(1).astype('int64')
+    elapsed = (moving * (1 + rng.exponential(0.1, n))).astype('int64')
+    elevation = np.round(np.nan_to_num(distance) * climb[kind] * rng.exponential(1, n))
+
+    avg_hr = np.round(hr[kind] + rng.normal(0, 8, n))
+    max_hr = np.round(avg_hr + rng.uniform(15, 35, n))
+    no_hr = rng.random(n) < MISSING_HR
+    avg_hr[no_hr] = np.nan
+    max_hr[no_hr] = np.nan
+    calories = np.round(kcal_per_hour[kind] * moving / 3600 * rng.normal(1, 0.1, n).clip(0.5))
+
+    # Pick one of the type's gear, or none
+    gear_counts = np.array([len(options) for options in gear])
+    gear_table = np.array([list(options) + [None] * (gear_counts.max() - len(options)) for options in gear], dtype=object)
+    choice = (rng.random(n) * np.maximum(gear_counts[kind], 1)).astype('int64')
+    activity_gear = gear_table[kind, choice]
+    activity_gear[rng.random(n) < MISSING_GEAR] = None
+
+    return {
+        'dates': dates,
+        'ids': ids,
+        'type': np.array(types, dtype=object)[kind],
+        'distance': np.round(distance, 2),
+        'moving': moving,
+        'elapsed': elapsed,
+        'elevation': elevation,
+        'avg_hr': avg_hr,
+        'max_hr': max_hr,
+        'calories': calories,
+        'gear': activity_gear,
+        'fit': rng.random(n) < 0.7,
     }
-    
-    df = pd.DataFrame(data)
-    
-    # Round numeric columns
-    df['Distance (km)'] = df['Distance (km)'].round(2)
-    df['Elevation Gain (m)'] = df['Elevation Gain (m)'].round(0)
-    df['Avg Heart Rate (bpm)'] = df['Avg Heart Rate (bpm)'].round(0)
-    df['Max Heart Rate (bpm)'] = df['Max Heart Rate (bpm)'].round(0)
-    df['Calories (kcal)'] = df['Calories (kcal)'].round(0)
-    
+
+
+def _layout(columns, layout):
+    """Arrange generated columns under the headers of ``layout``."""
+    c = columns
+    if layout == 'sample':
+        return pd.DataFrame({
+            'Activity Date': c['dates'],
+            'Activity Type': c['type'],
+            'Distance (km)': c['distance'],
+            'Elevation Gain (m)': c['elevation'],
+            'Moving Time': _hms(c['moving']),
+            'Elapsed Time': _hms(c['elapsed']),
+            'Avg Heart Rate (bpm)': c['avg_hr'],
+            'Max Heart Rate (bpm)': c['max_hr'],
+            'Calories (kcal)': c['calories'],
+            'Gear': c['gear'],
+        })
+
+    if layout == 'legacy':
+        return pd.DataFrame({
+            'Date': c['dates'].strftime('%Y-%m-%d %H:%M:%S'),
+            'Type': c['type'],
+            'Name': _text(_PARTS_OF_DAY[c['dates'].hour]) + ' ' + _text(c['type']),
+            'Distance': _thousands(c['distance'], 2),
+            'Elevation Gain': _thousands(c['elevation']),
+            'Moving Time': _hms(c['moving']),
+            'Elapsed Time': _hms(c['elapsed']),
+            'Average Heart Rate': c['avg_hr'],
+            'Max Heart Rate': c['max_hr'],
+            'Calories': _thousands(c['calories']),
+            'Gear': c['gear'],
+        })
+
+    if layout != 'strava':
+        raise ValueError(f"Unknown layout: {layout}")
+    n = len(c['ids'])
+    blank = np.full(n, '', dtype=object)
+    meters = np.round(c['distance'] * 1000, 1)
+    extension = np.where(c['fit'], '.fit.gz', '.gpx')
+    # Strava's own order, including the repeated headers
+    fields = [
+        ('Activity ID', c['ids']),
+        ('Activity Date', _strava_dates(c['dates'])),
+        ('Activity Name', _text(_PARTS_OF_DAY[c['dates'].hour]) + ' ' + _text(c['type'])),
+        ('Activity Type', c['type']),
+        ('Activity Description', blank),
+        ('Elapsed Time', c['elapsed']),
+        ('Distance', c['distance']),
+        ('Max Heart Rate', c['max_hr']),
+        ('Relative Effort', blank),
+        ('Commute', np.full(n, 'false', dtype=object)),
+        ('Activity Private Note', blank),
+        ('Activity Gear', c['gear']),
+        ('Filename', 'activities/' + _text(c['ids']) + _text(extension)),
+        ('Elapsed Time', c['elapsed'].astype('float64')),
+        ('Moving Time', c['moving'].astype('float64')),
+        ('Distance', meters),
+        ('Average Speed', np.round(meters / c['moving'], 3)),
+        ('Elevation Gain', _thousands(c['elevation'], 1)),
+        ('Max Heart Rate', c['max_hr']),
+        ('Average Heart Rate', c['avg_hr']),
+        ('Calories', _thousands(c['calories'])),
+    ]
+    df = pd.DataFrame({i: np.asarray(values) for i, (_, values) in enumerate(fields)})
+    df.columns = [name for name, _ in fields]
     return df
 
+
+def generate_sample_data(num_activities=100, seed=None, layout='sample', start=DEFAULT_START, end=DEFAULT_END):
+    """Generate sample Strava activities data."""
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return _layout(_activities(rng, num_activities, start, end, 10_000_000_000), layout)
+
+
+def write_sample_csv(path, num_activities, seed=None, layout='sample', chunk_rows=100_000,
+                     start=DEFAULT_START, end=DEFAULT_END):
+    """
+    Write ``num_activities`` generated activities to ``path`` as CSV, in
+    date order, generating ``chunk_rows`` at a time (each over its own
+    slice of the date range) to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    chunks = max(1, -(-num_activities // chunk_rows))
+    bounds = pd.date_range(start, end, periods=chunks + 1)
+    first_id = 10_000_000_000
+    with open(path, 'w', newline='') as out:
+        for i in range(chunks):
+            rows = min(chunk_rows, num_activities - i * chunk_rows)
+            columns = _activities(rng, rows, bounds[i], bounds[i + 1], first_id)
+            first_id = int(columns['ids'][-1]) if rows else first_id
+            _layout(columns, layout).to_csv(out, index=False, header=i == 0)
+
+
+# FIT 'record' messages as written by ``_fit_track``: timestamp, position,
+# enhanced altitude, heart rate and power, after a one-byte record header
+_FIT_RECORD = np.dtype([
+    ('header', 'u1'), ('time', '<u4'), ('lat', '<i4'), ('lon', '<i4'), ('altitude', '<u4'), ('hr', 'u1'),
+    ('power', '<u2'),
+])
+_FIT_EPOCH = 631065600
+
+
+def _track(rng, start, seconds, distance_km, points):
+    """A random-walk route of ``points`` fixes covering ``distance_km`` in ``seconds``."""
+    n = int(max(2, min(points, seconds)))
+    time = start.timestamp() + np.linspace(0, seconds, n)
+    step = np.nan_to_num(distance_km) * 1000 / (n - 1)
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.15, n))
+    north, east = np.cumsum(step * np.cos(heading)), np.cumsum(step * np.sin(heading))
+    lat0, lon0 = 47.37 + rng.normal(0, 0.2), 8.54 + rng.normal(0, 0.3)
+    lat = lat0 + north / 111_195
+    lon = lon0 + east / (111_195 * np.cos(np.radians(lat0)))
+    elevation = 400 + np.cumsum(rng.normal(0, 0.5, n))
+    return time, lat, lon, elevation
+
+
+def _heart_rate(rng, n):
+    """A heart rate drifting between 110 and 175 bpm."""
+    return np.clip(140 + np.cumsum(rng.normal(0, 0.3, n)), 110, 175).round()
+
+
+def _gpx_track(time, lat, lon, elevation, rng):
+    stamps = pd.to_datetime(time, unit='s', utc=True).strftime('%Y-%m-%dT%H:%M:%SZ')
+    points = ''.join(
+        f'<trkpt lat="{a:.7f}" lon="{b:.7f}"><ele>{e:.1f}</ele><time>{t}</time>'
+        f'<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>{h:.0f}</gpxtpx:hr>'
+        '</gpxtpx:TrackPointExtension></extensions></trkpt>'
+        for a, b, e, t, h in zip(lat, lon, elevation, stamps, _heart_rate(rng, len(time)))
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx creator="sample_data_generator" version="1.1" xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">'
+        f'<trk><trkseg>{points}</trkseg></trk></gpx>'
+    ).encode()
+
+
+def _fit_track(time, lat, lon, elevation, rng, power=False):
+    """
+    A FIT file of record messages, with power if ``power`` (file CRC left
+    as 0, i.e. not computed).
+    """
+    definition = bytes([0x40, 0, 0]) + struct.pack('<H', 20) + bytes([
+        6, 253, 4, 0x86, 0, 4, 0x85, 1, 4, 0x85, 78, 4, 0x86, 3, 1, 0x02, 7, 2, 0x84,
+    ])
+    records = np.zeros(len(time), dtype=_FIT_RECORD)
+    records['time'] = np.round(time - _FIT_EPOCH)
+    records['lat'] = np.round(lat / 180 * 2 ** 31)
+    records['lon'] = np.round(lon / 180 * 2 ** 31)
+    records['altitude'] = np.round((elevation + 500) * 5)
+    records['hr'] = _heart_rate(rng, len(time))
+    records['power'] = np.clip(rng.normal(200, 40, len(time)), 0, None) if power else 0xFFFF
+    body = definition + records.tobytes()
+    header = struct.pack('<BBHI4sH', 14, 0x20, 2132, len(body), b'.FIT', 0)
+    return header + body + b'\x00\x00'
+
+
+def write_sample_export(path, num_activities, seed=None, track_points=1800, max_tracks=None,
+                        start=DEFAULT_START, end=DEFAULT_END):
+    """
+    Write a Strava-style export ZIP to ``path``: ``activities.csv`` in the
+    ``strava`` layout and, for each activity (or the first ``max_tracks``),
+    a random-walk track of up to ``track_points`` fixes under
+    ``activities/``, as GPX or gzipped FIT like the Filename column says.
+    """
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC')
+    columns = _activities(rng, num_activities, start, end, 10_000_000_000)
+    df = _layout(columns, 'strava')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('export/activities.csv', df.to_csv(index=False))
+        count = num_activities if max_tracks is None else min(max_tracks, num_activities)
+        for i in range(count):
+            track = _track(rng, columns['dates'][i], columns['moving'][i], columns['distance'][i], track_points)
+            filename = df['Filename'].iloc[i]
+            if columns['fit'][i]:
+                # Already gzipped, so stored as is
+                fit = _fit_track(*track, rng, power='Ride' in columns['type'][i])
+                archive.writestr('export/' + filename, gzip.compress(fit, 1), compress_type=zipfile.ZIP_STORED)
+            else:
+                archive.writestr('export/' + filename, _gpx_track(*track, rng))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100, help="number of activities (default 100)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible output")
+    parser.add_argument('--layout', choices=LAYOUTS, default='sample', help="CSV header layout")
+    parser.add_argument('--export', action='store_true',
+                        help="write an export ZIP with a GPS track per activity (strava layout)")
+    parser.add_argument('-o', '--output', default="sample_strava_data.csv", help="output CSV file")
+    args = parser.parse_args()
+
+    if args.export:
+        write_sample_export(args.output, args.rows, seed=args.seed)
+        print(f"✅ Sample export generated: {args.output}")
+        print(f"📊 Generated {args.rows} activities with GPS tracks")
+        return
+
+    write_sample_csv(args.output, args.rows, seed=args.seed, layout=args.layout)
+    print(f"✅ Sample data generated: {args.output}")
+    print(f"📊 Generated {args.rows} activities")
+    if args.rows <= 100_000:
+        df = pd.read_csv(args.output)
+        print(f"\nFirst few rows:")
+        print(df.head())
+        print(f"\nData summary:")
+        print(df.describe())
+
+
 if __name__ == "__main__":
-    # Generate sample data
-    df = generate_sample_data(num_activities=100)
-    
-    # Save to CSV
-    output_file = "sample_strava_data.csv"
-    df.to_csv(output_file, index=False)
-    
-    print(f"✅ Sample data generated: {output_file}")
-    print(f"📊 Generated {len(df)} activities")
-    print(f"\nFirst few rows:")
-    print(df.head())
-    print(f"\nData summary:")
-    print(df.describe())
+    main()
@@ -0,0 +1,219 @@
+"""
+Headless analytics core for the Strava Activities Dashboard.
+
+Everything in here is plain pandas so it can be imported from batch jobs,
+benchmarks or the Streamlit apps without running a Streamlit script. The
+Plotly figure builders live in ``strava_dashboard.charts`` and are not
+imported here.
+"""
+
+from strava_dashboard.archive import ACTIVITIES_CSV, TRACK_FORMATS, StravaArchive, TrackFile, inflate, is_zip, open_csv
+from strava_dashboard.cache import ActivityCache, cache_dir_from_env, content_hash
+from strava_dashboard.durations import format_duration, parse_durations
+from strava_dashboard.downsample import DEFAULT_MAX_POINTS, downsample, lttb_indices, max_points_from_env
+from strava_dashboard.export import EXPORT_FORMATS, ExportCache, export_bytes, iter_csv
+from strava_dashboard.loader import classify_columns, load_chunked, load_data, load_dataset, preprocess_data
+from strava_dashboard.metrics import (
+    DEFAULT_REST_HR,
+    DERIVED_COLUMNS,
+    PACE_COL,
+    SPEED_COL,
+    TRIMP_COL,
+    add_derived_metrics,
+    ewma,
+    training_load,
+)
+from strava_dashboard.memory import current_rss, format_bytes, memory_budget_from_env, peak_rss
+from strava_dashboard.profiling import StageTimer, stage
+from strava_dashboard.schema import COLUMN_ALIASES, ColumnSchema, detect_columns, resolve_schema
+from strava_dashboard.store import ActivityStore, activity_keys
+from strava_dashboard.records import DEFAULT_TOP_K, PACE_BAND_LABELS, PACE_BANDS, RECORDS, RecordsIndex
+from strava_dashboard.rollup import RollupCube
+from strava_dashboard.tracks import (
+    ROUTE_POINT_BUDGET,
+    SIMPLIFY_TOLERANCE,
+    SUMMARY_FIELDS,
+    Track,
+    haversine,
+    parse_track,
+    route_lines,
+    simplified,
+    simplify,
+    summarize,
+)
+from strava_dashboard.trackstore import (
+    GPS_COLUMNS,
+    TRACKS_VERSION,
+    TrackStore,
+    activity_efforts,
+    add_track_summaries,
+    track_key,
+)
+from strava_dashboard.efforts import (
+    EFFORT_DISTANCES,
+    EFFORT_DURATIONS,
+    EFFORT_FIELDS,
+    EFFORT_KINDS,
+    MAX_SAMPLE_GAP,
+    all_time_bests,
+    best_averages,
+    best_efforts,
+    fastest_times,
+)
+from strava_dashboard.parallel import parse_files, workers_from_env
+from strava_dashboard.heatmap import (
+    HEATMAP_COVERAGE,
+    HEATMAP_IMAGE_SIZE,
+    HEATMAP_ZOOMS,
+    Heatmap,
+    colorize,
+    encode_png,
+    rasterize,
+    render_heatmap,
+)
+from strava_dashboard.sql import DEFAULT_SQL_BACKEND, SQL_BACKENDS, SqlAggregates, SqlDataset, backend_from_env
+from strava_dashboard.table import DEFAULT_PAGE_SIZE, page_bounds, search_mask, searchable_columns, sort_order, table_rows
+from strava_dashboard.filters import (
+    FilterIndex,
+    add_day_of_week,
+    filter_by_activity,
+    filter_by_gear,
+    filter_by_date,
+    filter_by_distance,
+    apply_filters,
+)
+from strava_dashboard.aggregations import (
+    DAY_ORDER,
+    AggregateCache,
+    Aggregates,
+    activity_summary,
+    summary_metrics,
+    distance_timeline,
+    activity_counts,
+    histogram_counts,
+    total_by_activity,
+    metric_timeline,
+    max_hr_stats,
+    weekday_summary,
+    key_insights,
+)
+
+__all__ = [
+    "ACTIVITIES_CSV",
+    "TRACK_FORMATS",
+    "StravaArchive",
+    "TrackFile",
+    "inflate",
+    "is_zip",
+    "open_csv",
+    "ActivityCache",
+    "cache_dir_from_env",
+    "content_hash",
+    "format_duration",
+    "parse_durations",
+    "DEFAULT_MAX_POINTS",
+    "downsample",
+    "lttb_indices",
+    "max_points_from_env",
+    "EXPORT_FORMATS",
+    "ExportCache",
+    "export_bytes",
+    "iter_csv",
+    "classify_columns",
+    "load_chunked",
+    "load_data",
+    "load_dataset",
+    "DEFAULT_REST_HR",
+    "DERIVED_COLUMNS",
+    "PACE_COL",
+    "SPEED_COL",
+    "TRIMP_COL",
+    "add_derived_metrics",
+    "ewma",
+    "training_load",
+    "current_rss",
+    "format_bytes",
+    "memory_budget_from_env",
+    "peak_rss",
+    "StageTimer",
+    "stage",
+    "preprocess_data",
+    "COLUMN_ALIASES",
+    "ColumnSchema",
+    "detect_columns",
+    "resolve_schema",
+    "ActivityStore",
+    "activity_keys",
+    "DEFAULT_TOP_K",
+    "PACE_BAND_LABELS",
+    "PACE_BANDS",
+    "RECORDS",
+    "RecordsIndex",
+    "RollupCube",
+    "ROUTE_POINT_BUDGET",
+    "SIMPLIFY_TOLERANCE",
+    "SUMMARY_FIELDS",
+    "Track",
+    "haversine",
+    "parse_track",
+    "route_lines",
+    "simplified",
+    "simplify",
+    "summarize",
+    "GPS_COLUMNS",
+    "TRACKS_VERSION",
+    "TrackStore",
+    "activity_efforts",
+    "add_track_summaries",
+    "track_key",
+    "EFFORT_DISTANCES",
+    "EFFORT_DURATIONS",
+    "EFFORT_FIELDS",
+    "EFFORT_KINDS",
+    "MAX_SAMPLE_GAP",
+    "all_time_bests",
+    "best_averages",
+    "best_efforts",
+    "fastest_times",
+    "parse_files",
+    "workers_from_env",
+    "HEATMAP_COVERAGE",
+    "HEATMAP_IMAGE_SIZE",
+    "HEATMAP_ZOOMS",
+    "Heatmap",
+    "colorize",
+    "encode_png",
+    "rasterize",
+    "render_heatmap",
+    "DEFAULT_SQL_BACKEND",
+    "SQL_BACKENDS",
+    "SqlAggregates",
+    "SqlDataset",
+    "backend_from_env",
+    "DEFAULT_PAGE_SIZE",
+    "page_bounds",
+    "search_mask",
+    "searchable_columns",
+    "sort_order",
+    "table_rows",
+    "FilterIndex",
+    "filter_by_activity",
+    "filter_by_gear",
+    "filter_by_date",
+    "filter_by_distance",
+    "apply_filters",
+    "DAY_ORDER",
+    "AggregateCache",
+    "Aggregates",
+    "activity_summary",
+    "add_day_of_week",
+    "summary_metrics",
+    "distance_timeline",
+    "activity_counts",
+    "histogram_counts",
+    "total_by_activity",
+    "metric_timeline",
+    "max_hr_stats",
+    "weekday_summary",
+    "key_insights",
+]
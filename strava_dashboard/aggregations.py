@@ -0,0 +1,359 @@
+"""
+Aggregations behind the dashboard's summary metrics, tabs and insights.
+
+All functions take the (filtered) activities frame and the detected
+ColumnSchema and return plain pandas objects or dicts, with no plotting.
+``Aggregates`` bundles them for one filtered frame, computing each on first
+use only, and ``AggregateCache`` keeps recent bundles per filter state.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.downsample import DEFAULT_MAX_POINTS, downsample
+from strava_dashboard.metrics import training_load
+from strava_dashboard.records import RecordsIndex
+from strava_dashboard.rollup import RollupCube
+from strava_dashboard.schema import DAY_ORDER
+from strava_dashboard.table import table_rows
+
+
+def _has(df, col):
+    return bool(col) and col in df.columns
+
+
+def summary_metrics(df, schema):
+    """Totals shown in the Summary Statistics row; missing fields map to None."""
+    return {
+        'activities': len(df),
+        'distance': df[schema.distance].sum() if _has(df, schema.distance) else None,
+        'elevation': df[schema.elevation].sum() if _has(df, schema.elevation) else None,
+        'calories': df[schema.calories].sum() if _has(df, schema.calories) else None,
+        'avg_hr': df[schema.avg_hr].mean() if _has(df, schema.avg_hr) else None,
+    }
+
+
+def _sort_by_date(df, date_col):
+    if df[date_col].is_monotonic_increasing:
+        # Frames from FilterIndex are already in date order
+        return df
+    return df.sort_values(date_col)
+
+
+def metric_timeline(df, date_col, value_col):
+    """Return ``df`` sorted by date for plotting ``value_col`` over time."""
+    if not _has(df, date_col) or not _has(df, value_col):
+        return None
+    return _sort_by_date(df, date_col)
+
+
+def distance_timeline(df, schema):
+    """Date and distance of each activity in date order, plus 'Cumulative Distance'."""
+    df_sorted = metric_timeline(df, schema.date, schema.distance)
+    if df_sorted is None:
+        return None
+    timeline = df_sorted[[schema.date, schema.distance]]
+    return timeline.assign(**{'Cumulative Distance': timeline[schema.distance].astype('float64').cumsum()})
+
+
+def activity_counts(df, activity_col):
+    """Number of activities per activity type, most common first."""
+    if not _has(df, activity_col):
+        return None
+    counts = df[activity_col].value_counts()
+    # Categorical columns also report types that were filtered out
+    return counts[counts > 0]
+
+
+def total_by_activity(df, activity_col, value_col):
+    """Sum of ``value_col`` per activity type, largest first."""
+    if not _has(df, activity_col) or not _has(df, value_col):
+        return None
+    return df.groupby(activity_col, observed=True)[value_col].sum().sort_values(ascending=False)
+
+
+def activity_summary(df, schema):
+    """
+    Activity count, total distance and total calories per activity type in
+    a single grouping pass, most common type first. Columns whose source
+    field is missing are left out.
+    """
+    if not _has(df, schema.activity):
+        return None
+    aggs = {'count': (schema.activity, 'size')}
+    if _has(df, schema.distance):
+        aggs['distance'] = (schema.distance, 'sum')
+    if _has(df, schema.calories):
+        aggs['calories'] = (schema.calories, 'sum')
+    summary = df.groupby(schema.activity, observed=True).agg(**aggs)
+    return summary.sort_values('count', ascending=False, kind='stable')
+
+
+def max_hr_stats(df, max_hr_col):
+    """Highest and mean of the per-activity max heart rate."""
+    if not _has(df, max_hr_col):
+        return None
+    return {
+        'max': df[max_hr_col].max(),
+        'mean': df[max_hr_col].mean(),
+    }
+
+
+def histogram_counts(df, value_col, nbins=30):
+    """
+    Number of activities in each of ``nbins`` equal-width bins of
+    ``value_col``, as a frame with 'start', 'end' and 'count' columns.
+    Missing values are left out.
+    """
+    if not _has(df, value_col):
+        return None
+    values = df[value_col].to_numpy(dtype='float64', na_value=np.nan)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return pd.DataFrame({'start': [], 'end': [], 'count': []})
+    counts, edges = np.histogram(values, bins=nbins)
+    return pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'count': counts})
+
+
+def weekday_summary(df, schema):
+    """
+    Per-weekday activity count, total distance, total calories and mean
+    average heart rate, indexed by DAY_ORDER. Columns whose source field is
+    missing are left out.
+    """
+    if 'Day of Week' not in df.columns:
+        return None
+
+    aggs = {'count': ('Day of Week', 'size')}
+    if _has(df, schema.distance):
+        aggs['distance'] = (schema.distance, 'sum')
+    if _has(df, schema.calories):
+        aggs['calories'] = (schema.calories, 'sum')
+    if _has(df, schema.avg_hr):
+        aggs['avg_hr'] = (schema.avg_hr, 'mean')
+    summary = df.groupby('Day of Week', observed=True).agg(**aggs)
+    return summary.reindex(DAY_ORDER, fill_value=0)
+
+
+def key_insights(df, schema):
+    """
+    Record activities for the Key Insights section.
+
+    Returns a dict mapping 'distance', 'elevation' and 'calories' to
+    ``(value, activity_type)`` tuples, or None when the field is missing or
+    there are no activities.
+    """
+    insights = {}
+    for key, col in (('distance', schema.distance), ('elevation', schema.elevation), ('calories', schema.calories)):
+        if not _has(df, col) or df[col].notna().sum() == 0:
+            insights[key] = None
+            continue
+        row = df.loc[df[col].idxmax()]
+        activity = row[schema.activity] if _has(df, schema.activity) else None
+        insights[key] = (row[col], activity)
+    return insights
+
+
+class Aggregates:
+    """
+    Every aggregation the dashboard shows, for one filtered frame.
+
+    Each attribute is computed the first time it is read and then kept, so
+    a tab that is not rendered costs nothing and views shared between tabs
+    (the date-sorted timeline, the per-activity grouping) are built once.
+
+    ``df`` may be a zero-argument callable producing the frame, so nothing
+    is materialised until a raw-row aggregation needs it. ``rollup`` is an
+    optional RollupCube slice covering exactly the same activities; when
+    given, totals, weekday bars and period series are read from it.
+    ``records`` is likewise an optional RecordsIndex slice answering the
+    insights and personal records.
+    """
+
+    def __init__(self, df, schema, rollup=None, records=None):
+        self._df = df
+        self.schema = schema
+        self.rollup = rollup
+        self.records = records
+
+    @cached_property
+    def df(self):
+        return self._df() if callable(self._df) else self._df
+
+    @cached_property
+    def summary(self):
+        if self.rollup is not None:
+            return self.rollup.summary()
+        return summary_metrics(self.df, self.schema)
+
+    @cached_property
+    def timeline(self):
+        """The filtered activities in date order (None without a date column)."""
+        if not _has(self.df, self.schema.date):
+            return None
+        return _sort_by_date(self.df, self.schema.date)
+
+    @cached_property
+    def distance_timeline(self):
+        if self.timeline is None:
+            return None
+        return distance_timeline(self.timeline, self.schema)
+
+    @cached_property
+    def activity_summary(self):
+        return activity_summary(self.df, self.schema)
+
+    @cached_property
+    def activity_counts(self):
+        if self.activity_summary is None:
+            return None
+        counts = self.activity_summary['count']
+        return counts[counts > 0]
+
+    def total_by_activity(self, field):
+        """Per-type total of 'distance' or 'calories', largest first."""
+        if self.activity_summary is None or field not in self.activity_summary.columns:
+            return None
+        return self.activity_summary[field].sort_values(ascending=False)
+
+    def histogram(self, field, nbins=30):
+        """``histogram_counts`` of the column playing role ``field``."""
+        key = f'_histogram_{field}_{nbins}'
+        if key not in self.__dict__:
+            self.__dict__[key] = histogram_counts(self.df, getattr(self.schema, field), nbins)
+        return self.__dict__[key]
+
+    @cached_property
+    def max_hr(self):
+        return max_hr_stats(self.df, self.schema.max_hr)
+
+    @cached_property
+    def weekday(self):
+        if self.rollup is not None:
+            return self.rollup.weekday()
+        return weekday_summary(self.df, self.schema)
+
+    @cached_property
+    def _period_rollup(self):
+        if self.rollup is not None:
+            return self.rollup
+        return RollupCube.build(self.df, self.schema)
+
+    def series(self, granularity):
+        """Totals per 'day', 'week' or 'month' (None without a date column)."""
+        if self._period_rollup is None:
+            return None
+        key = f'_series_{granularity}'
+        if key not in self.__dict__:
+            self.__dict__[key] = self._period_rollup.series(granularity)
+        return self.__dict__[key]
+
+    def period_timeline(self, granularity):
+        """
+        ``series(granularity)`` laid out like ``distance_timeline``: one row
+        per period with the dataset's own date, distance, calorie and
+        average HR column names, so the same chart code plots either.
+        """
+        series = self.series(granularity)
+        if series is None:
+            return None
+        names = {
+            'distance': self.schema.distance,
+            'calories': self.schema.calories,
+            'avg_hr': self.schema.avg_hr,
+        }
+        timeline = series[[field for field in names if field in series.columns]]
+        timeline = timeline.rename(columns=names).rename_axis(self.schema.date).reset_index()
+        if 'distance' in series.columns:
+            timeline['Cumulative Distance'] = series['distance'].cumsum().to_numpy()
+        return timeline
+
+    def chart_points(self, granularity, value_col, max_points=DEFAULT_MAX_POINTS):
+        """
+        Rows of the 'activity' timeline or a 'day' / 'week' / 'month'
+        ``period_timeline`` to plot ``value_col`` against the date with,
+        downsampled to about ``max_points`` points (None without dates).
+        """
+        key = f'_points_{granularity}_{value_col}_{max_points}'
+        if key not in self.__dict__:
+            if granularity == 'activity':
+                frame = self.distance_timeline
+                if frame is None or value_col not in frame.columns:
+                    frame = self.timeline
+            else:
+                frame = self.period_timeline(granularity)
+            if frame is not None and value_col in frame.columns:
+                frame = downsample(frame, self.schema.date, value_col, max_points)
+            self.__dict__[key] = frame
+        return self.__dict__[key]
+
+    def table_rows(self, sort_by=None, ascending=True, search_col=None, search=None):
+        """Memoised ``table.table_rows`` of the filtered frame."""
+        key = ('_table', sort_by, ascending, search_col, search or None)
+        if key not in self.__dict__:
+            self.__dict__[key] = table_rows(self.df, sort_by, ascending, search_col, search)
+        return self.__dict__[key]
+
+    def take(self, positions):
+        """The rows at ``positions`` given by ``table_rows``, e.g. one page of them."""
+        return self.df.iloc[positions]
+
+    def select(self, columns):
+        """The given columns (those present) of the filtered activities, in frame order."""
+        return self.df[[col for col in dict.fromkeys(columns) if col and col in self.df.columns]]
+
+    @cached_property
+    def training_load(self):
+        """Daily acute and chronic ``metrics.training_load`` of the filtered activities."""
+        return training_load(self.df, self.schema.date)
+
+    @cached_property
+    def insights(self):
+        if self.records is not None:
+            return self.records.insights(rows=lambda: self.df)
+        return key_insights(self.df, self.schema)
+
+    @cached_property
+    def personal_records(self):
+        """``RecordsIndex.table`` of the filtered activities."""
+        records = self.records if self.records is not None else RecordsIndex.build(self.df, self.schema).slice()
+        return records.table(rows=lambda: self.df)
+
+
+class AggregateCache:
+    """
+    Thread-safe LRU of Aggregates keyed by ``(dataset key, filter state)``.
+
+    Going back to a previous filter combination reuses everything computed
+    for it; only the ``maxsize`` most recently used states are kept.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, df_factory, schema, rollup=None, records=None):
+        """
+        Aggregates for ``key``; on a miss they are built over
+        ``df_factory()``, which is only called once something needs the rows.
+        """
+        return self.build(key, lambda: Aggregates(df_factory, schema, rollup, records))
+
+    def build(self, key, factory):
+        """Cached aggregates for ``key``, made by ``factory()`` on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        aggregates = factory()
+        with self._lock:
+            self._entries[key] = aggregates
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return aggregates
@@ -0,0 +1,147 @@
+"""
+Reading Strava's bulk export ZIP without extracting it.
+
+The export holds ``activities.csv`` and one GPX, FIT or TCX file per
+activity under ``activities/`` (FIT and TCX files usually gzipped).
+``open_csv`` streams ``activities.csv`` out of the archive, decompressing
+only as far as the CSV reader has got, so an upload can be either a bare
+CSV or the whole export. ``StravaArchive.tracks`` indexes the activity
+files by their entry in the ZIP's directory (path, offset and sizes) and a
+file is only decompressed when ``read_track`` asks for it, or its raw
+bytes are read from that offset by ``read_raw`` for another process to
+decompress (see ``strava_dashboard.parallel``).
+"""
+
+import gzip
+import io
+import posixpath
+import struct
+import zipfile
+import zlib
+from collections import namedtuple
+from functools import cached_property
+
+ACTIVITIES_CSV = 'activities.csv'
+TRACK_FORMATS = ('gpx', 'fit', 'tcx')
+
+# One activity file in the archive: its path relative to the export root,
+# format, whether it is gzipped, where its entry starts in the ZIP, its
+# sizes, the CRC-32 the ZIP records for it and its ZIP compression method
+TrackFile = namedtuple('TrackFile', 'path format gzipped offset size compressed_size crc compression')
+
+# Fixed part of a ZIP local file header; the name and extra field lengths are last
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+
+def is_zip(data):
+    """Whether ``data`` (bytes) is a ZIP archive."""
+    return zipfile.is_zipfile(io.BytesIO(data))
+
+
+def _track_format(name):
+    """``(format, gzipped)`` of an activity file name, or None for other files."""
+    base = name.lower()
+    gzipped = base.endswith('.gz')
+    if gzipped:
+        base = base[:-3]
+    extension = posixpath.splitext(base)[1].lstrip('.')
+    return (extension, gzipped) if extension in TRACK_FORMATS else None
+
+
+class StravaArchive:
+    """A Strava bulk export ZIP, read from bytes, a path or a file object."""
+
+    def __init__(self, source):
+        # Archives in memory can be sliced without going through zipfile
+        self._buffer = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buffer = memoryview(source)
+            source = io.BytesIO(source)
+        self.zip = zipfile.ZipFile(source)
+
+    @cached_property
+    def csv_entry(self):
+        """The archive's activities.csv (the shallowest one if several)."""
+        entries = [
+            info for info in self.zip.infolist()
+            if posixpath.basename(info.filename).lower() == ACTIVITIES_CSV
+        ]
+        if not entries:
+            raise ValueError(f"The archive has no {ACTIVITIES_CSV}")
+        return min(entries, key=lambda info: info.filename.count('/'))
+
+    @property
+    def root(self):
+        """Directory of activities.csv, which activity file paths are relative to."""
+        return posixpath.dirname(self.csv_entry.filename)
+
+    def open_csv(self):
+        """activities.csv as a file object decompressed while it is read."""
+        return self.zip.open(self.csv_entry)
+
+    @cached_property
+    def tracks(self):
+        """
+        Activity files by path relative to the export root (as in the CSV's
+        Filename column). Built from the ZIP directory alone.
+        """
+        tracks = {}
+        for info in self.zip.infolist():
+            kind = _track_format(info.filename)
+            if kind is None or info.is_dir():
+                continue
+            path = posixpath.relpath(info.filename, self.root) if self.root else info.filename
+            tracks[path] = TrackFile(
+                path, kind[0], kind[1], info.header_offset, info.file_size, info.compress_size, info.CRC,
+                info.compress_type,
+            )
+        return tracks
+
+    def track(self, filename):
+        """The TrackFile of a Filename column value, or None."""
+        if not isinstance(filename, str) or not filename:
+            return None
+        return self.tracks.get(posixpath.normpath(filename.strip()))
+
+    def read_track(self, filename):
+        """Decompressed bytes of an activity file (gunzipped too), or None if absent."""
+        track = self.track(filename)
+        if track is None:
+            return None
+        data = self.zip.read(self._member(track))
+        return gzip.decompress(data) if track.gzipped else data
+
+    def _member(self, track):
+        return posixpath.join(self.root, track.path) if self.root else track.path
+
+    def read_raw(self, track):
+        """
+        ``(data, compression)`` of a TrackFile: its bytes as stored in the
+        ZIP, for ``inflate``, read straight from its offset. Archives that
+        are not in memory or use other methods than stored and deflated
+        are decompressed here instead (compression 0).
+        """
+        if self._buffer is None or track.compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self.zip.read(self._member(track)), zipfile.ZIP_STORED
+        header = _LOCAL_HEADER.unpack_from(self._buffer, track.offset)
+        if header[0] != b'PK\x03\x04':
+            raise ValueError(f"Bad ZIP entry for {track.path}")
+        start = track.offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+        return bytes(self._buffer[start:start + track.compressed_size]), track.compression
+
+
+def inflate(data, compression):
+    """Bytes of a ZIP entry from ``StravaArchive.read_raw``, decompressed."""
+    if compression == zipfile.ZIP_DEFLATED:
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
+
+
+def open_csv(data):
+    """
+    A readable file object over the activities CSV in ``data``, the bytes of
+    an upload that is either the CSV itself or the export ZIP.
+    """
+    if is_zip(data):
+        return StravaArchive(data).open_csv()
+    return io.BytesIO(data)
@@ -0,0 +1,151 @@
+"""
+On-disk cache of processed activity frames.
+
+Processed frames are stored as uncompressed Arrow IPC (Feather v2) files
+named after a hash of the raw upload, so a restarted server or a second
+replica pointed at the same directory can memory-map the result instead of
+parsing the CSV again. The directory is kept under a byte budget by
+evicting the least recently used files.
+"""
+
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = None
+
+# Bump whenever preprocessing changes so stale entries are not reused.
+CACHE_VERSION = 5
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'strava_dashboard')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(data):
+    """Hex digest identifying an upload by its bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_dir_from_env(temporary=False):
+    """
+    ``(directory, max_bytes)`` of the on-disk cache from
+    STRAVA_DASHBOARD_CACHE_DIR and STRAVA_DASHBOARD_CACHE_MB, or None when
+    the size is set to 0. With ``temporary`` a disabled cache gives a
+    temporary directory removed when the process exits, with the default
+    budget, instead.
+    """
+    directory = os.environ.get('STRAVA_DASHBOARD_CACHE_DIR', DEFAULT_CACHE_DIR)
+    max_mb = float(os.environ.get('STRAVA_DASHBOARD_CACHE_MB', DEFAULT_MAX_BYTES / (1024 * 1024)))
+    if max_mb > 0:
+        return directory, int(max_mb * 1024 * 1024)
+    if not temporary:
+        return None
+    directory = tempfile.mkdtemp(prefix='strava_dashboard_')
+    atexit.register(shutil.rmtree, directory, True)
+    return directory, DEFAULT_MAX_BYTES
+
+
+def read_arrow(path):
+    """Memory-map an Arrow IPC file written by ``write_arrow`` into a DataFrame."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def write_arrow(df, path):
+    """Write ``df`` as an uncompressed Arrow IPC file, atomically replacing ``path``."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    # Atomic rename so concurrent readers never see a partial file.
+    os.replace(tmp_path, path)
+
+
+class ActivityCache:
+    """
+    Size-bounded directory of processed frames keyed by content hash.
+
+    Reads touch the file's modification time, which is what eviction orders
+    by, so the directory behaves as an LRU cache across processes.
+    """
+
+    suffix = '.arrow'
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from STRAVA_DASHBOARD_CACHE_DIR and
+        STRAVA_DASHBOARD_CACHE_MB; returns None if pyarrow is missing or the
+        size is set to 0.
+        """
+        if pa is None:
+            return None
+        settings = cache_dir_from_env()
+        return cls(*settings) if settings is not None else None
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f'v{CACHE_VERSION}-{key}{self.suffix}')
+
+    def get(self, key):
+        """Return the cached frame for ``key``, or None on a miss."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = read_arrow(path)
+            os.utime(path)
+        except (OSError, pa.ArrowInvalid):
+            # Corrupt entry; drop it and re-parse.
+            self._remove(path)
+            return None
+        return df
+
+    def put(self, key, df):
+        """Store ``df`` under ``key`` and evict old entries over budget."""
+        os.makedirs(self.directory, exist_ok=True)
+        write_arrow(df, self.path_for(key))
+        self.evict()
+
+    def entries(self):
+        """Cached files as ``(mtime, size, path)`` tuples, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Delete least recently used files until the directory fits the budget."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        # Always keep the newest entry, even if it alone exceeds the budget.
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
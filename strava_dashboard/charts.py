@@ -0,0 +1,171 @@
+"""
+Lean Plotly figures for the charts with one mark per activity.
+
+Plotly Express serialises every row it is given, with a copy of each hover
+column. The builders here send only the arrays a chart draws, as float32,
+switch scatter plots to WebGL above ``WEBGL_THRESHOLD`` points and draw
+histograms from counts binned on the server (``Aggregates.histogram``).
+``route_map`` draws any number of GPS routes as a single map trace and
+``heatmap_map`` a rendered heatmap as one image over the map;
+``effort_curve`` plots all-time best efforts against their length.
+Unlike the rest of the package this module needs Plotly.
+"""
+
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Above this many points scatter plots are drawn with WebGL (Scattergl)
+WEBGL_THRESHOLD = 1000
+
+# Largest marker diameter of sized scatter plots, as in Plotly Express
+SIZE_MAX = 20
+
+
+def _values(series):
+    return series.to_numpy(dtype='float32', na_value=np.nan)
+
+
+def payload_bytes(fig):
+    """Size of the JSON the browser receives for ``fig``."""
+    return len(fig.to_json().encode('utf-8'))
+
+
+def histogram(bins, title, x_label, color, y_label="Number of Activities"):
+    """Bar chart of a ``histogram_counts`` frame, bars spanning their bins."""
+    fig = go.Figure(go.Bar(
+        x=_values((bins['start'] + bins['end']) / 2),
+        y=bins['count'].to_numpy(dtype='int32'),
+        width=_values(bins['end'] - bins['start']),
+        customdata=bins[['start', 'end']].to_numpy(dtype='float32'),
+        marker_color=color,
+        hovertemplate=(
+            f"{x_label}: %{{customdata[0]:.4~g}} - %{{customdata[1]:.4~g}}<br>"
+            f"{y_label}: %{{y}}<extra></extra>"
+        ),
+    ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, bargap=0)
+    return fig
+
+
+def scatter(df, x, y, title, x_label, y_label, color, size=None, hover=None):
+    """
+    Scatter plot of columns ``x`` and ``y`` of ``df``. ``size`` scales the
+    marker area like ``px.scatter(size=...)`` and ``hover`` adds one column
+    to the tooltip; no other data is sent.
+    """
+    trace = go.Scattergl if len(df) > WEBGL_THRESHOLD else go.Scatter
+    marker = {'color': color}
+    if size is not None:
+        sizes = _values(df[size])
+        peak = np.nanmax(sizes) if np.isfinite(sizes).any() else 0
+        marker.update(
+            size=sizes,
+            sizemode='area',
+            sizeref=2.0 * peak / SIZE_MAX ** 2 if peak > 0 else 1,
+            sizemin=0,
+        )
+
+    hovertemplate = f"{x_label}: %{{x}}<br>{y_label}: %{{y}}"
+    text = None
+    if hover is not None:
+        labels = df[hover].astype(object)
+        text = labels.where(labels.notna(), '').astype(str).to_numpy()
+        hovertemplate += "<br>%{text}"
+
+    fig = go.Figure(trace(
+        x=_values(df[x]),
+        y=_values(df[y]),
+        mode='markers',
+        marker=marker,
+        text=text,
+        hovertemplate=hovertemplate + "<extra></extra>",
+    ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label)
+    return fig
+
+
+def _map_view(lat, lon):
+    """Center and zoom of a web map showing every finite point of ``lat``/``lon``."""
+    lat, lon = lat[np.isfinite(lat)], lon[np.isfinite(lon)]
+    if not len(lat):
+        return {'lat': 0, 'lon': 0}, 1
+    center = {'lat': float((lat.min() + lat.max()) / 2), 'lon': float((lon.min() + lon.max()) / 2)}
+    # Web maps show 360 degrees of longitude at zoom 0, halving per level
+    extent = max(float(lon.max() - lon.min()), float(lat.max() - lat.min()) / np.cos(np.radians(center['lat'])))
+    zoom = float(np.clip(np.log2(360 / extent) - 1, 1, 16)) if extent > 0 else 14
+    return center, zoom
+
+
+def route_map(lat, lon, title, color='#FC4C02', height=600):
+    """
+    Map of routes given as ``tracks.route_lines`` arrays, drawn as one
+    line trace however many routes there are.
+    """
+    lat, lon = np.asarray(lat, dtype='float32'), np.asarray(lon, dtype='float32')
+    center, zoom = _map_view(lat, lon)
+    fig = go.Figure(go.Scattermap(
+        lat=lat,
+        lon=lon,
+        mode='lines',
+        line={'color': color, 'width': 2},
+        opacity=0.6,
+        hoverinfo='skip',
+    ))
+    fig.update_layout(
+        title=title,
+        map={'style': 'open-street-map', 'center': center, 'zoom': zoom},
+        margin={'l': 0, 'r': 0, 't': 40, 'b': 0},
+        height=height,
+    )
+    return fig
+
+
+def heatmap_map(png, bounds, title, height=600):
+    """
+    Map with a heatmap image (PNG bytes, see ``heatmap.encode_png``)
+    stretched over ``bounds`` (west, south, east, north in degrees).
+    """
+    west, south, east, north = bounds
+    center, zoom = _map_view(np.array([south, north]), np.array([west, east]))
+    # The map needs a trace to be drawn; this one is empty
+    fig = go.Figure(go.Scattermap(lat=[], lon=[], mode='markers', hoverinfo='skip'))
+    fig.update_layout(
+        title=title,
+        map={
+            'style': 'carto-darkmatter',
+            'center': center,
+            'zoom': zoom,
+            'layers': [{
+                'sourcetype': 'image',
+                'source': 'data:image/png;base64,' + base64.b64encode(png).decode('ascii'),
+                'coordinates': [[west, north], [east, north], [east, south], [west, south]],
+            }],
+        },
+        margin={'l': 0, 'r': 0, 't': 40, 'b': 0},
+        height=height,
+    )
+    return fig
+
+
+def effort_curve(labels, values, text, title, yaxis_title, color='#FC4C02', reversed_axis=False, height=400):
+    """
+    Best efforts (``values``) against their distances or durations
+    (``labels``, in order), with ``text`` (such as the date) on hover.
+    """
+    fig = go.Figure(go.Scatter(
+        x=list(labels),
+        y=np.asarray(values, dtype='float32'),
+        text=list(text),
+        mode='lines+markers',
+        line={'color': color},
+        hovertemplate='%{x}: %{y:.2f}<br>%{text}<extra></extra>',
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis={'type': 'category'},
+        yaxis={'title': yaxis_title, 'autorange': 'reversed' if reversed_axis else True},
+        height=height,
+    )
+    return fig
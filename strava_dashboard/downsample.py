@@ -0,0 +1,92 @@
+"""
+Server-side downsampling of timeline charts.
+
+Plotly serialises every point of a trace to the browser, so a decade of
+activities makes multi-megabyte charts. ``downsample`` keeps at most a
+fixed number of points per trace using Largest-Triangle-Three-Buckets,
+which preserves the visual shape of the line, and always keeps the
+highest and lowest values so records such as the longest activity stay
+visible.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_POINTS = 2000
+
+
+def max_points_from_env():
+    """Point budget per trace from STRAVA_DASHBOARD_MAX_POINTS, or the default."""
+    value = os.environ.get('STRAVA_DASHBOARD_MAX_POINTS')
+    return int(value) if value else DEFAULT_MAX_POINTS
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Positions of the points Largest-Triangle-Three-Buckets keeps.
+
+    ``x`` must be increasing. The first and last points are always kept and
+    one point is chosen from each of ``threshold - 2`` equal-sized buckets
+    in between: the one forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # Bucket boundaries for the n - 2 interior points
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    kept[-1] = n - 1
+    return kept
+
+
+def downsample(df, x_col, y_col, max_points=DEFAULT_MAX_POINTS):
+    """
+    Rows of ``df`` (sorted by ``x_col``) to plot ``y_col`` with at most
+    about ``max_points`` points. Rows with a missing ``y_col`` are dropped
+    and the rows holding the maximum and minimum are always included.
+    Returns ``df`` itself when it already fits.
+    """
+    if df is None or len(df) <= max_points:
+        return df
+
+    values = df[y_col].to_numpy(dtype='float64', na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= max_points:
+        return df.iloc[valid]
+
+    x = df[x_col]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.dt.tz_localize(None) if getattr(x.dt, 'tz', None) is not None else x
+        x = x.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    x = np.asarray(x, dtype='float64')[valid]
+    y = values[valid]
+
+    kept = lttb_indices(x, y, max_points)
+    # LTTB picks one point per bucket, which can miss a lone extreme
+    kept = np.union1d(kept, [np.argmax(y), np.argmin(y)])
+    return df.iloc[valid[kept]]
@@ -0,0 +1,117 @@
+"""
+Vectorized parsing of activity durations into whole seconds.
+
+Exports write Moving Time / Elapsed Time as plain seconds (Strava's bulk
+export), 'MM:SS' with minutes past 59 ("102:00"), 'H:MM:SS' with hours past
+23, or occasionally pandas-style '1 day, 02:00:00'. Clock strings are parsed
+column by column over a NumPy byte matrix of the strings instead of per
+value in Python, which keeps million-row columns fast.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Longest clock string considered; anything longer is not a duration
+MAX_CLOCK_CHARS = 16
+
+_ZERO, _NINE, _COLON, _DOT = ord('0'), ord('9'), ord(':'), ord('.')
+
+
+def _as_bytes(text):
+    try:
+        return text.to_numpy(dtype=object).astype('S')
+    except UnicodeEncodeError:
+        # Non-ASCII values cannot be durations; make them fail validation
+        return text.str.replace(r'[^\x00-\x7f]', '?', regex=True).to_numpy(dtype=object).astype('S')
+
+
+def _parse_clock(text):
+    """
+    Seconds of 'SS', 'MM:SS' and 'H:MM:SS' strings as float64, NaN where a
+    value is not of that form. A fraction of a second is dropped.
+
+    The strings are read one character position at a time across all rows,
+    keeping per-row accumulators for the field being read and the two
+    fields before it.
+    """
+    n = len(text)
+    too_long = (text.str.len() > MAX_CLOCK_CHARS).to_numpy(dtype=bool)
+    if too_long.any():
+        text = text.where(~too_long, '')
+    raw = _as_bytes(text)
+    chars = raw.view(np.uint8).reshape(n, raw.dtype.itemsize) if raw.dtype.itemsize else np.zeros((n, 0), np.uint8)
+
+    current = np.zeros(n, dtype='int64')
+    minutes = np.zeros(n, dtype='int64')
+    hours = np.zeros(n, dtype='int64')
+    digits = np.zeros(n, dtype='int8')
+    colons = np.zeros(n, dtype='int8')
+    fraction = np.zeros(n, dtype=bool)
+    valid = ~too_long
+    for c in chars.T:
+        digit = (c >= _ZERO) & (c <= _NINE) & ~fraction
+        current = np.where(digit, current * 10 + (c.astype('int64') - _ZERO), current)
+        digits += digit
+        colon = c == _COLON
+        # An empty field, or a colon after the decimal point
+        valid &= ~(colon & ((digits == 0) | fraction))
+        hours = np.where(colon, minutes, hours)
+        minutes = np.where(colon, current, minutes)
+        current[colon] = 0
+        digits[colon] = 0
+        colons += colon
+        dot = c == _DOT
+        valid &= ~(dot & fraction)
+        fraction |= dot
+        # Zero bytes pad the shorter strings
+        valid &= (c == 0) | colon | dot | (c >= _ZERO) & (c <= _NINE)
+    valid &= (digits > 0) & (digits <= 9) & (colons <= 2)
+    # Minutes and seconds stay below 60 when a larger unit precedes them
+    valid &= (colons == 0) | (current < 60)
+    valid &= (colons < 2) | (minutes < 60)
+    return np.where(valid, current + 60 * minutes + 3600 * hours, np.nan)
+
+
+def parse_durations(series):
+    """
+    Whole seconds of a duration column.
+
+    Accepts numbers of seconds, timedeltas and 'SS', 'MM:SS', 'H:MM:SS' or
+    'N days HH:MM:SS' strings. Returns ``(seconds, unparsed)``: an int32
+    Series (nullable Int32 if any value is missing) and the number of
+    non-empty values that could not be read or do not fit in int32, which
+    become missing.
+    """
+    unparsed = 0
+    if pd.api.types.is_timedelta64_dtype(series):
+        seconds = series.dt.total_seconds()
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        seconds = series.astype('float64')
+    else:
+        text = series.astype('str').where(series.notna(), '').str.strip()
+        seconds = pd.Series(_parse_clock(text), index=series.index)
+        # Rare day-prefixed values are left to pandas
+        days = seconds.isna() & text.str.contains('day', regex=False)
+        if days.any():
+            seconds[days] = pd.to_timedelta(text[days], errors='coerce').dt.total_seconds()
+        unparsed = int((seconds.isna() & (text != '')).sum())
+
+    seconds = seconds.round()
+    # Beyond int32 (about 68 years) a value is garbage, not a duration
+    info = np.iinfo('int32')
+    out_of_range = seconds.notna() & ~seconds.between(info.min, info.max)
+    if out_of_range.any():
+        unparsed += int(out_of_range.sum())
+        seconds = seconds.where(~out_of_range)
+    if seconds.isna().any():
+        return seconds.astype('Int32'), unparsed
+    return seconds.astype('int32'), unparsed
+
+
+def format_duration(seconds):
+    """'H:MM:SS' (or 'M:SS' under an hour) of a number of seconds, rounded; '' for NaN."""
+    if seconds is None or not np.isfinite(seconds):
+        return ''
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{secs:02d}' if hours else f'{minutes}:{secs:02d}'
@@ -0,0 +1,159 @@
+"""
+Best efforts within single activities, from their GPS and sensor streams.
+
+``fastest_times`` finds the quickest stretch of each of EFFORT_DISTANCES in
+one pass: for every point, the time at which the distance stream first
+reaches that point's distance plus the target is read off the sorted
+cumulative-distance curve with a single ``np.interp``. ``best_averages``
+resamples a stream to one value per second and takes the best mean over
+each of EFFORT_DURATIONS as differences of one cumulative sum, so every
+window costs O(n) whatever its length.
+
+``best_efforts`` runs both over a track when its file is parsed, and the
+track store keeps the results per activity (EFFORT_FIELDS) next to its
+summary, so all-time bests under any filter are a column-wise min or max.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Distances best efforts are timed over, in metres
+EFFORT_DISTANCES = {
+    '400 m': 400,
+    '1 km': 1000,
+    '1 mile': 1609.344,
+    '5 km': 5000,
+    '10 km': 10000,
+    'Half Marathon': 21097.5,
+    'Marathon': 42195,
+}
+
+# Durations best average power and heart rate are taken over, in seconds
+EFFORT_DURATIONS = {
+    '5 s': 5,
+    '30 s': 30,
+    '1 min': 60,
+    '5 min': 300,
+    '10 min': 600,
+    '20 min': 1200,
+    '30 min': 1800,
+    '60 min': 3600,
+}
+
+# Gaps between samples longer than this (s) are pauses rather than
+# dropped samples: no power was produced and heart rate is unknown
+MAX_SAMPLE_GAP = 10
+
+# Effort kind -> (labelled amounts, Track field, whether larger values are better)
+EFFORT_KINDS = {
+    'fastest': (EFFORT_DISTANCES, 'distance', False),
+    'power': (EFFORT_DURATIONS, 'power', True),
+    'heart_rate': (EFFORT_DURATIONS, 'heart_rate', True),
+}
+
+EFFORT_FIELDS = tuple(
+    f'{kind}_{label}' for kind, (amounts, _, _) in EFFORT_KINDS.items() for label in amounts
+)
+
+
+def fastest_times(time, distance, distances):
+    """
+    Shortest time in seconds to cover each of ``distances`` (metres) within
+    one activity, NaN for distances longer than the activity.
+    """
+    valid = np.isfinite(time) & np.isfinite(distance)
+    time, distance = time[valid], distance[valid]
+    best = np.full(len(distances), np.nan)
+    if len(time) < 2:
+        return best
+    # Recorded distances can dip with GPS noise (and clocks jump back); the
+    # curves must not
+    time, distance = np.maximum.accumulate(time), np.maximum.accumulate(distance)
+    for i, target in enumerate(distances):
+        starts = distance <= distance[-1] - target
+        if not starts.any():
+            continue
+        # Time the distance stream reaches each start's distance plus the target
+        ends = np.interp(distance[starts] + target, distance, time)
+        best[i] = (ends - time[starts]).min()
+    return best
+
+
+def resample(time, values, fill=np.nan, max_gap=MAX_SAMPLE_GAP, max_pause=None):
+    """
+    ``values`` at every whole second from the first sample to the last,
+    interpolated between samples and ``fill`` where the nearest sample is
+    more than ``max_gap`` seconds away. Gaps longer than ``max_pause``
+    seconds are shortened to it, so a clock jump (a reset, or a timestamp
+    of 0 next to real ones) cannot blow the grid up to billions of seconds.
+    """
+    valid = np.isfinite(time) & np.isfinite(values)
+    time, values = np.maximum.accumulate(time[valid]), values[valid]
+    if len(time) < 2:
+        return np.empty(0)
+    if max_pause is not None:
+        time = time[0] + np.r_[0, np.cumsum(np.minimum(np.diff(time), max_pause))]
+    grid = np.arange(time[0], time[-1] + 1)
+    resampled = np.interp(grid, time, values)
+    after = np.clip(np.searchsorted(time, grid), 1, len(time) - 1)
+    nearest = np.minimum(grid - time[after - 1], np.abs(time[after] - grid))
+    resampled[nearest > max_gap] = fill
+    return resampled
+
+
+def best_averages(time, values, durations, fill=np.nan):
+    """
+    Best mean of ``values`` over each of ``durations`` (seconds) within one
+    activity, NaN for durations longer than it. Windows reaching into a gap
+    filled with NaN do not count.
+    """
+    # No window reaches across a gap longer than the longest one, so longer
+    # gaps are shortened to that
+    stream = resample(time, values, fill, max_pause=max(durations) + MAX_SAMPLE_GAP + 1)
+    best = np.full(len(durations), np.nan)
+    missing = np.isnan(stream)
+    sums = np.r_[0, np.cumsum(np.where(missing, 0, stream))]
+    gaps = np.r_[0, np.cumsum(missing)]
+    for i, window in enumerate(durations):
+        if window > len(stream):
+            continue
+        complete = gaps[window:] == gaps[:-window]
+        if complete.any():
+            best[i] = (sums[window:] - sums[:-window])[complete].max() / window
+    return best
+
+
+def best_efforts(track):
+    """
+    The EFFORT_FIELDS of a track: fastest times over EFFORT_DISTANCES and
+    best average power and heart rate over EFFORT_DURATIONS, NaN where the
+    track is too short or lacks the stream.
+    """
+    time = np.asarray(track.time, dtype='float64')
+    values = [fastest_times(time, np.asarray(track.distance, dtype='float64'), list(EFFORT_DISTANCES.values()))]
+    # Missing power is no power; missing heart rate is unknown
+    for field, fill in (('power', 0.0), ('heart_rate', np.nan)):
+        stream = np.asarray(getattr(track, field), dtype='float64')
+        if np.isfinite(stream).any():
+            values.append(best_averages(time, stream, list(EFFORT_DURATIONS.values()), fill))
+        else:
+            values.append(np.full(len(EFFORT_DURATIONS), np.nan))
+    return dict(zip(EFFORT_FIELDS, np.concatenate(values)))
+
+
+def all_time_bests(efforts):
+    """
+    The best of each effort among the rows of ``efforts`` (EFFORT_FIELDS
+    columns, one row per activity): one row per effort any activity has,
+    with its 'kind', 'label', 'amount' (metres or seconds), 'value'
+    (seconds, watts or bpm) and the index label of its activity, 'row'.
+    """
+    rows = []
+    for kind, (amounts, _, larger_better) in EFFORT_KINDS.items():
+        for label, amount in amounts.items():
+            column = efforts[f'{kind}_{label}']
+            if not column.notna().any():
+                continue
+            row = column.idxmax() if larger_better else column.idxmin()
+            rows.append((kind, label, amount, column[row], row))
+    return pd.DataFrame(rows, columns=['kind', 'label', 'amount', 'value', 'row'])
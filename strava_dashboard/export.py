@@ -0,0 +1,95 @@
+"""
+Export of the filtered activities as CSV, gzip-compressed CSV or Parquet.
+
+Files are written in slices of ``EXPORT_CHUNK_ROWS`` rows, so the frame is
+never rendered into one big string, and ``ExportCache`` keeps the last few
+files per (dataset, filter state, format) so downloading the same selection
+again costs nothing.
+"""
+
+import gzip
+import io
+import threading
+from collections import OrderedDict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pq = None
+
+EXPORT_CHUNK_ROWS = 50_000
+
+# Format -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('CSV', '.csv', 'text/csv'),
+    'csv.gz': ('CSV (gzip)', '.csv.gz', 'application/gzip'),
+}
+if pq is not None:
+    EXPORT_FORMATS['parquet'] = ('Parquet', '.parquet', 'application/vnd.apache.parquet')
+
+
+def iter_csv(df, chunksize=EXPORT_CHUNK_ROWS):
+    """UTF-8 encoded CSV of ``df`` (header first, no index), slice by slice."""
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start:start + chunksize]
+        yield chunk.to_csv(index=False, header=start == 0).encode('utf-8')
+
+
+def write_csv(df, out, chunksize=EXPORT_CHUNK_ROWS):
+    for data in iter_csv(df, chunksize):
+        out.write(data)
+
+
+def write_parquet(df, out, chunksize=EXPORT_CHUNK_ROWS):
+    """Write ``df`` to ``out`` as Parquet with one row group per slice."""
+    writer = None
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start:start + chunksize]
+        table = pa.Table.from_pandas(chunk, schema=writer.schema if writer else None, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(out, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def export_bytes(df, fmt, chunksize=EXPORT_CHUNK_ROWS):
+    """Contents of ``df`` exported as ``fmt`` (a key of EXPORT_FORMATS)."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    buffer = io.BytesIO()
+    if fmt == 'csv':
+        write_csv(df, buffer, chunksize)
+    elif fmt == 'csv.gz':
+        # mtime=0 keeps the output identical for identical data
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as out:
+            write_csv(df, out, chunksize)
+    else:
+        write_parquet(df, buffer, chunksize)
+    return buffer.getvalue()
+
+
+class ExportCache:
+    """
+    Thread-safe LRU of exported files keyed by ``(dataset key, filter
+    state, format)``. Small by default, as every entry is a whole file.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, df_factory, fmt):
+        """The export of ``df_factory()`` as ``fmt``, built on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        data = export_bytes(df_factory(), fmt)
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return data
@@ -0,0 +1,224 @@
+"""
+Sidebar filters applied to the processed activities frame.
+
+The ``filter_by_*`` functions work on any frame and return the input
+unchanged when the column they need is missing or no selection was made,
+so they can be chained in any order. ``FilterIndex`` answers the same
+filters from structures built once per dataset, which is what the
+dashboard uses on every rerun.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.schema import DAY_ORDER
+
+
+def add_day_of_week(df, date_col):
+    """
+    Add a 'Day of Week' column derived from ``date_col`` in place, as a
+    categorical in DAY_ORDER taken from the weekday numbers (no strings).
+    """
+    if date_col and date_col in df.columns:
+        codes = df[date_col].dt.dayofweek.fillna(-1).astype('int8')
+        df['Day of Week'] = pd.Categorical.from_codes(codes, categories=DAY_ORDER)
+    return df
+
+
+def filter_by_activity(df, activity_col, selected):
+    """Keep activities whose type is in ``selected``."""
+    if not activity_col or activity_col not in df.columns or selected is None:
+        return df
+    return df[df[activity_col].isin(selected)]
+
+
+def filter_by_gear(df, gear_col, selected):
+    """Keep activities recorded with gear in ``selected``."""
+    if not gear_col or gear_col not in df.columns or selected is None:
+        return df
+    return df[df[gear_col].isin(selected)]
+
+
+def filter_by_date(df, date_col, date_range):
+    """Keep activities whose date falls within the inclusive ``(start, end)`` dates."""
+    if not date_col or date_col not in df.columns or date_range is None or len(date_range) != 2:
+        return df
+    dates = df[date_col].dt.date
+    return df[(dates >= date_range[0]) & (dates <= date_range[1])]
+
+
+def filter_by_distance(df, distance_col, dist_range):
+    """Keep activities whose distance falls within the inclusive ``(low, high)`` range."""
+    if not distance_col or distance_col not in df.columns or dist_range is None:
+        return df
+    return df[(df[distance_col] >= dist_range[0]) & (df[distance_col] <= dist_range[1])]
+
+
+def apply_filters(df, schema, activity_types=None, gear=None, date_range=None, distance_range=None):
+    """Apply every sidebar filter in the order the dashboard presents them."""
+    df = filter_by_activity(df, schema.activity, activity_types)
+    df = filter_by_gear(df, schema.gear, gear)
+    df = filter_by_date(df, schema.date, date_range)
+    df = filter_by_distance(df, schema.distance, distance_range)
+    return df
+
+
+def date_range_bounds(date_range, tz=None):
+    """
+    Half-open ``[start, end)`` timestamps covering the inclusive calendar
+    dates of ``date_range``, in timezone ``tz``.
+    """
+    start = pd.Timestamp(date_range[0]).tz_localize(tz)
+    end = pd.Timestamp(date_range[1] + datetime.timedelta(days=1)).tz_localize(tz)
+    return start, end
+
+
+class FilterIndex:
+    """
+    Precomputed lookup structures for filtering one dataset repeatedly.
+
+    The frame is sorted by date once so a date range becomes a
+    ``searchsorted`` slice, and activity type / gear are kept as categorical
+    codes so a multiselect becomes a single lookup-table gather instead of
+    an ``isin`` over strings. Each ``*_mask`` method returns a boolean array
+    over ``self.df`` (or None when it does not restrict anything); combine
+    them with ``combine`` and materialise the rows once with ``take``.
+    ``self.df`` also carries the derived 'Day of Week' column.
+    """
+
+    def __init__(self, df, schema):
+        self.schema = schema
+        if schema.date and schema.date in df.columns:
+            df = df.sort_values(schema.date, kind='stable', na_position='last')
+        self.df = df.reset_index(drop=True)
+        # Derived here, once per dataset, rather than on every rerun
+        add_day_of_week(self.df, schema.date)
+        self.size = len(self.df)
+
+        self._dates = None
+        if schema.date and schema.date in df.columns:
+            self._dates = self.df[schema.date]
+            self._has_date = self._dates.notna().to_numpy()
+        self._distance = None
+        if schema.distance and schema.distance in df.columns:
+            self._distance = self.df[schema.distance].to_numpy(dtype='float64', na_value=np.nan)
+        # Without missing distances a full-range distance filter drops nothing
+        self.distance_complete = self._distance is None or not np.isnan(self._distance).any()
+        self._activity = self._categorical(schema.activity)
+        self._gear = self._categorical(schema.gear)
+
+        self._activity_types = []
+        self._activity_missing = False
+        if self._activity is not None:
+            categories, codes = self._activity
+            self._activity_types = list(categories[np.unique(codes[codes >= 0])])
+            self._activity_missing = bool((codes < 0).any())
+
+    def _categorical(self, col):
+        """``(categories, codes)`` for a column, or None if it is missing."""
+        if not col or col not in self.df.columns:
+            return None
+        values = self.df[col]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        return values.cat.categories, values.cat.codes.to_numpy()
+
+    @staticmethod
+    def _code_mask(categorical, selected):
+        categories, codes = categorical
+        # Slot 0 is for missing values (code -1), which never match
+        lookup = np.zeros(len(categories) + 1, dtype=bool)
+        positions = categories.get_indexer(list(selected))
+        lookup[positions[positions >= 0] + 1] = True
+        return lookup[codes + 1]
+
+    def activity_mask(self, selected):
+        """Rows whose activity type is in ``selected``."""
+        if self._activity is None or selected is None:
+            return None
+        if not self._activity_missing and set(self._activity_types) <= set(selected):
+            # Everything is selected, which is the default
+            return None
+        return self._code_mask(self._activity, selected)
+
+    def gear_mask(self, selected):
+        """Rows recorded with gear in ``selected`` (rows without gear never match)."""
+        if self._gear is None or selected is None:
+            return None
+        return self._code_mask(self._gear, selected)
+
+    def date_mask(self, date_range):
+        """Rows dated within the inclusive ``(start, end)`` calendar dates."""
+        if self._dates is None or date_range is None or len(date_range) != 2:
+            return None
+        start, end = date_range_bounds(date_range, getattr(self._dates.dt, 'tz', None))
+        lo, hi = self._dates.searchsorted([start, end], side='left')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[lo:hi] = True
+        return mask
+
+    def distance_mask(self, dist_range):
+        """Rows whose distance is within the inclusive ``(low, high)`` range."""
+        if self._distance is None or dist_range is None:
+            return None
+        return (self._distance >= dist_range[0]) & (self._distance <= dist_range[1])
+
+    @staticmethod
+    def combine(*masks):
+        """AND together the given masks, ignoring None; None if all are None."""
+        combined = None
+        for mask in masks:
+            if mask is None:
+                continue
+            combined = mask.copy() if combined is None else combined & mask
+        return combined
+
+    def take(self, mask):
+        """The rows of the sorted frame selected by ``mask`` (all if None)."""
+        if mask is None:
+            return self.df
+        return self.df.iloc[np.flatnonzero(mask)]
+
+    def activity_options(self):
+        """Activity types present in the dataset."""
+        return list(self._activity_types)
+
+    def gear_options(self, mask=None):
+        """Gear values present among the selected rows."""
+        if self._gear is None:
+            return []
+        categories, codes = self._gear
+        codes = codes if mask is None else codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        return list(categories[counts > 0])
+
+    def date_bounds(self, mask=None):
+        """Earliest and latest date among the selected rows."""
+        if self._dates is None:
+            return None, None
+        valid = self._has_date if mask is None else self._has_date & mask
+        positions = np.flatnonzero(valid)
+        if len(positions) == 0:
+            return None, None
+        # Sorted by date, so the extremes are the first and last selected rows
+        return self._dates.iloc[positions[0]], self._dates.iloc[positions[-1]]
+
+    def distance_bounds(self, mask=None):
+        """Smallest and largest distance among the selected rows."""
+        if self._distance is None:
+            return None, None
+        values = self._distance if mask is None else self._distance[mask]
+        if len(values) == 0 or np.isnan(values).all():
+            return None, None
+        return float(np.nanmin(values)), float(np.nanmax(values))
+
+    def filter(self, activity_types=None, gear=None, date_range=None, distance_range=None):
+        """Apply every sidebar filter as one combined mask."""
+        return self.take(self.combine(
+            self.activity_mask(activity_types),
+            self.gear_mask(gear),
+            self.date_mask(date_range),
+            self.distance_mask(distance_range),
+        ))
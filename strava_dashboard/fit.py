@@ -0,0 +1,161 @@
+"""
+Minimal pure-Python decoder for Garmin FIT activity files.
+
+Only what a track needs is decoded: the 'record' messages' timestamp,
+position, altitude, distance, heart rate and power. A FIT file is a header followed by definition
+messages, which describe the layout of a local message type, and data
+messages in that layout. Each definition is compiled into one
+``struct.Struct`` so a data message is read with a single unpack, and
+fields the decoder does not use are skipped as padding.
+"""
+
+import struct
+
+import numpy as np
+
+# FIT timestamps count seconds from 1989-12-31 00:00 UTC
+FIT_EPOCH = 631065600
+
+RECORD_MESSAGE = 20
+TIMESTAMP_FIELD = 253
+# Field numbers of the 'record' message
+RECORD_FIELDS = {
+    'lat': 0, 'lon': 1, 'altitude': 2, 'heart_rate': 3, 'distance': 5, 'power': 7, 'enhanced_altitude': 78,
+}
+
+# struct codes of the FIT base types, by base type number
+_BASE_TYPES = {
+    0: 'B', 1: 'b', 2: 'B', 3: 'h', 4: 'H', 5: 'i', 6: 'I', 8: 'f', 9: 'd',
+    10: 'B', 11: 'H', 12: 'I', 13: 'B', 14: 'q', 15: 'Q', 16: 'Q',
+}
+
+# Values FIT uses for "no data", by base type number; the 'z' types
+# (uint8z, uint16z, uint32z, uint64z) use 0
+_INVALID = {
+    0: 0xFF, 1: 0x7F, 2: 0xFF, 3: 0x7FFF, 4: 0xFFFF, 5: 0x7FFFFFFF, 6: 0xFFFFFFFF,
+    10: 0, 11: 0, 12: 0, 13: 0xFF, 14: 0x7FFFFFFFFFFFFFFF, 15: 0xFFFFFFFFFFFFFFFF, 16: 0,
+}
+
+_SEMICIRCLES = 180 / 2 ** 31
+
+
+class _Definition:
+    """Layout of one local message type."""
+
+    def __init__(self, message, layout, fields, wanted):
+        self.message = message
+        self.struct = struct.Struct(layout)
+        # Field number -> (position in the unpacked tuple, base type number)
+        self.fields = {number: fields[number] for number in wanted if number in fields}
+
+
+def _definition(data, pos, developer):
+    """Parse the definition message at ``pos``; returns it and the position after it."""
+    endian = '>' if data[pos + 1] else '<'
+    message, = struct.unpack_from(endian + 'H', data, pos + 2)
+    count = data[pos + 4]
+    pos += 5
+    layout = [endian]
+    fields = {}
+    for _ in range(count):
+        number, size, base = data[pos], data[pos + 1], data[pos + 2]
+        pos += 3
+        code = _BASE_TYPES.get(base & 0x1F)
+        if code is not None and struct.calcsize(code) == size:
+            fields[number] = (len(fields), base & 0x1F)
+            layout.append(code)
+        else:
+            layout.append(f'{size}x')
+    if developer:
+        developer_fields = data[pos]
+        pos += 1
+        layout.append(f'{sum(data[pos + 3 * i + 1] for i in range(developer_fields))}x')
+        pos += 3 * developer_fields
+    wanted = [TIMESTAMP_FIELD] + (list(RECORD_FIELDS.values()) if message == RECORD_MESSAGE else [])
+    return _Definition(message, ''.join(layout), fields, wanted), pos
+
+
+def _value(values, field):
+    if field is None:
+        return None
+    position, base = field
+    value = values[position]
+    return None if value == _INVALID.get(base) else value
+
+
+def decode_records(data):
+    """
+    The 'record' messages of a FIT file as a dict of float64 arrays: 'time'
+    (Unix seconds), 'lat' and 'lon' (degrees), 'elevation' and 'distance'
+    (metres), 'heart_rate' (bpm) and 'power' (watts), NaN where a record
+    lacks the field. Chained FIT files are read in turn and
+    a truncated file up to where it ends. Raises ValueError on data that is
+    not FIT.
+    """
+    data = memoryview(data)
+    rows = []
+    start = 0
+    while start + 12 <= len(data):
+        header_size = data[start]
+        if bytes(data[start + 8:start + 12]) != b'.FIT':
+            if start:
+                break
+            raise ValueError("Not a FIT file")
+        data_size, = struct.unpack_from('<I', data, start + 4)
+        pos = start + header_size
+        end = min(pos + data_size, len(data))
+        definitions = {}
+        timestamp = None
+        while pos < end:
+            header = data[pos]
+            pos += 1
+            if header & 0x80:
+                # Compressed timestamp header: 5 bits of offset from the last timestamp
+                local = (header >> 5) & 0x03
+                if timestamp is not None:
+                    offset = header & 0x1F
+                    timestamp = (timestamp & ~0x1F) + offset + (0x20 if offset < (timestamp & 0x1F) else 0)
+            elif header & 0x40:
+                definitions[header & 0x0F], pos = _definition(data, pos, header & 0x20)
+                continue
+            else:
+                local = header & 0x0F
+            definition = definitions.get(local)
+            if definition is None:
+                raise ValueError("FIT data message without a definition")
+            if pos + definition.struct.size > end:
+                # Cut off mid-message, as when a recording was interrupted
+                break
+            values = definition.struct.unpack_from(data, pos)
+            pos += definition.struct.size
+            fields = definition.fields
+            stamp = _value(values, fields.get(TIMESTAMP_FIELD))
+            if stamp is not None:
+                timestamp = stamp
+            if definition.message == RECORD_MESSAGE:
+                altitude = _value(values, fields.get(RECORD_FIELDS['enhanced_altitude']))
+                if altitude is None:
+                    altitude = _value(values, fields.get(RECORD_FIELDS['altitude']))
+                rows.append((
+                    timestamp,
+                    _value(values, fields.get(RECORD_FIELDS['lat'])),
+                    _value(values, fields.get(RECORD_FIELDS['lon'])),
+                    altitude,
+                    _value(values, fields.get(RECORD_FIELDS['distance'])),
+                    _value(values, fields.get(RECORD_FIELDS['heart_rate'])),
+                    _value(values, fields.get(RECORD_FIELDS['power'])),
+                ))
+        # Each file ends with a 2-byte CRC
+        start = end + 2
+
+    table = np.array(rows, dtype='float64').reshape(-1, 7) if rows else np.empty((0, 7))
+    return {
+        'time': table[:, 0] + FIT_EPOCH,
+        'lat': table[:, 1] * _SEMICIRCLES,
+        'lon': table[:, 2] * _SEMICIRCLES,
+        'elevation': table[:, 3] / 5 - 500,
+        'distance': table[:, 4] / 100,
+        # 0 bpm is a strap that lost contact, whatever the field's base type
+        'heart_rate': np.where(table[:, 5] > 0, table[:, 5], np.nan),
+        'power': table[:, 6],
+    }
@@ -0,0 +1,183 @@
+"""
+Heatmap of every activity's route.
+
+Each track is rasterised once, when its file is parsed, into the Web
+Mercator pixels it passes through at each zoom level of HEATMAP_ZOOMS: a
+pyramid of small sorted arrays per activity that the track store keeps on
+disk next to the points. A heatmap of any selection of activities (so any
+combination of the sidebar filters) then only needs the cells of one
+level: ``render_heatmap`` picks the level that fits the selection's extent
+into an image of at most HEATMAP_IMAGE_SIZE pixels, counts the cells into
+a density grid with ``np.histogram2d`` and colours it, and the map draws
+that one image instead of every point.
+"""
+
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# Zoom levels of the pyramid, finest first. At zoom 15 a pixel is about
+# 5 m at the equator (3 m at mid latitudes)
+HEATMAP_ZOOMS = (15, 12, 9, 6)
+
+TILE_SIZE = 256
+
+# A cell is a pixel's x and y packed into one integer, x in the high half
+CELL_DTYPE = np.dtype('<u8')
+
+# Segments longer than this many pixels at the finest zoom (about a
+# kilometre) are GPS gaps or jumps and are not drawn
+MAX_GAP_PIXELS = 256
+
+# Largest side of a rendered heatmap, in pixels
+HEATMAP_IMAGE_SIZE = 1200
+
+# Share of the selection's cells the rendered area is fitted to, so a few
+# far-away trips do not shrink everywhere else to a dot
+HEATMAP_COVERAGE = 0.99
+
+_MAX_LATITUDE = 85.05112878
+
+# Colour ramp from sparse to busy cells: (position, red, green, blue, alpha)
+_RAMP = np.array([
+    (0.0, 252, 76, 2, 90),
+    (0.4, 252, 76, 2, 200),
+    (0.8, 255, 170, 40, 240),
+    (1.0, 255, 255, 210, 255),
+])
+
+# An image of cell counts with its bounds as (west, south, east, north) in
+# degrees, the zoom it was drawn at and how many cells it covers
+Heatmap = namedtuple('Heatmap', 'counts bounds zoom cells')
+
+
+def mercator(lat, lon, zoom):
+    """Web Mercator pixel coordinates (float) of positions in degrees at ``zoom``."""
+    world = TILE_SIZE * 2.0 ** zoom
+    lat = np.radians(np.clip(lat, -_MAX_LATITUDE, _MAX_LATITUDE))
+    x = (np.asarray(lon) + 180) / 360 * world
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * world
+    return x, y
+
+
+def _degrees(x, y, zoom):
+    """Inverse of ``mercator``: latitude and longitude of pixel coordinates."""
+    world = TILE_SIZE * 2.0 ** zoom
+    lon = x / world * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / world))))
+    return lat, lon
+
+
+def pack(x, y):
+    return (np.asarray(x, dtype=CELL_DTYPE) << np.uint64(32)) | np.asarray(y, dtype=CELL_DTYPE)
+
+
+def unpack(cells):
+    return (cells >> np.uint64(32)).astype('int64'), (cells & np.uint64(0xFFFFFFFF)).astype('int64')
+
+
+def rasterize(track, zooms=HEATMAP_ZOOMS):
+    """
+    ``{zoom: cells}`` of the pixels ``track`` passes through at each zoom,
+    sorted and without repeats, so a cell counts once per activity. Each
+    segment is drawn by stepping at most a pixel at a time at the finest
+    zoom.
+    """
+    if len(track.lat) == 0:
+        return {zoom: np.empty(0, CELL_DTYPE) for zoom in zooms}
+    finest = max(zooms)
+    x, y = mercator(track.lat, track.lon, finest)
+    dx, dy = np.diff(x), np.diff(y)
+    steps = np.maximum(np.ceil(np.maximum(np.abs(dx), np.abs(dy))), 1).astype('int64')
+    steps[steps > MAX_GAP_PIXELS] = 1
+    segment = np.repeat(np.arange(len(steps)), steps)
+    fraction = (np.arange(len(segment)) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+    x = np.r_[x[:-1][segment] + dx[segment] * fraction, x[-1]]
+    y = np.r_[y[:-1][segment] + dy[segment] * fraction, y[-1]]
+    x, y = np.floor(x).astype('int64'), np.floor(y).astype('int64')
+    return {zoom: np.unique(pack(x >> (finest - zoom), y >> (finest - zoom))) for zoom in zooms}
+
+
+def _extent(cells, coverage=HEATMAP_COVERAGE):
+    """Pixel bounds ``(x0, y0, x1, y1)`` (inclusive) of the central ``coverage`` of ``cells``."""
+    x, y = unpack(cells)
+    tail = (1 - coverage) / 2 * 100
+    (x0, x1), (y0, y1) = np.percentile(x, [tail, 100 - tail]), np.percentile(y, [tail, 100 - tail])
+    return int(np.floor(x0)), int(np.floor(y0)), int(np.ceil(x1)), int(np.ceil(y1))
+
+
+def draw_heatmap(cells, level, extent, zoom):
+    """
+    Heatmap of ``cells`` (at zoom ``level``) over ``extent`` (pixel bounds
+    at ``level``) drawn at ``zoom``, at most ``level``: one pixel per cell
+    at that zoom, counting the activities through it.
+    """
+    shift = level - zoom
+    x0, y0, x1, y1 = (value >> shift for value in extent)
+    width, height = x1 - x0 + 1, y1 - y0 + 1
+    x, y = unpack(cells)
+    counts, _, _ = np.histogram2d(
+        y >> shift, x >> shift, bins=(height, width), range=((y0, y1 + 1), (x0, x1 + 1)),
+    )
+    north, west = _degrees(x0, y0, zoom)
+    south, east = _degrees(x1 + 1, y1 + 1, zoom)
+    return Heatmap(counts.astype('float32'), (float(west), float(south), float(east), float(north)), zoom, len(cells))
+
+
+def _fit_zoom(extent, level, max_size):
+    """Highest zoom at which ``extent`` (pixel bounds at ``level``) fits into ``max_size`` pixels."""
+    side = max(extent[2] - extent[0], extent[3] - extent[1]) + 1
+    return int(np.clip(level + np.floor(np.log2(max_size / side)), 0, max(HEATMAP_ZOOMS)))
+
+
+def render_heatmap(store, keys, max_size=HEATMAP_IMAGE_SIZE, coverage=HEATMAP_COVERAGE):
+    """
+    Heatmap of the stored tracks of ``keys`` in a track store, or None if
+    they have no points. The coarsest level tells roughly how far the
+    tracks spread and so which level to read next, until the highest zoom
+    that fits ``max_size`` pixels is no finer than the level read.
+    """
+    level = min(HEATMAP_ZOOMS)
+    cells = store.cells(keys, level)
+    if not len(cells):
+        return None
+    extent = _extent(cells, coverage)
+    zoom = _fit_zoom(extent, level, max_size)
+    while zoom > level:
+        level = min(candidate for candidate in HEATMAP_ZOOMS if candidate >= zoom)
+        cells = store.cells(keys, level)
+        extent = _extent(cells, coverage)
+        zoom = _fit_zoom(extent, level, max_size)
+    return draw_heatmap(cells, level, extent, zoom)
+
+
+def colorize(counts):
+    """RGBA image (uint8) of a Heatmap's counts: log-scaled along the ramp, empty cells transparent."""
+    scaled = np.log1p(counts)
+    top = scaled.max()
+    if top > 0:
+        scaled /= top
+    rgba = np.empty(counts.shape + (4,), dtype='uint8')
+    for channel in range(4):
+        rgba[..., channel] = np.interp(scaled, _RAMP[:, 0], _RAMP[:, channel + 1])
+    rgba[counts == 0, 3] = 0
+    return rgba
+
+
+def _chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png(rgba):
+    """PNG bytes of an RGBA uint8 image, without an imaging library."""
+    height, width = rgba.shape[:2]
+    # Every row starts with its filter type, 0 (none)
+    rows = np.hstack([np.zeros((height, 1), dtype='uint8'), rgba.reshape(height, width * 4)])
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        _chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        _chunk(b'IEND', b''),
+    ])
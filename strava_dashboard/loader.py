@@ -0,0 +1,316 @@
+"""
+Loading and preprocessing of Strava activities CSV exports.
+
+Columns are classified once by name (see ``classify_columns``) and every
+conversion is driven from that mapping, so each column is looked at a
+single time however many kinds of field the export contains.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from strava_dashboard.archive import open_csv
+from strava_dashboard.cache import content_hash
+from strava_dashboard.durations import parse_durations
+from strava_dashboard.memory import current_rss, format_bytes
+from strava_dashboard.metrics import add_derived_metrics
+from strava_dashboard.profiling import stage
+from strava_dashboard.schema import resolve_schema
+
+NUMERIC_KEYWORDS = ('distance', 'elevation', 'calories', 'kilocalories', 'heart rate', 'avg hr', 'max hr')
+DURATION_KEYWORDS = ('moving time', 'elapsed time')
+
+# Date layouts of known exports, tried before pandas' per-value inference
+# (Strava's bulk export writes e.g. "Jan 5, 2020, 7:01:02 AM")
+DATE_FORMATS = ('%b %d, %Y, %I:%M:%S %p',)
+
+DEFAULT_CHUNK_ROWS = 50_000
+MIN_CHUNK_ROWS = 1_000
+
+
+def classify_columns(columns):
+    """
+    Map each column name to the kind of value it holds.
+
+    Kinds are 'date', 'numeric', 'duration' and 'category'; columns the
+    dashboard does not interpret (names, descriptions, ...) map to None.
+    The date and category columns are the ones the schema resolver picks.
+    """
+    schema = resolve_schema(columns)
+    categories = {schema.activity, schema.gear}
+
+    kinds = {}
+    for col in columns:
+        name = str(col).lower()
+        if col == schema.date:
+            kinds[col] = 'date'
+        elif col in categories:
+            kinds[col] = 'category'
+        elif any(keyword in name for keyword in NUMERIC_KEYWORDS):
+            kinds[col] = 'numeric'
+        elif any(keyword in name for keyword in DURATION_KEYWORDS):
+            kinds[col] = 'duration'
+        else:
+            kinds[col] = None
+    return kinds
+
+
+def read_header(file):
+    """Return the column names of a CSV without consuming ``file``."""
+    header = pd.read_csv(file, nrows=0).columns
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return header
+
+
+def schema_columns(header):
+    """Positions of the columns of ``header`` the schema resolver assigns a role."""
+    wanted = set(resolve_schema(header).as_dict().values())
+    return [i for i, col in enumerate(header) if col in wanted]
+
+
+def _skip_all_but(rows):
+    """``skiprows`` callable keeping the header and the given data rows."""
+    keep = set(rows)
+
+    def skip(i):
+        # Row 0 is the header; data row i is file row i + 1.
+        return i > 0 and (i - 1) not in keep
+    return skip
+
+
+def load_data(file, rows=None, usecols=None):
+    """
+    Read a Strava activities CSV (path or file-like object) into a DataFrame.
+
+    Thousands separators are stripped by the parser and category columns are
+    read straight into a categorical dtype, so numbers like "1,234.5" arrive
+    as floats without a post-hoc string pass. ``rows`` optionally restricts
+    parsing to those 0-based data row positions and ``usecols`` is passed to
+    ``read_csv``.
+    """
+    kinds = classify_columns(read_header(file))
+    dtype = {col: 'category' for col, kind in kinds.items() if kind == 'category'}
+    skiprows = _skip_all_but(rows) if rows is not None else None
+    return pd.read_csv(file, thousands=',', dtype=dtype, skiprows=skiprows, usecols=usecols)
+
+
+def _concat_columns(chunks, kinds):
+    """
+    Concatenate processed chunks one column at a time.
+
+    Each column is dropped from the chunks as soon as it has been copied
+    into the result, so at most one extra column is alive at once rather
+    than a second copy of the whole frame.
+    """
+    columns = {}
+    for col in list(chunks[0].columns):
+        parts = [chunk[col] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            merged = pd.Series(union_categoricals(parts), name=col)
+        else:
+            merged = pd.concat(parts, ignore_index=True)
+            if kinds.get(col) == 'numeric':
+                # Chunks may have been downcast differently
+                merged = _downcast(merged)
+        columns[col] = merged
+        for chunk in chunks:
+            del chunk[col]
+    return pd.DataFrame(columns)
+
+
+def load_chunked(file, chunksize=DEFAULT_CHUNK_ROWS, usecols=None, memory_budget=None, timer=None):
+    """
+    Read and preprocess a CSV chunk by chunk.
+
+    Only one chunk of raw strings is alive at a time; each is converted to
+    compact dtypes straight away and the results are concatenated column by
+    column. ``usecols='schema'`` keeps just the columns the schema resolver
+    assigns a role, otherwise ``usecols`` is passed to ``read_csv``.
+
+    ``memory_budget`` is a limit on the process RSS in bytes: when a chunk
+    pushes RSS over it the chunk size is halved, and MemoryError is raised
+    if it is still exceeded at MIN_CHUNK_ROWS. Row, chunk and peak RSS
+    figures are recorded in ``df.attrs['ingest']``, and unparsable durations
+    summed over the chunks in ``df.attrs['unparsed_durations']``. With a profiling
+    ``timer``, reading and converting are timed as 'read_csv' and
+    'preprocess_data' stages summed over all chunks.
+    """
+    with stage(timer, 'schema'):
+        header = list(read_header(file))
+        if usecols == 'schema':
+            usecols = schema_columns(header)
+        kinds = classify_columns(header)
+    dtype = {col: 'category' for col, kind in kinds.items() if kind == 'category'}
+
+    start_rss = current_rss()
+    peak = start_rss or 0
+    size = chunksize
+    rows = 0
+    chunks = []
+    unparsed = {}
+    with pd.read_csv(file, thousands=',', dtype=dtype, usecols=usecols, iterator=True) as reader:
+        while True:
+            try:
+                with stage(timer, 'read_csv'):
+                    chunk = reader.get_chunk(size)
+            except StopIteration:
+                break
+            rows += len(chunk)
+            with stage(timer, 'preprocess_data'):
+                chunks.append(preprocess_data(chunk))
+            del chunk
+            for col, count in chunks[-1].attrs['unparsed_durations'].items():
+                unparsed[col] = unparsed.get(col, 0) + count
+
+            rss = current_rss()
+            if rss is None:
+                continue
+            peak = max(peak, rss)
+            if memory_budget and rss > memory_budget:
+                if size <= MIN_CHUNK_ROWS:
+                    raise MemoryError(
+                        f"Loading this file needs more than the {format_bytes(memory_budget)} memory budget "
+                        f"(process is using {format_bytes(rss)} after {rows} rows)"
+                    )
+                size = max(MIN_CHUNK_ROWS, size // 2)
+
+    if chunks:
+        with stage(timer, 'concat'):
+            df = _concat_columns(chunks, kinds)
+    else:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        df = preprocess_data(pd.read_csv(file, nrows=0, usecols=usecols))
+        unparsed = df.attrs['unparsed_durations']
+
+    rss = current_rss()
+    if rss is not None:
+        peak = max(peak, rss)
+    df.attrs['ingest'] = {
+        'rows': rows,
+        'chunks': len(chunks),
+        'start_rss': start_rss,
+        'peak_rss': peak or None,
+    }
+    df.attrs['unparsed_durations'] = unparsed
+    return df
+
+
+def _is_text(series):
+    return series.dtype == 'object' or pd.api.types.is_string_dtype(series)
+
+
+def _downcast(series):
+    """
+    Shrink a numeric column to float32 or int16/int32 when that loses nothing.
+
+    int8 is never used so running sums (e.g. cumulative distance) have some
+    headroom before overflowing.
+    """
+    if not isinstance(series.dtype, np.dtype):
+        return series
+    values = series.to_numpy()
+    if pd.api.types.is_integer_dtype(series):
+        for dtype in (np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+                return series.astype(dtype)
+        return series
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        narrowed = values.astype(np.float32)
+        if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+            return pd.Series(narrowed, index=series.index, name=series.name)
+    return series
+
+
+def _coerce_numeric(series):
+    """Convert a column to the smallest lossless numeric dtype."""
+    if _is_text(series):
+        # Frames that did not come through load_data may still hold
+        # comma-formatted strings.
+        series = pd.to_numeric(series.str.replace(',', '', regex=False), errors='coerce')
+    elif not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors='coerce')
+    return _downcast(series)
+
+
+def _parse_dates(series):
+    if _is_text(series):
+        for fmt in DATE_FORMATS:
+            try:
+                return pd.to_datetime(series, format=fmt)
+            except (ValueError, TypeError):
+                continue
+    return pd.to_datetime(series)
+
+
+def preprocess_data(df):
+    """
+    Return a copy of ``df`` with dates, numbers, durations and categories converted.
+
+    Durations become int32 seconds; how many values of each duration column
+    could not be read is recorded in ``df.attrs['unparsed_durations']``.
+    """
+    converted = {}
+    unparsed = {}
+    for col, kind in classify_columns(df.columns).items():
+        series = df[col]
+        if kind == 'date':
+            converted[col] = _parse_dates(series)
+        elif kind == 'numeric':
+            converted[col] = _coerce_numeric(series)
+        elif kind == 'duration':
+            converted[col], unparsed[col] = parse_durations(series)
+        elif kind == 'category' and not isinstance(series.dtype, pd.CategoricalDtype):
+            converted[col] = series.astype('category')
+
+    df = df.assign(**converted)
+    df.attrs['unparsed_durations'] = unparsed
+    return df
+
+
+def read_bytes(file):
+    """Return the raw bytes of a path or file-like upload."""
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    if hasattr(file, 'read'):
+        data = file.read()
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        return data.encode() if isinstance(data, str) else data
+    with open(file, 'rb') as f:
+        return f.read()
+
+
+def load_dataset(file, cache=None, memory_budget=None, timer=None):
+    """
+    Load and preprocess an export, returning ``(df, schema)``.
+
+    ``file`` holds either the activities CSV or Strava's export ZIP, in
+    which case activities.csv is streamed out of the archive.
+
+    The resolved ColumnSchema travels with the frame so callers that cache
+    the result (e.g. ``st.cache_data``) never have to re-detect columns.
+    With an ActivityCache the processed frame is looked up by the hash of
+    the upload's bytes first and written back after a miss. Parsing goes
+    through ``load_chunked`` with the given ``memory_budget``, reading only
+    the columns the schema resolver assigns a role, and the derived metrics
+    are added before caching. The hash is
+    recorded in ``df.attrs['content_hash']`` as a key for derived caches.
+    """
+    with stage(timer, 'hash'):
+        data = read_bytes(file)
+        key = content_hash(data)
+    with stage(timer, 'cache_read'):
+        df = cache.get(key) if cache is not None else None
+    if df is None:
+        df = load_chunked(open_csv(data), usecols='schema', memory_budget=memory_budget, timer=timer)
+        with stage(timer, 'derived_metrics'):
+            df = add_derived_metrics(df, resolve_schema(df.columns))
+        if cache is not None:
+            with stage(timer, 'cache_write'):
+                cache.put(key, df)
+    df.attrs['content_hash'] = key
+    return df, resolve_schema(df.columns)
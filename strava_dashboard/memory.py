@@ -0,0 +1,50 @@
+"""
+Process memory measurement without third-party dependencies.
+"""
+
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Not Linux: fall back to the peak, the closest figure the OS offers
+    return peak_rss()
+
+
+def peak_rss():
+    """Highest resident set size this process has reached, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_bytes(num):
+    """Human readable size, e.g. '12.3 MB'."""
+    if num is None:
+        return 'n/a'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num) < 1024 or unit == 'GB':
+            return f"{num:.1f} {unit}" if unit != 'B' else f"{num} B"
+        num /= 1024
+
+
+def memory_budget_from_env():
+    """RSS budget in bytes from STRAVA_DASHBOARD_RSS_MB, or None if unset."""
+    value = os.environ.get('STRAVA_DASHBOARD_RSS_MB')
+    if not value:
+        return None
+    return int(float(value) * 1024 * 1024)
@@ -0,0 +1,127 @@
+"""
+Metrics derived from the raw activity columns.
+
+``add_derived_metrics`` adds per-activity pace, speed and Banister's
+heart-rate TRIMP once per upload, after preprocessing, so the columns are
+stored in the on-disk cache with the rest of the processed frame.
+``training_load`` turns TRIMP into daily acute (7-day) and chronic
+(42-day) exponentially weighted loads and their ratio, using cumulative
+sums over the days instead of a per-day loop.
+"""
+
+import numpy as np
+import pandas as pd
+
+PACE_COL = 'Pace (min/km)'
+SPEED_COL = 'Speed (km/h)'
+TRIMP_COL = 'TRIMP'
+DERIVED_COLUMNS = (PACE_COL, SPEED_COL, TRIMP_COL)
+
+# Resting heart rate assumed for TRIMP; exports do not include one
+DEFAULT_REST_HR = 60
+
+# Time constants in days of the acute (fatigue) and chronic (fitness) loads
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 42
+
+# Largest scale factor the cumulative EWMA lets its terms reach before it
+# starts a new block
+_MAX_SCALE = 1e100
+
+
+def _values(df, col):
+    if not col or col not in df.columns:
+        return None
+    return df[col].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def trimp(minutes, avg_hr, rest_hr, max_hr):
+    """
+    Banister's training impulse of activities lasting ``minutes`` at
+    ``avg_hr``, with the heart rate reserve clipped to [0, 1].
+    """
+    reserve = np.clip((avg_hr - rest_hr) / (max_hr - rest_hr), 0, 1)
+    return minutes * reserve * 0.64 * np.exp(1.92 * reserve)
+
+
+def add_derived_metrics(df, schema, rest_hr=DEFAULT_REST_HR, max_hr=None):
+    """
+    Return a copy of ``df`` with pace, speed and TRIMP columns, each added
+    when its source columns exist (distances are taken to be kilometres).
+
+    ``max_hr`` defaults to the highest max (or average) heart rate in the
+    data. Activities without a distance, time or heart rate get NaN.
+    """
+    seconds = _values(df, schema.moving_time)
+    distance = _values(df, schema.distance)
+    derived = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if seconds is not None and distance is not None:
+            moving = np.where(seconds > 0, seconds, np.nan)
+            km = np.where(distance > 0, distance, np.nan)
+            derived[PACE_COL] = (moving / 60 / km).astype('float32')
+            derived[SPEED_COL] = (km / (moving / 3600)).astype('float32')
+
+        avg_hr = _values(df, schema.avg_hr)
+        if seconds is not None and avg_hr is not None:
+            if max_hr is None:
+                peaks = _values(df, schema.max_hr)
+                peaks = peaks if peaks is not None and np.isfinite(peaks).any() else avg_hr
+                max_hr = np.nanmax(peaks) if np.isfinite(peaks).any() else np.nan
+            if max_hr > rest_hr:
+                derived[TRIMP_COL] = trimp(seconds / 60, avg_hr, rest_hr, max_hr).astype('float32')
+    return df.assign(**derived)
+
+
+def ewma(values, days):
+    """
+    Exponentially weighted moving average of a daily series with time
+    constant ``days``, starting from zero.
+
+    Within a block y[i] = d**(i+1) * y[-1] + a * d**i * cumsum(x[k] / d**k),
+    with a = 1 - d the daily weight; blocks are kept short enough that
+    d**-k stays finite.
+    """
+    values = np.asarray(values, dtype='float64')
+    decay = np.exp(-1 / days)
+    block = max(1, int(np.log(_MAX_SCALE) * days))
+    out = np.empty_like(values)
+    carry = 0.0
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(len(chunk))
+        out[start:start + len(chunk)] = (
+            decay * powers * carry + (1 - decay) * powers * np.cumsum(chunk / powers)
+        )
+        carry = out[start + len(chunk) - 1]
+    return out
+
+
+def daily_totals(dates, values):
+    """Sum of ``values`` per calendar day, over every day from the first to the last date."""
+    days = dates.dt.normalize()
+    first, last = days.min(), days.max()
+    index = pd.date_range(first, last, freq='D', name=dates.name)
+    positions = ((days - first) // pd.Timedelta(days=1)).to_numpy()
+    totals = np.bincount(positions, weights=np.nan_to_num(values), minlength=len(index))
+    return pd.Series(totals, index=index)
+
+
+def training_load(df, date_col, load_col=TRIMP_COL, acute_days=ACUTE_DAYS, chronic_days=CHRONIC_DAYS):
+    """
+    Daily 'load' (sum of ``load_col``), 'acute' and 'chronic' exponentially
+    weighted loads and their 'ratio' (acute:chronic workload ratio), one
+    row per day from the first activity of ``df`` to the last. None when
+    either column is missing or there are no dated activities.
+    """
+    if not date_col or date_col not in df.columns or load_col not in df.columns:
+        return None
+    dated = df[date_col].notna().to_numpy()
+    if not dated.any():
+        return None
+    load = daily_totals(df[date_col][dated], df[load_col].to_numpy(dtype='float64', na_value=np.nan)[dated])
+    acute = ewma(load.to_numpy(), acute_days)
+    chronic = ewma(load.to_numpy(), chronic_days)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    return pd.DataFrame({'load': load.to_numpy(), 'acute': acute, 'chronic': chronic, 'ratio': ratio}, index=load.index)
@@ -0,0 +1,118 @@
+"""
+Parsing activity files across processes.
+
+``parse_files`` reads each file's bytes as stored in the ZIP (straight
+from its offset, still compressed) and hands them to a
+ProcessPoolExecutor in small batches, so inflating, gunzipping, parsing,
+simplifying, summarising, rasterising for the heatmap and finding best
+efforts all happen in the workers. At most ``max_in_flight`` batches are
+queued at a time, which bounds the memory held in pending bytes and
+results however large the export is, and results are yielded as batches
+complete.
+"""
+
+import gzip
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+
+from strava_dashboard.archive import inflate
+from strava_dashboard.efforts import best_efforts
+from strava_dashboard.heatmap import rasterize
+from strava_dashboard.tracks import SIMPLIFY_TOLERANCE, empty_track, parse_track, simplified, summarize
+
+# Files per task; enough to amortise the hand-off to a worker
+DEFAULT_BATCH_SIZE = 8
+
+# Batches queued per worker, so workers never wait for the next one
+IN_FLIGHT_PER_WORKER = 2
+
+
+def workers_from_env():
+    """
+    Worker processes from STRAVA_DASHBOARD_TRACK_WORKERS, by default one
+    per CPU; 0 parses in the calling process.
+    """
+    value = os.environ.get('STRAVA_DASHBOARD_TRACK_WORKERS')
+    if value:
+        return max(0, int(value))
+    return os.cpu_count() or 1
+
+
+def process_file(data, compression, gzipped, file_format, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    ``(track, simplified track, summary, heatmap cells, best efforts)`` of
+    one activity file's raw ZIP bytes. Files that cannot be read give an empty track.
+    """
+    try:
+        data = inflate(data, compression)
+        if gzipped:
+            data = gzip.decompress(data)
+        track = parse_track(data, file_format)
+    except (ValueError, OSError, EOFError, zlib.error):
+        track = empty_track()
+    return track, simplified(track, tolerance), summarize(track), rasterize(track), best_efforts(track)
+
+
+def process_batch(jobs, tolerance=SIMPLIFY_TOLERANCE):
+    """``process_file`` of each ``(data, compression, gzipped, format)`` job; runs in a worker."""
+    return [process_file(*job, tolerance=tolerance) for job in jobs]
+
+
+def _context():
+    # Forking a process that runs other threads (as Streamlit does) can
+    # deadlock the child, so workers start from a fresh interpreter
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def parse_files(archive, files, workers=None, tolerance=SIMPLIFY_TOLERANCE, batch_size=DEFAULT_BATCH_SIZE,
+                max_in_flight=None, progress=None):
+    """
+    Yield ``(track_file, track, simplified track, summary, cells,
+    efforts)`` for each TrackFile of ``archive`` in ``files``, in the
+    order they finish. ``workers`` defaults to ``workers_from_env``; with
+    0 or 1 (or a single batch) files are parsed here, as is whatever is
+    left if the pool breaks. ``progress(done, total)`` is called after
+    every batch.
+    """
+    files = list(files)
+    workers = workers_from_env() if workers is None else workers
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    done = 0
+
+    def jobs(batch):
+        return [(*archive.read_raw(file), file.gzipped, file.format) for file in batch]
+
+    def finished(batch, results):
+        nonlocal done
+        done += len(batch)
+        if progress is not None:
+            progress(done, len(files))
+        return ((file, *result) for file, result in zip(batch, results))
+
+    queue = iter(batches)
+    if workers > 1 and len(batches) > 1:
+        max_in_flight = max_in_flight or workers * IN_FLIGHT_PER_WORKER
+        pool = ProcessPoolExecutor(min(workers, len(batches)), mp_context=_context())
+        pending = {}
+        try:
+            while True:
+                for batch in islice(queue, max_in_flight - len(pending)):
+                    pending[pool.submit(process_batch, jobs(batch), tolerance)] = batch
+                if not pending:
+                    break
+                for future in wait(pending, return_when=FIRST_COMPLETED)[0]:
+                    results = future.result()
+                    yield from finished(pending.pop(future), results)
+        except BrokenProcessPool:
+            # Workers could not start or died; the rest is parsed here
+            queue = chain(pending.values(), queue)
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    for batch in queue:
+        yield from finished(batch, process_batch(jobs(batch), tolerance))
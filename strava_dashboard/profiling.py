@@ -0,0 +1,99 @@
+"""
+Opt-in timing and memory measurement of the stages of a dashboard rerun.
+
+Profiling is off unless STRAVA_DASHBOARD_PROFILE is set (the app then
+shows a "Performance" expander) or STRAVA_DASHBOARD_PROFILE_LOG names a
+file, or '-' for stderr, to receive one JSON line per rerun. Code that can
+be profiled takes an optional ``timer`` and wraps its work in
+``stage(timer, name)``, which costs nothing when ``timer`` is None.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from strava_dashboard.memory import current_rss, peak_rss
+
+logger = logging.getLogger('strava_dashboard.profile')
+
+
+def _configure_log(path):
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if path == '-' else logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class StageTimer:
+    """
+    Wall time and RSS change of the named stages of one rerun.
+
+    A stage entered several times (e.g. once per CSV chunk) is accumulated
+    under one name with a call count. Stages may nest; each is measured on
+    its own, so nested times are included in their parent's.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.start_rss = current_rss()
+
+    @classmethod
+    def from_env(cls):
+        """A new timer if profiling is enabled in the environment, else None."""
+        log_path = os.environ.get('STRAVA_DASHBOARD_PROFILE_LOG')
+        if log_path:
+            _configure_log(log_path)
+        elif not os.environ.get('STRAVA_DASHBOARD_PROFILE'):
+            return None
+        return cls()
+
+    @contextmanager
+    def stage(self, name):
+        rss = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            after = current_rss()
+            entry = self.stages.setdefault(name, {'stage': name, 'calls': 0, 'seconds': 0.0, 'rss_delta': 0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            if rss is not None and after is not None:
+                entry['rss_delta'] += after - rss
+            entry['rss'] = after
+
+    def records(self):
+        """One dict per stage, in the order the stages first finished."""
+        return list(self.stages.values())
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def log(self, **fields):
+        """Emit the rerun as one JSON line on the profile logger, with ``fields`` added."""
+        if not logger.handlers:
+            return
+        logger.info(json.dumps({
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            **fields,
+            'seconds': round(self.elapsed(), 6),
+            'rss': current_rss(),
+            'peak_rss': peak_rss(),
+            'stages': [
+                {**record, 'seconds': round(record['seconds'], 6)} for record in self.records()
+            ],
+        }, default=str))
+
+
+def stage(timer, name):
+    """``timer.stage(name)``, or a no-op context when ``timer`` is None."""
+    return timer.stage(name) if timer is not None else nullcontext()
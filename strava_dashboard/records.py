@@ -0,0 +1,294 @@
+"""
+Personal records kept as per-group top-k candidates.
+
+``RecordsIndex`` keeps, for each record (longest distance, most elevation,
+most calories, fastest pace) and each activity type, year and, for pace,
+distance band, the ``k`` best activities. Building it is one sort per
+record; adding newer activities merges their candidates into the existing
+ones, since the top k of a union is always among the top k of its parts.
+
+Under the sidebar filters the candidates themselves are filtered. The best
+matching candidate of a group is the group's best matching activity, as
+every activity left out of the group scores no higher than its last
+candidate. Only when a filter rejects all of a full group's candidates
+and the group could still beat the best match are the filtered rows of
+that group scanned.
+"""
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.filters import date_range_bounds
+from strava_dashboard.metrics import PACE_COL
+
+DEFAULT_TOP_K = 10
+
+# Distance bands (km) within which pace records are compared
+PACE_BANDS = (0, 5, 10, 21.0975, 42.195, np.inf)
+PACE_BAND_LABELS = ('Under 5 km', '5 km - 10 km', '10 km - Half', 'Half - Marathon', 'Marathon+')
+
+# Record -> (schema role or derived column, whether larger values are better)
+RECORDS = {
+    'distance': ('distance', True),
+    'elevation': ('elevation', True),
+    'calories': ('calories', True),
+    'pace': (PACE_COL, False),
+}
+
+GROUP_KEYS = ['record', 'activity', 'year', 'band']
+CANDIDATE_COLUMNS = GROUP_KEYS + ['score', 'value', 'date', 'distance', 'gear', 'name']
+
+
+def _column(df, schema, source):
+    col = getattr(schema, source, None) if source in RECORDS else source
+    return col if col and col in df.columns else None
+
+
+def _text(df, col, positions):
+    if not col or col not in df.columns:
+        return np.full(len(positions), None, dtype=object)
+    values = df[col].iloc[positions].astype(object)
+    return values.where(values.notna(), None).to_numpy()
+
+
+def _codes(df, col):
+    if not col or col not in df.columns:
+        return np.zeros(len(df), dtype='int64')
+    values = df[col]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype('int64')
+    return pd.factorize(values, use_na_sentinel=True)[0].astype('int64')
+
+
+def _when(dates):
+    """Dates as int64 nanoseconds for ordering, missing dates last."""
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        return np.zeros(len(dates), dtype='int64')
+    when = dates.to_numpy(dtype='datetime64[ns]').view('int64')
+    return np.where(dates.isna().to_numpy(), np.iinfo('int64').max, when)
+
+
+def _top_positions(keys, score, order_by, k):
+    """
+    Positions of the ``k`` highest ``score`` values per distinct key, best
+    first and ties in ``order_by`` order.
+    """
+    order = np.lexsort((order_by, -score, keys))
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    rank = np.arange(len(keys)) - np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    return order[rank < k]
+
+
+def _columns(df, schema):
+    """The arrays every record needs, computed once per frame."""
+    distance_col = _column(df, schema, 'distance')
+    date_col = schema.date if schema.date and schema.date in df.columns else None
+    dates = df[date_col] if date_col else pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    year = dates.dt.year.to_numpy(dtype='float64', na_value=np.nan)
+    return {
+        'distance': (
+            df[distance_col].to_numpy(dtype='float64', na_value=np.nan) if distance_col
+            else np.full(len(df), np.nan)
+        ),
+        'dates': dates,
+        'year': np.where(np.isnan(year), -1, year).astype('int64'),
+        'activity': _codes(df, schema.activity),
+    }
+
+
+def _record_rows(df, schema, record, k=None, columns=None):
+    """
+    Activities of ``df`` with a value for ``record`` as candidate rows, or
+    only the ``k`` best of each group. None if the column is missing.
+    ``columns`` are the frame's ``_columns``, when already computed.
+    """
+    source, larger = RECORDS[record]
+    col = _column(df, schema, source)
+    if col is None:
+        return None
+    columns = columns or _columns(df, schema)
+    distance, dates, year = columns['distance'], columns['dates'], columns['year']
+    values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+    valid = np.isfinite(values)
+    if record == 'pace':
+        band = np.searchsorted(PACE_BANDS, distance, side='right') - 1
+        valid &= np.isfinite(distance)
+    else:
+        band = np.full(len(df), -1)
+
+    positions = np.flatnonzero(valid)
+    if k is not None:
+        # One integer key per (activity, year, band) group
+        keys = ((columns['activity'] + 1) * 4096 + (year + 1)) * 8 + (band + 1)
+        score = values if larger else -values
+        # Ties go to the earliest activity
+        positions = positions[_top_positions(keys[positions], score[positions], _when(dates)[positions], k)]
+
+    values = values[positions]
+    return pd.DataFrame({
+        'record': record,
+        'activity': _text(df, schema.activity, positions),
+        'year': pd.array(np.where(year[positions] < 0, None, year[positions]), dtype='Int16'),
+        'band': band[positions].astype('int8'),
+        'score': values if larger else -values,
+        'value': values,
+        'date': dates.iloc[positions].reset_index(drop=True),
+        'distance': distance[positions],
+        'gear': _text(df, schema.gear, positions),
+        'name': _text(df, schema.name, positions),
+    })
+
+
+def _ranked(rows):
+    """``rows`` best first, ties going to the earliest activity."""
+    return rows.sort_values(['score', 'date'], ascending=[False, True], kind='stable', na_position='last')
+
+
+def _top_k(rows, k):
+    """The ``k`` highest scoring rows of each group, best first."""
+    rows = _ranked(rows)
+    return rows.groupby(GROUP_KEYS, dropna=False, sort=False).head(k).reset_index(drop=True)
+
+
+def _best_per(rows, by):
+    rows = _ranked(rows)
+    if by:
+        return rows.groupby(by, dropna=False, sort=False).head(1).reset_index(drop=True)
+    return rows.head(1).reset_index(drop=True)
+
+
+class RecordsIndex:
+    """
+    Top-``k`` candidate activities per (record, activity type, year, band).
+
+    ``candidates`` has the GROUP_KEYS columns ('band' is -1 except for
+    pace), 'score' (the value, negated for pace so higher is better),
+    'value', 'date', 'distance', 'gear', 'name', a 'group' number and, once
+    sliced, 'match' marking the candidates that pass the row-level filters.
+    """
+
+    def __init__(self, candidates, schema, k=DEFAULT_TOP_K):
+        if 'group' not in candidates.columns:
+            candidates = candidates.assign(group=candidates.groupby(GROUP_KEYS, dropna=False, sort=False).ngroup())
+        self.candidates = candidates
+        self.schema = schema
+        self.k = k
+        dates = candidates['date']
+        self.tz = getattr(dates.dt, 'tz', None) if pd.api.types.is_datetime64_any_dtype(dates) else None
+
+    @classmethod
+    def build(cls, df, schema, k=DEFAULT_TOP_K):
+        """Index the records of every activity in ``df``."""
+        columns = _columns(df, schema)
+        parts = [_record_rows(df, schema, record, k, columns) for record in RECORDS]
+        parts = [part for part in parts if part is not None]
+        candidates = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=CANDIDATE_COLUMNS)
+        return cls(candidates, schema, k)
+
+    def update(self, df):
+        """A new index that also covers the activities of ``df``."""
+        added = RecordsIndex.build(df, self.schema, self.k).candidates
+        candidates = pd.concat([self.candidates, added], ignore_index=True).drop(columns='group')
+        return RecordsIndex(_top_k(candidates, self.k), self.schema, self.k)
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def slice(self, activity_types=None, gear=None, date_range=None, distance_range=None):
+        """
+        The groups the sidebar filters can reach, with each candidate's
+        'match' flag telling whether the filters keep it. Semantics are
+        those of FilterIndex.
+        """
+        candidates = self.candidates
+        scope = np.ones(len(candidates), dtype=bool)
+        match = np.ones(len(candidates), dtype=bool)
+        if activity_types is not None:
+            scope &= candidates['activity'].isin(list(activity_types)).to_numpy()
+        if date_range is not None and len(date_range) == 2:
+            start, end = date_range_bounds(date_range, self.tz)
+            years = candidates['year'].to_numpy(dtype='float64', na_value=np.nan)
+            scope &= (years >= start.year) & (years <= (end - pd.Timedelta(1)).year)
+            dates = candidates['date']
+            match &= ((dates >= start) & (dates < end)).to_numpy()
+        if gear is not None:
+            match &= candidates['gear'].isin(list(gear)).to_numpy()
+        if distance_range is not None:
+            distance = candidates['distance'].to_numpy()
+            match &= (distance >= distance_range[0]) & (distance <= distance_range[1])
+        sliced = candidates[scope].assign(match=match[scope])
+        return RecordsIndex(sliced, self.schema, self.k)
+
+    def best(self, record, by=(), rows=None):
+        """
+        The best matching activity for ``record``, one per value of the
+        ``by`` columns (e.g. ``['activity']`` or ``['activity', 'band']``),
+        as candidate rows. ``rows`` is a callable returning the filtered
+        frame, only called when a group has to be scanned.
+        """
+        by = list(by)
+        candidates = self.candidates
+        in_record = (candidates['record'] == record).to_numpy()
+        match = candidates['match'].to_numpy() if 'match' in candidates.columns else np.ones(len(candidates), dtype=bool)
+        score = candidates['score'].to_numpy(dtype='float64')
+        outcome = (
+            candidates.groupby(by, dropna=False, sort=False).ngroup().to_numpy() if by
+            else np.zeros(len(candidates), dtype='int64')
+        )
+        found = np.flatnonzero(in_record & match)
+        found = found[_top_positions(outcome[found], score[found], _when(candidates['date'])[found], 1)]
+
+        # Groups whose candidates were all filtered out, but which are full
+        # (so may hold more activities) and score above the best found
+        members = np.flatnonzero(in_record)
+        group = candidates['group'].to_numpy()[members]
+        groups = group.max() + 1 if len(group) else 0
+        size = np.bincount(group, minlength=groups)
+        matches = np.bincount(group, weights=match[members], minlength=groups)
+        last = np.full(groups, np.inf)
+        np.minimum.at(last, group, score[members])
+        threshold = np.full(outcome.max() + 1 if len(outcome) else 0, -np.inf)
+        threshold[outcome[found]] = score[found]
+        group_outcome = np.zeros(groups, dtype='int64')
+        group_outcome[group] = outcome[members]
+        unsure = (size >= self.k) & (matches == 0) & (last > threshold[group_outcome])
+
+        found = candidates.iloc[found].drop(columns=['group', 'match'], errors='ignore')
+        if unsure.any() and rows is not None:
+            scanned = _record_rows(rows(), self.schema, record, k=1)
+            if scanned is not None:
+                keys = candidates.iloc[members[unsure[group]]][GROUP_KEYS].drop_duplicates()
+                scanned = scanned.merge(keys, on=GROUP_KEYS)
+                found = _best_per(pd.concat([found, scanned], ignore_index=True), by)
+        return found.reset_index(drop=True)
+
+    def insights(self, rows=None):
+        """Same dict as ``aggregations.key_insights``, from the index."""
+        insights = {}
+        for record in ('distance', 'elevation', 'calories'):
+            best = self.best(record, rows=rows)
+            if len(best):
+                activity = best['activity'].iloc[0]
+                insights[record] = (best['value'].iloc[0], activity if pd.notna(activity) else None)
+            else:
+                insights[record] = None
+        return insights
+
+    def table(self, rows=None):
+        """
+        Best distance, elevation and calories per activity type (one column
+        each) and fastest pace per distance band (one column per label of
+        PACE_BAND_LABELS), indexed by activity type.
+        """
+        columns = {}
+        for record in ('distance', 'elevation', 'calories'):
+            best = self.best(record, by=['activity'], rows=rows)
+            columns[record] = best.set_index('activity')['value']
+        pace = self.best('pace', by=['activity', 'band'], rows=rows)
+        for band, label in enumerate(PACE_BAND_LABELS):
+            columns[label] = pace[pace['band'] == band].set_index('activity')['value']
+        table = pd.DataFrame(columns)
+        table.index.name = 'activity'
+        return table.dropna(how='all', axis=1)
+
@@ -0,0 +1,160 @@
+"""
+Pre-aggregated rollup of activities by day, activity type and gear.
+
+The cube is built once per dataset. Summary totals, weekday bars and
+day/week/month time series only need per-bucket sums, so they are answered
+by slicing the cube (a few rows per active day) instead of scanning every
+activity. Filters on per-activity values such as distance cannot be
+answered from buckets; callers fall back to the raw rows for those.
+"""
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.filters import date_range_bounds
+from strava_dashboard.schema import DAY_ORDER
+
+# Measure name -> schema role summed into it
+SUM_MEASURES = {
+    'distance': 'distance',
+    'elevation': 'elevation',
+    'calories': 'calories',
+    'moving_time': 'moving_time',
+}
+
+# Offset aliases for ``RollupCube.series``; weeks start on Monday
+FREQUENCIES = {
+    'day': 'D',
+    'week': 'W-MON',
+    'month': 'MS',
+}
+
+
+def _as_number(series):
+    """Float view of a measure column; durations become seconds."""
+    if pd.api.types.is_timedelta64_dtype(series):
+        return series.dt.total_seconds()
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype('float64')
+    return None
+
+
+class RollupCube:
+    """
+    Per (day, activity type, gear) sums of the activity measures.
+
+    ``cube`` has one row per non-empty bucket with key columns 'day',
+    'activity' and 'gear' (None when the dataset has no such column),
+    'count', the summed measures present in the data and 'hr_sum' /
+    'hr_count' for averaging heart rate.
+    """
+
+    def __init__(self, cube, tz=None):
+        self.cube = cube
+        self.tz = tz
+
+    @classmethod
+    def build(cls, df, schema):
+        """Roll ``df`` up; returns None without a date column."""
+        if not schema.date or schema.date not in df.columns:
+            return None
+
+        dates = df[schema.date]
+        columns = {'day': dates.dt.floor('D'), 'count': np.ones(len(df), dtype='int64')}
+        keys = ['day']
+        for key, col in (('activity', schema.activity), ('gear', schema.gear)):
+            if col and col in df.columns:
+                columns[key] = df[col]
+                keys.append(key)
+        for measure, role in SUM_MEASURES.items():
+            col = getattr(schema, role)
+            if col and col in df.columns:
+                values = _as_number(df[col])
+                if values is not None:
+                    columns[measure] = values
+        if schema.avg_hr and schema.avg_hr in df.columns:
+            hr = df[schema.avg_hr].astype('float64')
+            columns['hr_sum'] = hr
+            columns['hr_count'] = hr.notna().astype('int64')
+
+        frame = pd.DataFrame(columns, index=df.index)
+        # min_count=1 keeps all-missing buckets NaN rather than 0
+        measures = [col for col in frame.columns if col not in keys]
+        cube = (
+            frame.groupby(keys, observed=True, dropna=False, sort=True)[measures]
+            .sum(min_count=1)
+            .reset_index()
+        )
+        cube['count'] = cube['count'].astype('int64')
+        if 'hr_count' in cube.columns:
+            cube['hr_count'] = cube['hr_count'].fillna(0).astype('int64')
+        return cls(cube, getattr(dates.dt, 'tz', None))
+
+    def __len__(self):
+        return len(self.cube)
+
+    def slice(self, activity_types=None, gear=None, date_range=None):
+        """
+        The buckets matching the sidebar filters, with the same semantics as
+        FilterIndex (selecting gear drops activities without gear).
+        """
+        cube = self.cube
+        mask = np.ones(len(cube), dtype=bool)
+        if activity_types is not None and 'activity' in cube.columns:
+            mask &= cube['activity'].isin(list(activity_types)).to_numpy()
+        if gear is not None and 'gear' in cube.columns:
+            mask &= cube['gear'].isin(list(gear)).to_numpy()
+        if date_range is not None and len(date_range) == 2:
+            start, end = date_range_bounds(date_range, self.tz)
+            days = cube['day']
+            mask &= ((days >= start) & (days < end)).to_numpy()
+        return RollupCube(cube[mask], self.tz)
+
+    def _total(self, measure):
+        if measure not in self.cube.columns:
+            return None
+        return self.cube[measure].sum()
+
+    def summary(self):
+        """Same dict as ``summary_metrics`` for the activities in the cube."""
+        hr_count = self._total('hr_count')
+        avg_hr = None
+        if hr_count is not None:
+            avg_hr = self._total('hr_sum') / hr_count if hr_count else np.nan
+        return {
+            'activities': int(self.cube['count'].sum()),
+            'distance': self._total('distance'),
+            'elevation': self._total('elevation'),
+            'calories': self._total('calories'),
+            'avg_hr': avg_hr,
+        }
+
+    @staticmethod
+    def _with_avg_hr(totals):
+        if 'hr_sum' in totals.columns:
+            totals['avg_hr'] = totals['hr_sum'] / totals['hr_count'].replace(0, np.nan)
+            totals = totals.drop(columns=['hr_sum', 'hr_count'])
+        return totals
+
+    def weekday(self):
+        """Same frame as ``weekday_summary`` for the activities in the cube."""
+        weekday = self.cube['day'].dt.day_name()
+        measures = [col for col in ('count', 'distance', 'calories', 'hr_sum', 'hr_count') if col in self.cube.columns]
+        totals = self.cube[measures].groupby(weekday).sum()
+        totals = self._with_avg_hr(totals).reindex(DAY_ORDER, fill_value=0)
+        totals.index.name = 'Day of Week'
+        return totals
+
+    def series(self, granularity):
+        """
+        Totals per 'day', 'week' or 'month', indexed by the start of each
+        period, with 'avg_hr' in place of the heart rate sum and count.
+        Periods without activities are included with zero counts.
+        """
+        freq = FREQUENCIES[granularity]
+        cube = self.cube.dropna(subset=['day'])
+        measures = [col for col in cube.columns if col not in ('day', 'activity', 'gear')]
+        grouper = pd.Grouper(key='day', freq=freq, label='left', closed='left')
+        totals = cube[['day'] + measures].groupby(grouper).sum()
+        totals.index.name = 'Period'
+        return self._with_avg_hr(totals)
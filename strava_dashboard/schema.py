@@ -0,0 +1,115 @@
+"""
+Resolution of the columns the dashboard needs in a Strava export.
+
+Strava's own activities.csv repeats several headers ("Distance",
+"Elapsed Time", "Max Heart Rate", ...): the first copy is in the athlete's
+display units, the second in raw SI units. pandas renames the repeats to
+"Distance.1" etc., so the resolver prefers exact aliases and never picks a
+renamed duplicate unless nothing else matches.
+"""
+
+import re
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+
+@dataclass(frozen=True)
+class ColumnSchema:
+    """Names of the columns playing each role in a dataset (None if absent)."""
+
+    date: str = None
+    activity: str = None
+    distance: str = None
+    elevation: str = None
+    moving_time: str = None
+    elapsed_time: str = None
+    calories: str = None
+    avg_hr: str = None
+    max_hr: str = None
+    gear: str = None
+    activity_id: str = None
+    name: str = None
+    filename: str = None
+
+    def as_dict(self):
+        """Role to column mapping for the roles present in the dataset."""
+        return {role: col for role, col in asdict(self).items() if col is not None}
+
+
+# Exact header names per role, lower-cased, in order of preference. Covers
+# Strava's bulk export (activities.csv), older exports and the sample data.
+COLUMN_ALIASES = {
+    'date': ('activity date', 'date', 'start date', 'start date local'),
+    'activity': ('activity type', 'type', 'sport type'),
+    'distance': ('distance', 'distance (km)', 'distance (mi)'),
+    'elevation': ('elevation gain', 'elevation gain (m)', 'total elevation gain', 'elevation gain (ft)'),
+    'moving_time': ('moving time',),
+    'elapsed_time': ('elapsed time',),
+    'calories': ('calories', 'calories (kcal)', 'kilocalories'),
+    'avg_hr': ('average heart rate', 'avg heart rate', 'avg heart rate (bpm)', 'avg hr', 'average heartrate'),
+    'max_hr': ('max heart rate', 'max heart rate (bpm)', 'max hr', 'max heartrate'),
+    'gear': ('activity gear', 'gear'),
+    'activity_id': ('activity id', 'id'),
+    'name': ('activity name', 'name'),
+    'filename': ('filename',),
+}
+
+# Fallback for headers that are not in the alias table: every keyword group
+# must appear in the lower-cased header (any word of a group will do).
+COLUMN_KEYWORDS = {
+    'distance': (('distance',),),
+    'elevation': (('elevation',),),
+    'moving_time': (('moving time',),),
+    'elapsed_time': (('elapsed time',),),
+    'calories': (('calories', 'kilocalories'),),
+    'avg_hr': (('avg', 'average'), ('heart rate', 'heartrate', 'hr')),
+    'max_hr': (('max',), ('heart rate', 'heartrate', 'hr')),
+    'gear': (('gear',),),
+}
+
+# Order of the derived 'Day of Week' column in every weekday breakdown
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+_DUPLICATE_SUFFIX = re.compile(r'\.\d+$')
+
+
+def _keyword_match(names, groups):
+    for col, name in names:
+        if all(any(word in name for word in group) for group in groups):
+            return col
+    return None
+
+
+@lru_cache(maxsize=64)
+def _resolve(columns):
+    names = [(col, str(col).strip().lower()) for col in columns]
+    originals = [(col, name) for col, name in names if not _DUPLICATE_SUFFIX.search(name)]
+    by_name = {}
+    for col, name in originals:
+        by_name.setdefault(name, col)
+
+    roles = {}
+    for role, aliases in COLUMN_ALIASES.items():
+        col = next((by_name[alias] for alias in aliases if alias in by_name), None)
+        if col is None and role in COLUMN_KEYWORDS:
+            col = (
+                _keyword_match(originals, COLUMN_KEYWORDS[role])
+                or _keyword_match(names, COLUMN_KEYWORDS[role])
+            )
+        roles[role] = col
+    return ColumnSchema(**roles)
+
+
+def resolve_schema(columns):
+    """
+    Map each dashboard role to a column of the given header.
+
+    Results are cached per distinct header, so calling this on every rerun
+    only does the work once per uploaded file layout.
+    """
+    return _resolve(tuple(columns))
+
+
+def detect_columns(df):
+    """Work out which columns of ``df`` hold each field the dashboard uses."""
+    return resolve_schema(df.columns)
@@ -0,0 +1,547 @@
+"""
+Filters and aggregations as SQL over an embedded database.
+
+With STRAVA_DASHBOARD_SQL set, each dataset is copied once into an
+embedded database: a Parquet file that DuckDB queries in place, or a
+SQLite file where DuckDB is not installed. ``SqlDataset`` answers the
+sidebar through the FilterIndex interface, with each mask a WHERE clause,
+and ``SqlAggregates`` answers every figure with a query over the copy.
+DuckDB reads the Parquet file a row group at a time, so only result sets
+(grouped totals, histogram bins, the points of a timeline, row positions)
+come back as pandas frames. The filtered rows are never materialised as a
+whole except by the views that show them all (the export, best efforts),
+which take them from the loaded frame by position; a Data Table page
+takes only its own rows.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.aggregations import Aggregates, distance_timeline, metric_timeline
+from strava_dashboard.cache import CACHE_VERSION, ActivityCache, cache_dir_from_env
+from strava_dashboard.downsample import DEFAULT_MAX_POINTS, downsample
+from strava_dashboard.export import pq, write_parquet
+from strava_dashboard.filters import date_range_bounds
+from strava_dashboard.metrics import TRIMP_COL, training_load
+from strava_dashboard.rollup import SUM_MEASURES, RollupCube
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Backend -> file suffix of its copy of the data
+SQL_BACKENDS = {
+    'duckdb': '.parquet',
+    'sqlite': '.sqlite',
+}
+
+# DuckDB unless it (or pyarrow, which writes its Parquet copy) is missing
+DEFAULT_SQL_BACKEND = 'duckdb' if duckdb is not None and pq is not None else 'sqlite'
+
+TABLE = 'activities'
+
+# Position of each row in the frame the copy was made from
+ROW_COLUMN = '_row'
+
+# Values a finite float lies between; missing and infinite ones fall outside
+FINITE = (-sys.float_info.max, sys.float_info.max)
+
+
+def backend_from_env():
+    """
+    Backend named by STRAVA_DASHBOARD_SQL: 'duckdb' (also '1', 'on' or
+    'auto') or 'sqlite'. DuckDB falls back to SQLite when it or pyarrow is
+    missing. None when unset, which keeps aggregations in pandas.
+    """
+    value = os.environ.get('STRAVA_DASHBOARD_SQL', '').strip().lower()
+    if not value or value in ('0', 'off', 'pandas'):
+        return None
+    if value in ('1', 'on', 'auto'):
+        value = 'duckdb'
+    if value not in SQL_BACKENDS:
+        raise ValueError(f"Unsupported STRAVA_DASHBOARD_SQL backend: {value}")
+    if value == 'duckdb':
+        return DEFAULT_SQL_BACKEND
+    return value
+
+
+def quote(name):
+    """``name`` as a quoted SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_frame(df):
+    """Every column of ``df`` plus ROW_COLUMN, dates as wall-clock time and durations in seconds."""
+    columns = {ROW_COLUMN: np.arange(len(df), dtype='int64')}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_timedelta64_dtype(values):
+            values = values.dt.total_seconds()
+        elif isinstance(values.dtype, pd.DatetimeTZDtype):
+            values = values.dt.tz_localize(None)
+        columns[col] = values.reset_index(drop=True)
+    return pd.DataFrame(columns)
+
+
+def _write_sqlite(frame, schema, path):
+    con = sqlite3.connect(path)
+    try:
+        frame = frame.copy()
+        for col in frame.columns:
+            if pd.api.types.is_datetime64_dtype(frame[col]):
+                # ISO text sorts and compares like the timestamps
+                frame[col] = frame[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+            elif isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].astype(object)
+        frame.to_sql(TABLE, con, index=False, chunksize=50_000)
+        for role in ('date', 'activity'):
+            col = getattr(schema, role)
+            if col in frame.columns:
+                con.execute(f'CREATE INDEX {TABLE}_{role} ON {TABLE} ({quote(col)})')
+        con.commit()
+    finally:
+        con.close()
+
+
+class SqlDataset:
+    """
+    One dataset's copy in an embedded database, and the queries the
+    dashboard runs over it. Each thread gets its own read-only connection.
+
+    The sidebar uses it like a FilterIndex: the ``*_mask`` methods return a
+    ``(clause, params)`` pair instead of a boolean array (None when they do
+    not restrict anything), ``combine`` ANDs them together, and the options
+    and bounds methods take such a pair. Every query takes one as its
+    ``where``, None meaning all rows.
+    """
+
+    # A full-range distance filter may drop rows without a distance
+    distance_complete = False
+
+    def __init__(self, path, backend, schema, columns, tz=None, dates=()):
+        self.path = path
+        self.backend = backend
+        self.schema = schema
+        self.columns = list(columns)
+        self.tz = tz
+        # Timestamp columns, which SQLite hands back as text
+        self.dates = set(dates)
+        self._local = threading.local()
+
+    @classmethod
+    def build(cls, df, schema, backend, path):
+        """Copy ``df`` to ``path`` unless it is there already, and open it."""
+        frame = _table_frame(df)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            if backend == 'duckdb':
+                write_parquet(frame, tmp_path)
+            else:
+                _write_sqlite(frame, schema, tmp_path)
+            os.replace(tmp_path, path)
+        else:
+            os.utime(path)
+        tz = getattr(df[schema.date].dt, 'tz', None) if schema.date in frame.columns else None
+        dates = [col for col in frame.columns if pd.api.types.is_datetime64_dtype(frame[col])]
+        return cls(path, backend, schema, frame.columns, tz, dates)
+
+    @classmethod
+    def from_env(cls, df, schema, key):
+        """
+        The dataset for ``key`` with the backend from ``backend_from_env``,
+        or None if unset. Copies live under STRAVA_DASHBOARD_CACHE_DIR within
+        STRAVA_DASHBOARD_CACHE_MB, or in a temporary directory removed when
+        the process exits if the cache is disabled.
+        """
+        backend = backend_from_env()
+        if backend is None:
+            return None
+        directory, max_bytes = cache_dir_from_env(temporary=True)
+        files = ActivityCache(os.path.join(directory, f'sql-v{CACHE_VERSION}'), max_bytes)
+        files.suffix = SQL_BACKENDS[backend]
+        dataset = cls.build(df, schema, backend, os.path.join(files.directory, f'{key}{files.suffix}'))
+        files.evict()
+        return dataset
+
+    def _connection(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            if self.backend == 'duckdb':
+                con = duckdb.connect()
+                path = self.path.replace("'", "''")
+                con.execute(f"CREATE VIEW {TABLE} AS SELECT * FROM read_parquet('{path}')")
+            else:
+                con = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._local.con = con
+        return con
+
+    def query(self, sql, params=()):
+        """Result of ``sql`` (with ``?`` placeholders for ``params``) as a DataFrame."""
+        con = self._connection()
+        if self.backend == 'duckdb':
+            return con.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, con, params=list(params))
+
+    def _has(self, role):
+        col = getattr(self.schema, role)
+        return bool(col) and col in self.columns
+
+    def _col(self, role):
+        return quote(getattr(self.schema, role))
+
+    def _timestamp(self, value):
+        if self.backend == 'duckdb':
+            return value.to_pydatetime()
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _where(where):
+        return where if where is not None else ('TRUE', ())
+
+    def _order(self, sort_by=None, ascending=True):
+        """ORDER BY terms listing rows like a FilterIndex frame: by date with missing dates last."""
+        keys = [f'{quote(sort_by)} {"ASC" if ascending else "DESC"} NULLS LAST'] if sort_by else []
+        if self._has('date'):
+            keys.append(f'{self._col("date")} NULLS LAST')
+        return ', '.join(keys + [ROW_COLUMN])
+
+    def _in(self, role, selected):
+        if selected is None or not self._has(role):
+            return None
+        if not len(selected):
+            return 'FALSE', ()
+        return f'{self._col(role)} IN ({", ".join("?" * len(selected))})', tuple(str(value) for value in selected)
+
+    def activity_mask(self, selected):
+        """Rows whose activity type is in ``selected``."""
+        return self._in('activity', selected)
+
+    def gear_mask(self, selected):
+        """Rows recorded with gear in ``selected`` (rows without gear never match)."""
+        return self._in('gear', selected)
+
+    def date_mask(self, date_range):
+        """Rows dated within the inclusive ``(start, end)`` calendar dates."""
+        if date_range is None or len(date_range) != 2 or not self._has('date'):
+            return None
+        start, end = date_range_bounds(date_range)
+        return (
+            f'{self._col("date")} >= ? AND {self._col("date")} < ?',
+            (self._timestamp(start), self._timestamp(end)),
+        )
+
+    def distance_mask(self, dist_range):
+        """Rows whose distance is within the inclusive ``(low, high)`` range."""
+        if dist_range is None or not self._has('distance'):
+            return None
+        return f'{self._col("distance")} BETWEEN ? AND ?', tuple(float(value) for value in dist_range)
+
+    @staticmethod
+    def combine(*masks):
+        """AND together the given masks, ignoring None; None if all are None."""
+        masks = [mask for mask in masks if mask is not None]
+        if not masks:
+            return None
+        return ' AND '.join(f'({clause})' for clause, _ in masks), sum((tuple(params) for _, params in masks), ())
+
+    def where(self, activity_types=None, gear=None, date_range=None, distance_range=None):
+        """Every sidebar filter as one mask, with the same semantics as FilterIndex."""
+        return self.combine(
+            self.activity_mask(activity_types),
+            self.gear_mask(gear),
+            self.date_mask(date_range),
+            self.distance_mask(distance_range),
+        )
+
+    def _options(self, role, where=None):
+        if not self._has(role):
+            return []
+        clause, params = self._where(where)
+        col = self._col(role)
+        return self.query(
+            f'SELECT DISTINCT {col} AS value FROM {TABLE} WHERE {clause} AND {col} IS NOT NULL ORDER BY 1', params,
+        )['value'].tolist()
+
+    def activity_options(self):
+        """Activity types present in the dataset."""
+        return self._options('activity')
+
+    def gear_options(self, mask=None):
+        """Gear values present among the selected rows."""
+        return self._options('gear', mask)
+
+    def _bounds(self, role, where=None):
+        clause, params = self._where(where)
+        col = self._col(role)
+        return self.query(f'SELECT MIN({col}) AS low, MAX({col}) AS high FROM {TABLE} WHERE {clause}', params).iloc[0]
+
+    def date_bounds(self, mask=None):
+        """Earliest and latest date (wall-clock time) among the selected rows."""
+        if not self._has('date'):
+            return None, None
+        bounds = self._bounds('date', mask)
+        if pd.isna(bounds['low']):
+            return None, None
+        return pd.Timestamp(bounds['low']), pd.Timestamp(bounds['high'])
+
+    def distance_bounds(self, mask=None):
+        """Smallest and largest distance among the selected rows."""
+        if not self._has('distance'):
+            return None, None
+        bounds = self._bounds('distance', mask)
+        if pd.isna(bounds['low']):
+            return None, None
+        return float(bounds['low']), float(bounds['high'])
+
+    def count(self, where=None):
+        """Number of rows matching ``where``."""
+        clause, params = self._where(where)
+        return int(self.query(f'SELECT COUNT(*) AS count FROM {TABLE} WHERE {clause}', params)['count'].iloc[0])
+
+    def positions(self, where=None, sort_by=None, ascending=True, search_col=None, search=None):
+        """
+        ROW_COLUMN of the rows matching ``where``, in the order and with the
+        search of ``table.table_rows``: sorted by ``sort_by`` (date order
+        when None) with missing values last, restricted to rows whose
+        ``search_col`` contains ``search`` (ignoring case, of ASCII letters
+        only in SQLite).
+        """
+        clause, params = self._where(where)
+        if search and search_col:
+            clause += f' AND instr(lower(CAST({quote(search_col)} AS TEXT)), ?) > 0'
+            params = tuple(params) + (search.lower(),)
+        rows = self.query(
+            f'SELECT {ROW_COLUMN} FROM {TABLE} WHERE {clause} ORDER BY {self._order(sort_by, ascending)}', params,
+        )
+        return rows[ROW_COLUMN].to_numpy(dtype='int64')
+
+    def select(self, where, columns):
+        """
+        The ``columns`` present in the copy of the rows matching ``where``,
+        in date order; dates come back as wall-clock time.
+        """
+        columns = [col for col in dict.fromkeys(columns) if col and col in self.columns]
+        clause, params = self._where(where)
+        rows = self.query(
+            f'SELECT {", ".join(quote(col) for col in columns) or ROW_COLUMN} FROM {TABLE} '
+            f'WHERE {clause} ORDER BY {self._order()}',
+            params,
+        )
+        for col in self.dates.intersection(columns):
+            rows[col] = pd.to_datetime(rows[col])
+        return rows[columns]
+
+    def summary(self, where=None):
+        """Same dict as ``aggregations.summary_metrics``."""
+        clause, params = self._where(where)
+        measures = ['COUNT(*) AS activities']
+        measures += [
+            f'COALESCE(SUM(CAST({self._col(role)} AS DOUBLE)), 0) AS {role}'
+            for role in ('distance', 'elevation', 'calories') if self._has(role)
+        ]
+        if self._has('avg_hr'):
+            measures.append(f'AVG(CAST({self._col("avg_hr")} AS DOUBLE)) AS avg_hr')
+        row = self.query(f'SELECT {", ".join(measures)} FROM {TABLE} WHERE {clause}', params).astype('float64').iloc[0]
+        summary = {'activities': int(row['activities'])}
+        for role in ('distance', 'elevation', 'calories', 'avg_hr'):
+            summary[role] = float(row[role]) if role in row.index else None
+        return summary
+
+    def rollup(self, where=None):
+        """RollupCube of the activities matching ``where``; None without a date column."""
+        if not self._has('date'):
+            return None
+        clause, params = self._where(where)
+        if self.backend == 'duckdb':
+            keys = [f"date_trunc('day', {self._col('date')}) AS day"]
+        else:
+            keys = [f"substr({self._col('date')}, 1, 10) AS day"]
+        keys += [f'{self._col(role)} AS {role}' for role in ('activity', 'gear') if self._has(role)]
+        measures = ['COUNT(*) AS count']
+        measures += [
+            f'SUM(CAST({self._col(role)} AS DOUBLE)) AS {measure}'
+            for measure, role in SUM_MEASURES.items() if self._has(role)
+        ]
+        if self._has('avg_hr'):
+            measures += [
+                f'SUM(CAST({self._col("avg_hr")} AS DOUBLE)) AS hr_sum',
+                f'COUNT({self._col("avg_hr")}) AS hr_count',
+            ]
+        positions = ', '.join(str(i + 1) for i in range(len(keys)))
+        cube = self.query(
+            f'SELECT {", ".join(keys + measures)} FROM {TABLE} WHERE {clause} '
+            f'GROUP BY {positions} ORDER BY {positions}',
+            params,
+        )
+        cube['day'] = pd.to_datetime(cube['day']).astype('datetime64[us]').dt.tz_localize(self.tz)
+        for col in ('count', 'hr_count'):
+            if col in cube.columns:
+                cube[col] = cube[col].fillna(0).astype('int64')
+        return RollupCube(cube, self.tz)
+
+    def activity_summary(self, where=None):
+        """Same frame as ``aggregations.activity_summary`` for the activities matching ``where``."""
+        if not self._has('activity'):
+            return None
+        clause, params = self._where(where)
+        measures = ['COUNT(*) AS count']
+        measures += [
+            f'COALESCE(SUM({self._col(role)}), 0) AS {role}'
+            for role in ('distance', 'calories') if self._has(role)
+        ]
+        activity = self._col('activity')
+        summary = self.query(
+            f'SELECT {activity}, {", ".join(measures)} FROM {TABLE} '
+            f'WHERE {clause} AND {activity} IS NOT NULL GROUP BY 1 ORDER BY count DESC, 1',
+            params,
+        )
+        return summary.set_index(self.schema.activity)
+
+    def histogram(self, where, field, nbins=30):
+        """Same frame as ``aggregations.histogram_counts`` for the column playing role ``field``."""
+        if not self._has(field):
+            return None
+        clause, params = self._where(where)
+        col = self._col(field)
+        value = f'CAST({col} AS DOUBLE)'
+        clause = f'{clause} AND {value} BETWEEN ? AND ?'
+        params = tuple(params) + FINITE
+        bounds = self.query(f'SELECT MIN({value}) AS low, MAX({value}) AS high FROM {TABLE} WHERE {clause}', params)
+        low, high = bounds.iloc[0]
+        if pd.isna(low):
+            return pd.DataFrame({'start': [], 'end': [], 'count': []})
+        # The edges np.histogram picks; a value counts in the bin whose edges
+        # hold it, the last bin including its upper edge
+        edges = np.histogram_bin_edges([low, high], bins=nbins)
+        bins = [(i, float(edges[i]), float(edges[i + 1])) for i in range(nbins)]
+        counts = self.query(
+            f'WITH bins(bin, low, high) AS (VALUES {", ".join(["(?, ?, ?)"] * nbins)}) '
+            f'SELECT bin, COUNT(*) AS count FROM {TABLE} JOIN bins '
+            f'ON {value} >= bins.low AND ({value} < bins.high OR (bin = ? AND {value} <= bins.high)) '
+            f'WHERE {clause} GROUP BY bin',
+            sum(bins, ()) + (nbins - 1,) + params,
+        )
+        counts = np.bincount(
+            counts['bin'].to_numpy(dtype='int64'), weights=counts['count'].to_numpy(dtype='float64'), minlength=nbins,
+        )
+        return pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'count': counts.astype('int64')})
+
+    def max_hr(self, where=None):
+        """Same dict as ``aggregations.max_hr_stats``."""
+        if not self._has('max_hr'):
+            return None
+        clause, params = self._where(where)
+        col = self._col('max_hr')
+        stats = self.query(
+            f'SELECT MAX({col}) AS max, AVG({col}) AS mean FROM {TABLE} WHERE {clause}', params,
+        ).astype('float64')
+        return {'max': stats['max'].iloc[0], 'mean': stats['mean'].iloc[0]}
+
+    def insights(self, where=None):
+        """Same dict as ``aggregations.key_insights``: the first activity with the highest of each field."""
+        clause, params = self._where(where)
+        insights = {}
+        activity = self._col('activity') if self._has('activity') else 'NULL'
+        for key in ('distance', 'elevation', 'calories'):
+            if not self._has(key):
+                insights[key] = None
+                continue
+            col = self._col(key)
+            top = self.query(
+                f'SELECT {col} AS value, {activity} AS activity FROM {TABLE} '
+                f'WHERE {clause} AND {col} IS NOT NULL ORDER BY {col} DESC, {ROW_COLUMN} LIMIT 1',
+                params,
+            )
+            insights[key] = (top['value'].iloc[0], top['activity'].iloc[0]) if len(top) else None
+        return insights
+
+
+class SqlAggregates(Aggregates):
+    """
+    Aggregates queried from a SqlDataset for the activities its ``where``
+    mask keeps. ``df`` is the frame the copy was made from: the filtered
+    rows are only taken from it, by position, when a view needs them all.
+    """
+
+    def __init__(self, df, schema, dataset, where, records=None):
+        super().__init__(lambda: df.iloc[dataset.positions(where)], schema, records=records)
+        self.source = df
+        self.dataset = dataset
+        self.where = where
+
+    @cached_property
+    def _cube(self):
+        return self.dataset.rollup(self.where)
+
+    @cached_property
+    def summary(self):
+        return self.dataset.summary(self.where)
+
+    @cached_property
+    def weekday(self):
+        return self._cube.weekday() if self._cube is not None else None
+
+    @cached_property
+    def _period_rollup(self):
+        return self._cube
+
+    @cached_property
+    def activity_summary(self):
+        return self.dataset.activity_summary(self.where)
+
+    def histogram(self, field, nbins=30):
+        key = f'_histogram_{field}_{nbins}'
+        if key not in self.__dict__:
+            self.__dict__[key] = self.dataset.histogram(self.where, field, nbins)
+        return self.__dict__[key]
+
+    @cached_property
+    def max_hr(self):
+        return self.dataset.max_hr(self.where)
+
+    def chart_points(self, granularity, value_col, max_points=DEFAULT_MAX_POINTS):
+        if granularity != 'activity':
+            return super().chart_points(granularity, value_col, max_points)
+        key = f'_points_{granularity}_{value_col}_{max_points}'
+        if key not in self.__dict__:
+            date_col = self.schema.date
+            # Only the date and the plotted column are read
+            if value_col in (self.schema.distance, 'Cumulative Distance'):
+                frame = distance_timeline(self.select([date_col, self.schema.distance]), self.schema)
+            else:
+                frame = metric_timeline(self.select([date_col, value_col]), date_col, value_col)
+            if frame is not None and value_col in frame.columns:
+                frame = downsample(frame, date_col, value_col, max_points)
+            self.__dict__[key] = frame
+        return self.__dict__[key]
+
+    def select(self, columns):
+        key = ('_select', tuple(columns))
+        if key not in self.__dict__:
+            self.__dict__[key] = self.dataset.select(self.where, columns)
+        return self.__dict__[key]
+
+    def table_rows(self, sort_by=None, ascending=True, search_col=None, search=None):
+        key = ('_table', sort_by, ascending, search_col, search or None)
+        if key not in self.__dict__:
+            self.__dict__[key] = self.dataset.positions(self.where, sort_by, ascending, search_col, search)
+        return self.__dict__[key]
+
+    def take(self, positions):
+        return self.source.iloc[positions]
+
+    @cached_property
+    def training_load(self):
+        return training_load(self.select([self.schema.date, TRIMP_COL]), self.schema.date)
+
+    @cached_property
+    def insights(self):
+        return self.dataset.insights(self.where)
@@ -0,0 +1,194 @@
+"""
+Persistent store of processed activities for incremental imports.
+
+Every Strava export contains the athlete's whole history. The store keeps
+the processed frame from earlier imports on disk and, for a new export,
+reads only the key columns to find activities it has not seen, then parses
+and preprocesses just those rows and appends them.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.archive import open_csv
+from strava_dashboard.cache import content_hash, read_arrow, write_arrow
+from strava_dashboard.loader import (
+    classify_columns,
+    load_chunked,
+    load_data,
+    preprocess_data,
+    read_bytes,
+    read_header,
+)
+from strava_dashboard.metrics import add_derived_metrics
+from strava_dashboard.profiling import stage
+from strava_dashboard.records import RecordsIndex
+from strava_dashboard.schema import resolve_schema
+
+
+# Stands in for a missing key part, which would otherwise make the whole
+# key missing (and every such activity a duplicate of the first)
+MISSING_KEY_PART = '<NA>'
+
+
+def _key_part(values):
+    """``values`` as strings, missing ones as MISSING_KEY_PART."""
+    return values.astype(object).where(values.notna(), MISSING_KEY_PART).astype(str)
+
+
+def _id_keys(ids):
+    keys = _key_part(ids)
+    # Normalise "123", 123 and 123.0 to the same key, also when a missing ID
+    # has turned the stored column into floats
+    numeric = pd.to_numeric(ids, errors='coerce')
+    whole = (numeric.notna() & (numeric == numeric.round())).to_numpy()
+    keys[whole] = numeric[whole].astype('int64').astype(str).to_numpy()
+    return keys
+
+
+def activity_keys(df, schema, use_id=True):
+    """
+    One string key per activity, used to recognise already imported rows.
+
+    The Activity ID is used when present (and ``use_id`` is set); otherwise
+    the key combines date, activity type and distance. Works on both raw
+    (string) and processed columns.
+    """
+    if use_id and schema.activity_id and schema.activity_id in df.columns:
+        return _id_keys(df[schema.activity_id]).reset_index(drop=True)
+
+    parts = []
+    if schema.date and schema.date in df.columns:
+        parts.append(_key_part(pd.to_datetime(df[schema.date], errors='coerce')))
+    if schema.activity and schema.activity in df.columns:
+        parts.append(_key_part(df[schema.activity]))
+    if schema.distance and schema.distance in df.columns:
+        distance = df[schema.distance]
+        if not pd.api.types.is_numeric_dtype(distance):
+            distance = pd.to_numeric(distance.astype(str).str.replace(',', '', regex=False), errors='coerce')
+        parts.append(_key_part(distance.astype('float64').round(3)))
+    if not parts:
+        raise ValueError("Cannot identify activities: no ID, date, type or distance column found")
+
+    keys = parts[0]
+    for part in parts[1:]:
+        keys = keys + '|' + part
+    return keys.reset_index(drop=True)
+
+
+def _append(stored, new):
+    df = pd.concat([stored, new], ignore_index=True)
+    # concat falls back to plain strings when the category sets differ
+    for col, kind in classify_columns(df.columns).items():
+        if kind == 'category' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+class ActivityStore:
+    """Processed activity history persisted as a single Arrow file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_env(cls):
+        """Store at STRAVA_DASHBOARD_STORE, or None when it is not set."""
+        path = os.environ.get('STRAVA_DASHBOARD_STORE')
+        return cls(path) if path else None
+
+    def load(self):
+        """The stored frame, or None if nothing has been imported yet."""
+        if not os.path.exists(self.path):
+            return None
+        return read_arrow(self.path)
+
+    def save(self, df):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_arrow(df, self.path)
+
+    @property
+    def records_path(self):
+        return os.path.splitext(self.path)[0] + '.records.arrow'
+
+    def load_records(self, schema):
+        """The stored RecordsIndex of the history, or None if there is none yet."""
+        if not os.path.exists(self.records_path):
+            return None
+        return RecordsIndex(read_arrow(self.records_path), schema)
+
+    def save_records(self, records):
+        write_arrow(records.candidates, self.records_path)
+
+    def ingest(self, file, memory_budget=None, timer=None):
+        """
+        Merge an export into the store.
+
+        Returns ``(df, schema, added)`` where ``df`` is the full processed
+        history and ``added`` the number of activities new in this export.
+        The history's RecordsIndex is kept next to it (``load_records``) and
+        only updated with the new activities.
+        The first import is read with ``load_chunked`` under ``memory_budget``,
+        keeping the columns the schema resolver assigns a role; later imports
+        read the columns the history already has.
+        """
+        data = read_bytes(file)
+        with stage(timer, 'store_read'):
+            stored = self.load()
+
+        if stored is None:
+            df = load_chunked(open_csv(data), usecols='schema', memory_budget=memory_budget, timer=timer)
+            added = len(df)
+        else:
+            header = list(read_header(open_csv(data)))
+            schema = resolve_schema(header)
+            stored_schema = resolve_schema(stored.columns)
+            use_id = bool(schema.activity_id and stored_schema.activity_id)
+
+            # Read just the columns that make up the key, as strings
+            key_cols = [schema.activity_id] if use_id else [schema.date, schema.activity, schema.distance]
+            positions = sorted(header.index(col) for col in key_cols if col is not None)
+            with stage(timer, 'read_keys'):
+                raw = pd.read_csv(open_csv(data), usecols=positions, dtype=str)
+            raw.columns = [header[i] for i in positions]
+
+            with stage(timer, 'match_keys'):
+                keys = activity_keys(raw, schema, use_id)
+                known = activity_keys(stored, stored_schema, use_id)
+                is_new = ~keys.isin(known) & ~keys.duplicated()
+                rows = np.flatnonzero(is_new.to_numpy())
+            added = len(rows)
+
+            if added:
+                with stage(timer, 'read_csv'):
+                    usecols = [i for i, col in enumerate(header) if col in stored.columns]
+                    new = load_data(open_csv(data), rows=rows, usecols=usecols)
+                with stage(timer, 'preprocess_data'):
+                    new = preprocess_data(new)
+                df = _append(stored, new)
+                df.attrs['unparsed_durations'] = new.attrs['unparsed_durations']
+            else:
+                df = stored
+
+        # Recomputed over the whole history, as TRIMP depends on its peak HR
+        schema = resolve_schema(df.columns)
+        with stage(timer, 'derived_metrics'):
+            df = add_derived_metrics(df, schema)
+
+        # Records of the new activities are merged into the stored ones
+        with stage(timer, 'records'):
+            records = self.load_records(schema) if stored is not None else None
+            if records is None:
+                records = RecordsIndex.build(df, schema)
+            elif added:
+                records = records.update(df.iloc[len(stored):])
+        if added or not os.path.exists(self.records_path):
+            with stage(timer, 'store_write'):
+                self.save(df)
+                self.save_records(records)
+        df.attrs['content_hash'] = content_hash(data)
+        return df, schema, added
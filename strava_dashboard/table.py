@@ -0,0 +1,58 @@
+"""
+Server-side paging, sorting and search for the Data Table tab.
+
+Only one page of rows is sent to the browser. Sorting and searching work
+on row positions of the filtered frame, so the frame itself is never
+copied; ``Aggregates.table_rows`` memoises the positions per filter state.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def searchable_columns(df):
+    """Text and categorical columns, which the table can search in."""
+    return [
+        col for col in df.columns
+        if isinstance(df[col].dtype, pd.CategoricalDtype)
+        or df[col].dtype == 'object'
+        or pd.api.types.is_string_dtype(df[col])
+    ]
+
+
+def search_mask(series, text):
+    """Boolean array of the values containing ``text``, ignoring case."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Match the few categories rather than every row
+        hits = series.cat.categories.astype(str).str.contains(text, case=False, regex=False)
+        return np.isin(series.cat.codes.to_numpy(), np.flatnonzero(hits))
+    return series.astype(str).str.contains(text, case=False, regex=False).to_numpy(dtype=bool)
+
+
+def sort_order(series, ascending=True):
+    """Row positions that sort ``series``, stable and with missing values last."""
+    values = series.reset_index(drop=True)
+    return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def table_rows(df, sort_by=None, ascending=True, search_col=None, search=None):
+    """
+    Positions of the rows of ``df`` to show, in display order: sorted by
+    ``sort_by`` (frame order when None) and restricted to rows whose
+    ``search_col`` contains ``search``.
+    """
+    positions = sort_order(df[sort_by], ascending) if sort_by else np.arange(len(df))
+    if search and search_col:
+        mask = search_mask(df[search_col], search)
+        positions = positions[mask[positions]]
+    return positions
+
+
+def page_bounds(total, page, page_size=DEFAULT_PAGE_SIZE):
+    """``(start, stop, pages)`` of 1-based ``page``, clamped to the last page."""
+    pages = max(1, -(-total // page_size))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total), pages
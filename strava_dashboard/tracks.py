@@ -0,0 +1,243 @@
+"""
+GPS tracks of single activities.
+
+``parse_track`` turns an activity file from the export (GPX, TCX, or FIT
+through the decoder in ``strava_dashboard.fit``) into a Track of NumPy
+arrays. ``simplify`` keeps the points Douglas-Peucker needs to stay within
+a tolerance in metres, which is what maps draw, and ``route_lines`` joins
+many tracks into the two arrays a single map trace takes, and
+``summarize`` measures a track's distance, moving time, elevation gain
+and start.
+"""
+
+import struct
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.fit import decode_records
+
+# Unix seconds, latitude and longitude in degrees, elevation in metres,
+# distance covered in metres (as recorded, or measured along the positions
+# when the file has none), heart rate in bpm and power in watts, as float64
+# arrays (NaN where a point lacks the value). Points without a position are
+# left out.
+Track = namedtuple('Track', 'time lat lon elevation distance heart_rate power')
+
+# Douglas-Peucker tolerance of the simplified tracks, in metres
+SIMPLIFY_TOLERANCE = 5.0
+
+EARTH_RADIUS = 6_371_000.0
+
+# Most points ``route_lines`` should return for one map of many routes
+ROUTE_POINT_BUDGET = 200_000
+
+# Stretches slower than this (m/s) do not count towards moving time
+MOVING_SPEED = 0.5
+
+# Points in the moving average elevations are smoothed with before
+# summing climbs, so GPS and barometer noise does not add up
+ELEVATION_SMOOTHING = 5
+
+SUMMARY_FIELDS = ('distance', 'moving_time', 'elevation_gain', 'start_lat', 'start_lon')
+
+
+def empty_track():
+    return Track(*(np.empty(0) for _ in Track._fields))
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _epoch_seconds(texts):
+    """ISO 8601 timestamps as float Unix seconds, NaN where missing or unreadable."""
+    times = pd.to_datetime(pd.Series(texts, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    seconds = times.to_numpy(dtype='datetime64[ns]').view('int64') / 1e9
+    return np.where(times.isna().to_numpy(), np.nan, seconds)
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _make_track(time, lat, lon, elevation, distance=None, heart_rate=None, power=None):
+    track = Track(*(
+        np.full(len(lat), np.nan) if values is None else np.asarray(values, dtype='float64')
+        for values in (time, lat, lon, elevation, distance, heart_rate, power)
+    ))
+    located = np.isfinite(track.lat) & np.isfinite(track.lon)
+    if not located.all():
+        track = Track(*(values[located] for values in track))
+    if len(track.lat) and not np.isfinite(track.distance).any():
+        steps = haversine(track.lat[:-1], track.lon[:-1], track.lat[1:], track.lon[1:])
+        track = track._replace(distance=np.r_[0, np.cumsum(steps)])
+    return track
+
+
+def _extension(extensions, name):
+    """A value from a point's extensions element, whichever namespace it uses."""
+    return np.nan if extensions is None else _float(extensions.findtext(f'.//{{*}}{name}'))
+
+
+def parse_gpx(data):
+    """
+    Track of a GPX file's track points (all tracks and segments in order),
+    with heart rate and power from the Garmin or plain extensions.
+    """
+    # Strava writes some files with whitespace before the XML declaration
+    root = ET.fromstring(data.lstrip())
+    namespace = root.tag[:-len(_local_name(root.tag))]
+    lat, lon, elevation, times, heart_rate, power = [], [], [], [], [], []
+    for point in root.iter(namespace + 'trkpt'):
+        lat.append(_float(point.get('lat')))
+        lon.append(_float(point.get('lon')))
+        elevation.append(_float(point.findtext(namespace + 'ele')))
+        times.append(point.findtext(namespace + 'time'))
+        extensions = point.find(namespace + 'extensions')
+        heart_rate.append(_extension(extensions, 'hr'))
+        power.append(_extension(extensions, 'power'))
+    return _make_track(_epoch_seconds(times), lat, lon, elevation, heart_rate=heart_rate, power=power)
+
+
+def parse_tcx(data):
+    """Track of a TCX file's trackpoints (all laps in order), with sensor data."""
+    root = ET.fromstring(data.lstrip())
+    namespace = root.tag[:-len(_local_name(root.tag))]
+    lat, lon, elevation, times, distance, heart_rate, power = [], [], [], [], [], [], []
+    for point in root.iter(namespace + 'Trackpoint'):
+        position = point.find(namespace + 'Position')
+        lat.append(_float(position.findtext(namespace + 'LatitudeDegrees')) if position is not None else np.nan)
+        lon.append(_float(position.findtext(namespace + 'LongitudeDegrees')) if position is not None else np.nan)
+        elevation.append(_float(point.findtext(namespace + 'AltitudeMeters')))
+        times.append(point.findtext(namespace + 'Time'))
+        distance.append(_float(point.findtext(namespace + 'DistanceMeters')))
+        heart_rate.append(_float(point.findtext(f'{namespace}HeartRateBpm/{namespace}Value')))
+        power.append(_extension(point.find(namespace + 'Extensions'), 'Watts'))
+    return _make_track(_epoch_seconds(times), lat, lon, elevation, distance, heart_rate, power)
+
+
+def parse_fit(data):
+    """Track of a FIT file's record messages."""
+    records = decode_records(data)
+    return _make_track(*(records[field] for field in Track._fields))
+
+
+PARSERS = {'gpx': parse_gpx, 'tcx': parse_tcx, 'fit': parse_fit}
+
+
+def parse_track(data, file_format):
+    """
+    Track of an activity file's bytes in ``file_format`` ('gpx', 'tcx' or
+    'fit'). Raises ValueError for other formats or files that cannot be read.
+    """
+    if file_format not in PARSERS:
+        raise ValueError(f"Unsupported track format: {file_format}")
+    try:
+        return PARSERS[file_format](data)
+    except (ET.ParseError, struct.error, IndexError) as e:
+        raise ValueError(f"Unreadable {file_format.upper()} file: {e}") from e
+
+
+def project(lat, lon):
+    """
+    Equirectangular x/y in metres around the track's mean latitude, close
+    enough to true distances over the extent of one activity.
+    """
+    scale = np.pi / 180 * EARTH_RADIUS
+    origin = np.cos(np.radians(np.nanmean(lat))) if len(lat) else 1.0
+    return lon * scale * origin, lat * scale
+
+
+def simplify(lat, lon, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    Positions of the points Douglas-Peucker keeps so that no point is
+    further than ``tolerance`` metres from the simplified line. The first
+    and last points are always kept.
+    """
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    x, y = project(np.asarray(lat, dtype='float64'), np.asarray(lon, dtype='float64'))
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, n - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = np.hypot(dx, dy)
+        # Distance to the chord, or to its start when the ends coincide
+        distance = np.abs(dx * py - dy * px) / length if length > 0 else np.hypot(px, py)
+        furthest = int(np.argmax(distance))
+        if distance[furthest] > tolerance:
+            split = first + 1 + furthest
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def simplified(track, tolerance=SIMPLIFY_TOLERANCE):
+    """``track`` reduced to the points ``simplify`` keeps."""
+    kept = simplify(track.lat, track.lon, tolerance)
+    return Track(*(values[kept] for values in track))
+
+
+def route_lines(tracks, max_points=None):
+    """
+    Latitudes and longitudes of ``tracks`` joined into two arrays with a
+    NaN between routes, so any number of them is one map trace. With
+    ``max_points``, every route is thinned by the same stride to fit.
+    """
+    tracks = [track for track in tracks if track is not None and len(track.lat)]
+    if not tracks:
+        return np.empty(0), np.empty(0)
+    total = sum(len(track.lat) for track in tracks)
+    step = max(1, int(np.ceil(total / max_points))) if max_points else 1
+    lat, lon = [], []
+    for track in tracks:
+        # Thinned, but still ending where the route ends
+        positions = np.unique(np.r_[np.arange(0, len(track.lat), step), len(track.lat) - 1])
+        lat += [track.lat[positions], [np.nan]]
+        lon += [track.lon[positions], [np.nan]]
+    return np.concatenate(lat[:-1]), np.concatenate(lon[:-1])
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between points given in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def summarize(track):
+    """
+    The SUMMARY_FIELDS of a track: 'distance' in km, 'moving_time' in
+    seconds (time spent above MOVING_SPEED), 'elevation_gain' in metres
+    (climbs of the smoothed elevation) and the start position. NaN for
+    whatever the track has no data for.
+    """
+    if not len(track.lat):
+        return dict.fromkeys(SUMMARY_FIELDS, np.nan)
+    steps = haversine(track.lat[:-1], track.lon[:-1], track.lat[1:], track.lon[1:])
+    seconds = np.diff(track.time)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        moving = (seconds > 0) & (steps / seconds >= MOVING_SPEED)
+    elevation = track.elevation[np.isfinite(track.elevation)]
+    if len(elevation) > ELEVATION_SMOOTHING:
+        elevation = np.convolve(elevation, np.full(ELEVATION_SMOOTHING, 1 / ELEVATION_SMOOTHING), mode='valid')
+    return {
+        'distance': steps.sum() / 1000,
+        'moving_time': seconds[moving].sum() if np.isfinite(track.time).any() else np.nan,
+        'elevation_gain': np.clip(np.diff(elevation), 0, None).sum() if len(elevation) > 1 else np.nan,
+        'start_lat': track.lat[0],
+        'start_lon': track.lon[0],
+    }
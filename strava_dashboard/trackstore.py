@@ -0,0 +1,432 @@
+"""
+On-disk store of parsed tracks, memory-mapped for reading.
+
+Every track is kept twice, in full and simplified (``tracks.simplified``),
+as a run of POINT_DTYPE records appended to one of two flat files, along
+with its heatmap cells at each zoom level (``heatmap.rasterize``) in one
+file per level, and an Arrow index maps the track's key to where its runs
+start. Readers memory-map the files, so a track costs nothing until its
+pages are touched, drawing thousands of routes only reads the small
+simplified file and a heatmap only the cells of one level. The index
+also holds each track's ``tracks.summarize`` figures, which
+``add_track_summaries`` writes back to the activities table, and its best
+efforts (``efforts.best_efforts``), read with ``activity_efforts``.
+Parsing happens once per activity file, in worker processes (see
+``strava_dashboard.parallel``): later uploads of the same export find
+their tracks already stored.
+"""
+
+import contextlib
+import os
+import posixpath
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from strava_dashboard.cache import DEFAULT_MAX_BYTES, cache_dir_from_env, pa, read_arrow, write_arrow
+from strava_dashboard.efforts import EFFORT_FIELDS, best_efforts
+from strava_dashboard.heatmap import CELL_DTYPE, HEATMAP_ZOOMS, rasterize
+from strava_dashboard.metrics import add_derived_metrics
+from strava_dashboard.parallel import parse_files
+from strava_dashboard.schema import resolve_schema
+from strava_dashboard.tracks import SIMPLIFY_TOLERANCE, SUMMARY_FIELDS, Track, empty_track, simplified, summarize
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Bump whenever parsing or the file layout changes so stale tracks are not reused.
+TRACKS_VERSION = 6
+
+# Over budget, least recently used tracks are dropped until the files fill
+# this share of it, so they are not rewritten again on the very next append
+EVICT_TO = 0.75
+
+POINT_DTYPE = np.dtype([
+    ('time', '<f8'), ('lat', '<f8'), ('lon', '<f8'), ('elevation', '<f4'),
+    ('distance', '<f8'), ('heart_rate', '<f4'), ('power', '<f4'),
+])
+
+# The file every track has a run in ({name}.bin), with its record type
+RUNS = {
+    'full': POINT_DTYPE,
+    'simplified': POINT_DTYPE,
+    **{f'cells_z{zoom}': CELL_DTYPE for zoom in HEATMAP_ZOOMS},
+}
+INDEX_COLUMNS = [
+    'key', *(f'{run}_{part}' for run in RUNS for part in ('start', 'count')), *SUMMARY_FIELDS, *EFFORT_FIELDS,
+    'used',
+]
+
+# Columns ``add_track_summaries`` adds, by summary field
+GPS_COLUMNS = {
+    'distance': 'GPS Distance (km)',
+    'moving_time': 'GPS Moving Time',
+    'elevation_gain': 'GPS Elevation Gain (m)',
+    'start_lat': 'Start Latitude',
+    'start_lon': 'Start Longitude',
+}
+
+
+def track_key(track_file):
+    """Store key of an archive TrackFile: its file name and CRC."""
+    return f'{posixpath.basename(track_file.path)}-{track_file.crc:08x}'
+
+
+def _points(track):
+    points = np.empty(len(track.lat), dtype=POINT_DTYPE)
+    for field in Track._fields:
+        points[field] = getattr(track, field)
+    return points
+
+
+class TrackStore:
+    """
+    Append-only track files in ``directory`` shared by every session, and
+    by other processes on platforms with ``fcntl`` locks. The index records
+    when each track was last stored or used; when the files outgrow
+    ``max_bytes`` the least recently used tracks are dropped before the
+    next append, as ``ActivityCache`` evicts whole files.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, tolerance=SIMPLIFY_TOLERANCE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        # Guards the index and maps; writers also serialise on _write_lock
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._index = {}
+        self._index_mtime = None
+        self._maps = {}
+
+    @classmethod
+    def from_env(cls):
+        """
+        A store under STRAVA_DASHBOARD_CACHE_DIR sized by
+        STRAVA_DASHBOARD_CACHE_MB; None if pyarrow is missing. With the
+        cache disabled (size 0) tracks go to a temporary directory removed
+        when the process exits.
+        """
+        if pa is None:
+            return None
+        directory, max_bytes = cache_dir_from_env(temporary=True)
+        return cls(os.path.join(directory, f'tracks-v{TRACKS_VERSION}'), max_bytes)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        """
+        The index as ``{key: (start and count of each run, *summary,
+        *efforts, last used)}``, re-read if it changed.
+        """
+        try:
+            mtime = os.stat(self._path('index.arrow')).st_mtime_ns
+        except OSError:
+            self._index, self._index_mtime = {}, None
+            return self._index
+        if mtime != self._index_mtime:
+            index = read_arrow(self._path('index.arrow'))
+            self._index = {key: tuple(entry) for key, *entry in index[INDEX_COLUMNS].itertuples(index=False)}
+            self._index_mtime = mtime
+        return self._index
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._load_index()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load_index())
+
+    def _mapped(self, name, needed):
+        """Memory map of ``name``.bin holding at least ``needed`` records."""
+        path = self._path(f'{name}.bin')
+        stat = os.stat(path)
+        mapped = self._maps.get(name)
+        # Eviction replaces the files, so maps are tied to the inode
+        if mapped is None or mapped[1] != stat.st_ino or len(mapped[0]) < needed:
+            dtype = RUNS[name]
+            records = np.memmap(path, dtype=dtype, mode='r') if stat.st_size else np.empty(0, dtype)
+            mapped = self._maps[name] = (records, stat.st_ino)
+        return mapped[0]
+
+    @staticmethod
+    def _run(entry, name):
+        """``(start, count)`` of the run in ``name`` of an index entry."""
+        position = 2 * list(RUNS).index(name)
+        return entry[position:position + 2]
+
+    def get(self, key, simplified=False):
+        """The stored Track of ``key`` (simplified or in full), or None."""
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is None:
+                return None
+            name = 'simplified' if simplified else 'full'
+            start, count = self._run(entry, name)
+            if not count:
+                return empty_track()
+            points = self._mapped(name, start + count)[start:start + count]
+        return Track(*(points[field] for field in Track._fields))
+
+    def cells(self, keys, zoom):
+        """
+        Heatmap cells at ``zoom`` (one of HEATMAP_ZOOMS) of the stored
+        tracks of ``keys``, concatenated; keys not stored are skipped.
+        """
+        name = f'cells_z{zoom}'
+        with self._lock:
+            index = self._load_index()
+            runs = np.array([self._run(index[key], name) for key in keys if key in index], dtype='int64')
+            runs = runs.reshape(-1, 2)
+            starts, counts = runs[:, 0], runs[:, 1]
+            total = int(counts.sum())
+            if not total:
+                return np.empty(0, CELL_DTYPE)
+            cells = self._mapped(name, int((starts + counts).max()))
+            # Position of every wanted record: each run's start plus 0, 1, ...
+            positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            return np.asarray(cells[positions])
+
+    def missing(self, keys):
+        """The keys of ``keys`` with no stored track."""
+        with self._lock:
+            index = self._load_index()
+            return [key for key in keys if key not in index]
+
+    def missing_files(self, archive):
+        """The TrackFiles of ``archive`` with no stored track."""
+        files = {track_key(file): file for file in archive.tracks.values()}
+        return [files[key] for key in self.missing(files)]
+
+    def _fields(self, keys, fields, first):
+        """Index values ``first`` onwards as ``fields`` columns, one row per key (NaN if not stored)."""
+        missing = (np.nan,) * len(fields)
+        with self._lock:
+            index = self._load_index()
+            rows = [index[key][first:first + len(fields)] if key in index else missing for key in keys]
+        return pd.DataFrame(rows, index=pd.Index(keys, name='key'), columns=list(fields), dtype='float64')
+
+    def summaries(self, keys):
+        """SUMMARY_FIELDS of the stored tracks of ``keys``, one row per key (NaN if not stored)."""
+        return self._fields(keys, SUMMARY_FIELDS, 2 * len(RUNS))
+
+    def efforts(self, keys):
+        """EFFORT_FIELDS of the stored tracks of ``keys``, one row per key (NaN if not stored)."""
+        return self._fields(keys, EFFORT_FIELDS, 2 * len(RUNS) + len(SUMMARY_FIELDS))
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock against writers in other processes, held until the block ends."""
+        with open(self._path('lock'), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _size(self):
+        paths = [self._path(f'{run}.bin') for run in RUNS]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def _entry_size(self, entry):
+        return sum(self._run(entry, name)[1] * dtype.itemsize for name, dtype in RUNS.items())
+
+    def _write_index(self, index):
+        write_arrow(pd.DataFrame([(key, *entry) for key, entry in index.items()], columns=INDEX_COLUMNS),
+                    self._path('index.arrow'))
+
+    def _evict(self, index, used):
+        """
+        ``index`` without its least recently used tracks, down to EVICT_TO
+        of the budget, with the files rewritten to hold only the rest.
+        Tracks in ``used`` are kept whatever their size.
+        """
+        kept, total = [], 0
+        for key in sorted(index, key=lambda key: (key in used, index[key][-1]), reverse=True):
+            size = self._entry_size(index[key])
+            if key not in used and total + size > EVICT_TO * self.max_bytes:
+                break
+            kept.append(key)
+            total += size
+        runs = {key: [] for key in kept}
+        for name, dtype in RUNS.items():
+            ends = [sum(self._run(entry, name)) for entry in index.values()]
+            with self._lock:
+                records = self._mapped(name, max(ends, default=0))
+            position = 0
+            with open(self._path(f'{name}.bin.tmp'), 'wb') as out:
+                for key in kept:
+                    start, count = self._run(index[key], name)
+                    out.write(records[start:start + count].tobytes())
+                    runs[key] += [position, count]
+                    position += count
+        index = {key: (*runs[key], *index[key][2 * len(RUNS):]) for key in kept}
+        # Readers in this process see the new files and index together
+        with self._lock:
+            for name in RUNS:
+                os.replace(self._path(f'{name}.bin.tmp'), self._path(f'{name}.bin'))
+            self._write_index(index)
+            self._maps = {}
+            self._load_index()
+        return index
+
+    def put_many(self, items, used=()):
+        """
+        Store ``(key, track, simplified track, summary, cells, efforts)``
+        tuples, skipping keys already stored; all but the first two are
+        computed when None. ``items``
+        may be a generator; tracks are written as they arrive and become
+        readable once the index is written at the end. The stored keys of
+        ``used`` are marked as used now, like the new ones.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        used = set(used)
+        with self._write_lock, self._file_lock():
+            with self._lock:
+                index = dict(self._load_index())
+            if self._size() > self.max_bytes:
+                index = self._evict(index, used)
+            for key in used & index.keys():
+                index[key] = (*index[key][:-1], now)
+            ends = {
+                name: max((sum(self._run(entry, name)) for entry in index.values()), default=0) for name in RUNS
+            }
+            files = {}
+            try:
+                for name, dtype in RUNS.items():
+                    path = self._path(f'{name}.bin')
+                    handle = files[name] = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+                    # Drop anything written after the index was last saved
+                    handle.truncate(ends[name] * dtype.itemsize)
+                    handle.seek(0, os.SEEK_END)
+                for key, track, simple, summary, cells, efforts in items:
+                    if key in index:
+                        continue
+                    simple = simplified(track, self.tolerance) if simple is None else simple
+                    summary = summarize(track) if summary is None else summary
+                    cells = rasterize(track) if cells is None else cells
+                    efforts = best_efforts(track) if efforts is None else efforts
+                    records = {
+                        'full': _points(track),
+                        'simplified': _points(simple),
+                        **{f'cells_z{zoom}': cells[zoom].astype(CELL_DTYPE) for zoom in HEATMAP_ZOOMS},
+                    }
+                    runs = []
+                    for name, values in records.items():
+                        files[name].write(values.tobytes())
+                        runs += [ends[name], len(values)]
+                        ends[name] += len(values)
+                    index[key] = (
+                        *runs, *(summary[field] for field in SUMMARY_FIELDS), *(efforts[field] for field in EFFORT_FIELDS),
+                        now,
+                    )
+            finally:
+                for handle in files.values():
+                    handle.close()
+            self._write_index(index)
+            with self._lock:
+                self._load_index()
+
+    def touch(self, keys):
+        """Mark the stored tracks of ``keys`` as used now, so they are evicted last."""
+        if not os.path.isdir(self.directory):
+            return
+        keys = set(keys)
+        with self._write_lock, self._file_lock():
+            with self._lock:
+                index = dict(self._load_index())
+            now = time.time()
+            if not keys & index.keys():
+                return
+            for key in keys & index.keys():
+                index[key] = (*index[key][:-1], now)
+            self._write_index(index)
+            with self._lock:
+                self._load_index()
+
+    def process(self, archive, files=None, workers=None, progress=None):
+        """
+        Parse and store the TrackFiles ``files`` of ``archive`` (by default
+        all its files not stored yet) with ``parallel.parse_files``. Returns
+        how many were processed; ``workers`` and ``progress`` are passed on.
+        """
+        files = self.missing_files(archive) if files is None else files
+        if files:
+            results = parse_files(archive, files, workers, self.tolerance, progress=progress)
+            # The rest of the archive's tracks are in use too
+            used = [track_key(file) for file in archive.tracks.values()]
+            self.put_many(((track_key(file), *result) for file, *result in results), used)
+        return len(files)
+
+    def load(self, archive, filenames, simplified=True, workers=None):
+        """
+        Tracks of the activity files named by ``filenames`` (values of the
+        Filename column), processing the ones not stored yet. None for
+        files missing from ``archive``; files that cannot be parsed are
+        stored as empty tracks so they are not tried again.
+        """
+        files = [archive.track(filename) for filename in filenames]
+        keys = [track_key(file) if file is not None else None for file in files]
+        wanted = {key: file for key, file in zip(keys, files) if key is not None}
+        self.process(archive, [wanted[key] for key in self.missing(wanted)], workers)
+        return [self.get(key, simplified) if key is not None else None for key in keys]
+
+
+def _row_values(df, schema, archive, values):
+    """
+    ``values(keys)`` (a frame with one row per key) spread over the rows of
+    ``df`` by their activity file, as an array; all NaN for rows without one.
+    """
+    codes, filenames = pd.factorize(df[schema.filename])
+    files = [archive.track(filename) for filename in filenames]
+    table = values([track_key(file) if file is not None else None for file in files]).to_numpy()
+    # Rows without a filename (code -1) take the all-NaN row appended last
+    return np.vstack([table, np.full((1, table.shape[1]), np.nan)])[codes]
+
+
+def activity_efforts(df, schema, archive, store):
+    """
+    The best efforts (EFFORT_FIELDS) of each activity of ``df`` whose file
+    in ``archive`` the store has processed, indexed like ``df``; None
+    without a filename column.
+    """
+    if not schema.filename or schema.filename not in df.columns:
+        return None
+    return pd.DataFrame(_row_values(df, schema, archive, store.efforts), index=df.index, columns=list(EFFORT_FIELDS))
+
+
+def add_track_summaries(df, schema, archive, store):
+    """
+    Copy of ``df`` with the GPS_COLUMNS of every activity whose file in
+    ``archive`` the store has processed (missing for the others). Distances,
+    moving times and elevation gains the CSV lacks are filled in from the
+    GPS figures and the derived metrics recomputed, and where the CSV has
+    no such column at all the schema resolves the GPS one instead.
+    """
+    if not schema.filename or schema.filename not in df.columns:
+        return df
+    table = _row_values(df, schema, archive, store.summaries)
+    # Reading an export's tracks counts as using them
+    store.touch(track_key(file) for file in archive.tracks.values())
+
+    gps = {}
+    for i, field in enumerate(SUMMARY_FIELDS):
+        values = table[:, i]
+        if field == 'moving_time':
+            gps[GPS_COLUMNS[field]] = pd.array(np.round(values), dtype='Float64').astype('Int32')
+        elif field in ('start_lat', 'start_lon'):
+            gps[GPS_COLUMNS[field]] = values
+        else:
+            gps[GPS_COLUMNS[field]] = values.astype('float32')
+    df = df.assign(**gps)
+
+    for role, field in (('distance', 'distance'), ('moving_time', 'moving_time'), ('elevation', 'elevation_gain')):
+        col = getattr(schema, role)
+        if col and col in df.columns and df[col].isna().any():
+            df[col] = df[col].fillna(df[GPS_COLUMNS[field]]).astype(df[col].dtype)
+    return add_derived_metrics(df, resolve_schema(df.columns))
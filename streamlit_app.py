@@ -1,10 +1,8 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-from datetime import datetime, timedelta
+
+import strava_dashboard as core
+from strava_dashboard import charts
 
 # Page configuration
 st.set_page_config(
@@ -39,91 +37,107 @@ st.markdown("Analyze your fitness data with interactive charts and insights")
 # Sidebar for file upload
 st.sidebar.header("📁 Upload Your Data")
 uploaded_file = st.sidebar.file_uploader(
-    "Upload your Strava activities CSV file",
-    type=['csv'],
+    "Upload your Strava activities CSV file or export ZIP",
+    type=['csv', 'zip'],
 )
 
 if uploaded_file is not None:
-    # Load data
-    df = pd.read_csv(uploaded_file)
-    
-    # Data preprocessing
+    # Load and preprocess data
+    @st.cache_resource
+    def get_activity_cache():
+        return core.ActivityCache.from_env()
+
     @st.cache_data
-    def preprocess_data(df):
-        df_processed = df.copy()
-        
-        # Convert date columns
-        date_cols = [col for col in df_processed.columns if 'date' in col.lower()]
-        for col in date_cols:
-            try:
-                df_processed[col] = pd.to_datetime(df_processed[col])
-            except:
-                pass
-        
-        # Convert numeric columns
-        numeric_cols = [col for col in df_processed.columns if any(x in col.lower() for x in ['distance', 'elevation', 'calories', 'heart rate', 'hr'])]
-        for col in numeric_cols:
-            if df_processed[col].dtype == 'object':
-                df_processed[col] = pd.to_numeric(df_processed[col].str.replace(',', ''), errors='coerce')
-        
-        return df_processed
-    
-    df = preprocess_data(df)
+    def load_dataset(file):
+        return core.load_dataset(file, cache=get_activity_cache(), memory_budget=core.memory_budget_from_env())
+
+    @st.cache_data
+    def ingest_dataset(file):
+        return core.ActivityStore.from_env().ingest(file, memory_budget=core.memory_budget_from_env())
+
+    try:
+        if core.ActivityStore.from_env() is not None:
+            df, schema, added = ingest_dataset(uploaded_file)
+            st.sidebar.caption(f"{added} new activities imported ({len(df)} in history)")
+        else:
+            df, schema = load_dataset(uploaded_file)
+    except MemoryError as e:
+        st.error(f"❌ {e}")
+        st.stop()
     
     # Get column names
-    date_col = next((col for col in df.columns if 'date' in col.lower()), None)
-    distance_col = next((col for col in df.columns if 'distance' in col.lower()), None)
-    activity_col = next((col for col in df.columns if 'type' in col.lower()), None)
-    elevation_col = next((col for col in df.columns if 'elevation' in col.lower()), None)
-    calorie_col = next((col for col in df.columns if 'calories' in col.lower()), None)
-    hr_col = next((col for col in df.columns if 'avg' in col.lower() and 'heart' in col.lower()), None)
-    gear_col = next((col for col in df.columns if 'gear' in col.lower()), None)
-    
-    # Add day of week
-    if date_col:
-        df['Day of Week'] = df[date_col].dt.day_name()
+    date_col = schema.date
+    distance_col = schema.distance
+    activity_col = schema.activity
+    elevation_col = schema.elevation
+    calorie_col = schema.calories
+    hr_col = schema.avg_hr
+    gear_col = schema.gear
+    
+    # Date-sorted, indexed copy of the data, built once per upload
+    @st.cache_resource(max_entries=8)
+    def build_filter_index(_df, _schema, dataset_key):
+        return core.FilterIndex(_df, _schema)
+    
+    # Per day/type/gear totals, also built once per upload
+    @st.cache_resource(max_entries=8)
+    def build_rollup(_df, _schema, dataset_key):
+        return core.RollupCube.build(_df, _schema)
+    
+    dataset_key = df.attrs['content_hash']
+    filter_index = build_filter_index(df, schema, dataset_key)
+    df = filter_index.df
+    rollup = build_rollup(df, schema, dataset_key)
     
     # Filters
     st.sidebar.header("🔍 Filters")
     
-    df_filtered = df.copy()
+    # Widget values making up the filter state, for caching aggregations
+    filter_state = []
+    selected_activities = selected_gear = date_range = None
     
-    if activity_col:
+    activity_mask = None
+    if activity_col and activity_col in df.columns:
+        activity_options = filter_index.activity_options()
         selected_activities = st.sidebar.multiselect(
             "Activity Type",
-            options=df[activity_col].unique(),
-            default=df[activity_col].unique()
+            options=activity_options,
+            default=activity_options
         )
-        df_filtered = df_filtered[df_filtered[activity_col].isin(selected_activities)]
+        activity_mask = filter_index.activity_mask(selected_activities)
+        filter_state.append(('activity', tuple(selected_activities)))
     
-    if gear_col:
-        gear_options = [x for x in df_filtered[gear_col].unique() if pd.notna(x)]
+    # Gear filter
+    gear_mask = None
+    if gear_col and gear_col in df.columns:
+        gear_options = filter_index.gear_options(activity_mask)
         if gear_options:
             selected_gear = st.sidebar.multiselect(
                 "Gear",
                 options=gear_options,
                 default=gear_options
             )
-            df_filtered = df_filtered[df_filtered[gear_col].isin(selected_gear)]
+            gear_mask = filter_index.gear_mask(selected_gear)
+            filter_state.append(('gear', tuple(selected_gear)))
+    
+    mask = filter_index.combine(activity_mask, gear_mask)
     
-    if date_col:
-        min_date = df_filtered[date_col].min()
-        max_date = df_filtered[date_col].max()
+    # Date range filter
+    min_date, max_date = filter_index.date_bounds(mask)
+    if min_date is not None:
         date_range = st.sidebar.date_input(
             "Date Range",
             value=(min_date, max_date),
             min_value=min_date,
             max_value=max_date
         )
-        if len(date_range) == 2:
-            df_filtered = df_filtered[
-                (df_filtered[date_col].dt.date >= date_range[0]) &
-                (df_filtered[date_col].dt.date <= date_range[1])
-            ]
-    
-    if distance_col:
-        min_dist = float(df_filtered[distance_col].min())
-        max_dist = float(df_filtered[distance_col].max())
+        
+        mask = filter_index.combine(mask, filter_index.date_mask(date_range))
+        filter_state.append(('date', tuple(date_range)))
+    
+    # Distance range filter
+    min_dist, max_dist = filter_index.distance_bounds(mask)
+    if min_dist is not None:
         dist_range = st.sidebar.slider(
             "Distance Range (km)",
             min_value=min_dist,
@@ -131,90 +145,127 @@ if uploaded_file is not None:
             value=(min_dist, max_dist),
             step=0.1
         )
-        df_filtered = df_filtered[
-            (df_filtered[distance_col] >= dist_range[0]) &
-            (df_filtered[distance_col] <= dist_range[1])
-        ]
+        
+        mask = filter_index.combine(mask, filter_index.distance_mask(dist_range))
+        filter_state.append(('distance', tuple(dist_range)))
+    
+    # All filters are applied to the data in one go, and aggregations are
+    # memoised per (dataset, filter state) so revisiting a state is free
+    @st.cache_resource
+    def get_aggregate_cache():
+        return core.AggregateCache(maxsize=32)
+    
+    # Totals come from the rollup cube unless the distance filter removes
+    # activities, which only the raw rows can tell
+    rollup_slice = None
+    if rollup is not None and filter_index.distance_complete and (
+        min_dist is None or tuple(dist_range) == (min_dist, max_dist)
+    ):
+        rollup_slice = rollup.slice(selected_activities, selected_gear, date_range)
+    
+    aggregates = get_aggregate_cache().get(
+        (dataset_key, tuple(filter_state)),
+        lambda: filter_index.take(mask),
+        schema,
+        rollup_slice
+    )
+    df_filtered = aggregates.df
     
     # Summary metrics
     st.header("📊 Summary Statistics")
+    summary = aggregates.summary
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        st.metric("Total Activities", len(df_filtered))
+        st.metric("Total Activities", summary['activities'])
     
     with col2:
-        if distance_col:
-            st.metric("Total Distance", f"{df_filtered[distance_col].sum():.1f} km")
+        if summary['distance'] is not None:
+            st.metric("Total Distance", f"{summary['distance']:.1f} km")
     
     with col3:
-        if elevation_col:
-            st.metric("Total Elevation", f"{df_filtered[elevation_col].sum():.0f} m")
+        if summary['elevation'] is not None:
+            st.metric("Total Elevation", f"{summary['elevation']:.0f} m")
     
     with col4:
-        if calorie_col:
-            st.metric("Total Calories", f"{df_filtered[calorie_col].sum():.0f} kcal")
+        if summary['calories'] is not None:
+            st.metric("Total Calories", f"{summary['calories']:.0f} kcal")
     
     with col5:
-        if hr_col:
-            st.metric("Avg HR", f"{df_filtered[hr_col].mean():.0f} bpm")
+        if summary['avg_hr'] is not None:
+            st.metric("Avg HR", f"{summary['avg_hr']:.0f} bpm")
     
     # Tabs
+    # Only the selected tab runs its body, so a rerun builds one view's figures
     tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
-        ["Distance", "Activities", "Heart Rate", "Calories", "Elevation", "Weekly", "Data"]
+        ["Distance", "Activities", "Heart Rate", "Calories", "Elevation", "Weekly", "Data"],
+        key="view",
+        on_change="rerun"
     )
     
     with tab1:
-        st.subheader("Distance Over Time")
-        if date_col and distance_col:
-            df_sorted = df_filtered.sort_values(date_col)
-            fig = px.line(df_sorted, x=date_col, y=distance_col, markers=True,
-                         title="Distance Timeline", labels={distance_col: "Distance (km)"})
-            st.plotly_chart(fig, use_container_width=True)
+        if tab1.open:
+            st.subheader("Distance Over Time")
+            df_sorted = aggregates.chart_points('activity', distance_col, core.max_points_from_env())
+            if df_sorted is not None and distance_col:
+                fig = px.line(df_sorted, x=date_col, y=distance_col, markers=True,
+                             title="Distance Timeline", labels={distance_col: "Distance (km)"})
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab2:
-        st.subheader("Activity Breakdown")
-        if activity_col:
-            activity_counts = df_filtered[activity_col].value_counts()
-            fig = px.pie(values=activity_counts.values, names=activity_counts.index,
-                        title="Activities by Type")
-            st.plotly_chart(fig, use_container_width=True)
+        if tab2.open:
+            st.subheader("Activity Breakdown")
+            activity_counts = aggregates.activity_counts
+            if activity_counts is not None:
+                fig = px.pie(values=activity_counts.values, names=activity_counts.index,
+                            title="Activities by Type")
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab3:
-        st.subheader("Heart Rate Analysis")
-        if hr_col:
-            fig = px.histogram(df_filtered, x=hr_col, nbins=30,
-                             title="HR Distribution", labels={hr_col: "Avg HR (bpm)"})
-            st.plotly_chart(fig, use_container_width=True)
+        if tab3.open:
+            st.subheader("Heart Rate Analysis")
+            if hr_col:
+                fig = charts.histogram(aggregates.histogram('avg_hr'), title="HR Distribution",
+                                       x_label="Avg HR (bpm)", color="#636EFA")
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab4:
-        st.subheader("Calorie Burn")
-        if calorie_col:
-            fig = px.histogram(df_filtered, x=calorie_col, nbins=30,
-                             title="Calorie Distribution", labels={calorie_col: "Calories (kcal)"})
-            st.plotly_chart(fig, use_container_width=True)
+        if tab4.open:
+            st.subheader("Calorie Burn")
+            if calorie_col:
+                fig = charts.histogram(aggregates.histogram('calories'), title="Calorie Distribution",
+                                       x_label="Calories (kcal)", color="#636EFA")
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab5:
-        st.subheader("Elevation Analysis")
-        if elevation_col:
-            fig = px.histogram(df_filtered, x=elevation_col, nbins=30,
-                             title="Elevation Distribution", labels={elevation_col: "Elevation (m)"})
-            st.plotly_chart(fig, use_container_width=True)
+        if tab5.open:
+            st.subheader("Elevation Analysis")
+            if elevation_col:
+                fig = charts.histogram(aggregates.histogram('elevation'), title="Elevation Distribution",
+                                       x_label="Elevation (m)", color="#636EFA")
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab6:
-        st.subheader("Weekly Performance")
-        if 'Day of Week' in df_filtered.columns:
-            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_counts = df_filtered['Day of Week'].value_counts().reindex(day_order, fill_value=0)
-            fig = px.bar(x=day_order, y=[day_counts[day] for day in day_order],
-                        title="Activities by Day", labels={'x': 'Day', 'y': 'Count'})
-            st.plotly_chart(fig, use_container_width=True)
+        if tab6.open:
+            st.subheader("Weekly Performance")
+            weekday = aggregates.weekday
+            if weekday is not None:
+                fig = px.bar(x=core.DAY_ORDER, y=weekday['count'].tolist(),
+                            title="Activities by Day", labels={'x': 'Day', 'y': 'Count'})
+                st.plotly_chart(fig, use_container_width=True)
     
     with tab7:
-        st.subheader("Activity Data")
-        st.dataframe(df_filtered, use_container_width=True, height=400)
-        csv = df_filtered.to_csv(index=False)
-        st.download_button("📥 Download CSV", csv, "activities.csv", "text/csv")
+        if tab7.open:
+            st.subheader("Activity Data")
+            # One page at a time, so only that page is sent to the browser
+            rows = aggregates.table_rows()
+            pages = core.page_bounds(len(rows), 1)[2]
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+            start, stop, _ = core.page_bounds(len(rows), page)
+            st.dataframe(df_filtered.iloc[rows[start:stop]], use_container_width=True, height=400)
+            # Written only when clicked
+            st.download_button("📥 Download CSV", lambda: core.export_bytes(df_filtered, 'csv'),
+                               "activities.csv", "text/csv", on_click="ignore")
 
 else:
-    st.info("👈 Upload a Strava CSV file to get started!")
+    st.info("👈 Upload a Strava export ZIP or CSV file to get started!")
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+import sample_data_generator
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """Write generated activities as CSV; returns the path."""
+    def write(rows, layout='sample', seed=0, name='activities.csv'):
+        path = tmp_path / name
+        sample_data_generator.write_sample_csv(path, rows, seed=seed, layout=layout)
+        return path
+    return write
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
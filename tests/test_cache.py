@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+
+from strava_dashboard.cache import ActivityCache, cache_dir_from_env
+
+
+def test_cache_dir_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('STRAVA_DASHBOARD_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STRAVA_DASHBOARD_CACHE_MB', '2')
+    assert cache_dir_from_env() == (str(tmp_path), 2 * 1024 * 1024)
+    assert ActivityCache.from_env().directory == str(tmp_path)
+
+    monkeypatch.setenv('STRAVA_DASHBOARD_CACHE_MB', '0')
+    assert cache_dir_from_env() is None
+    assert ActivityCache.from_env() is None
+    directory, max_bytes = cache_dir_from_env(temporary=True)
+    assert os.path.isdir(directory) and directory != str(tmp_path)
+    assert max_bytes > 0
+
+
+def test_round_trip_and_eviction(tmp_path):
+    df = pd.DataFrame({'a': range(1000), 'b': pd.Categorical(['x', 'y'] * 500)})
+    cache = ActivityCache(str(tmp_path), max_bytes=1)
+    assert cache.get('missing') is None
+    cache.put('one', df)
+    pd.testing.assert_frame_equal(cache.get('one'), df)
+    cache.put('two', df)
+    # Over budget, only the newest entry is kept
+    assert cache.get('one') is None
+    pd.testing.assert_frame_equal(cache.get('two'), df)
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from strava_dashboard.downsample import downsample, lttb_indices
+
+
+def _lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets as originally published, one point at a time."""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    kept, a = [0], 0
+    for i in range(threshold - 2):
+        next_start = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = None, -1.0
+        for j in range(int(math.floor(i * every)) + 1, next_start):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize('n, threshold', [(1000, 100), (1234, 57), (50, 3), (10, 9)])
+def test_lttb_matches_the_reference(rng, n, threshold):
+    x = np.sort(rng.uniform(0, 1000, n))
+    y = rng.normal(0, 1, n).cumsum()
+    assert lttb_indices(x, y, threshold).tolist() == _lttb(x.tolist(), y.tolist(), threshold)
+
+
+def test_lttb_keeps_short_series():
+    assert lttb_indices(np.arange(5.0), np.arange(5.0), 10).tolist() == list(range(5))
+
+
+def test_downsample_keeps_extremes_and_drops_missing(rng):
+    n = 20_000
+    df = pd.DataFrame({
+        'Date': pd.date_range('2015-01-01', periods=n, freq='h', tz='Europe/Zurich'),
+        'Distance': rng.gamma(2, 5, n),
+    })
+    df.loc[rng.choice(n, 500, replace=False), 'Distance'] = np.nan
+    small = downsample(df, 'Date', 'Distance', max_points=300)
+    assert len(small) <= 302
+    assert small['Distance'].notna().all()
+    assert small['Date'].is_monotonic_increasing
+    assert small['Distance'].max() == df['Distance'].max()
+    assert small['Distance'].min() == df['Distance'].min()
+    assert small.index[0] == df['Distance'].first_valid_index()
+    assert small.index[-1] == df['Distance'].last_valid_index()
+    head = df.head(100)
+    assert downsample(head, 'Date', 'Distance', max_points=300) is head
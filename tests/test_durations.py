@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strava_dashboard.durations import format_duration, parse_durations
+
+
+def _seconds(value):
+    """Seconds of one 'SS', 'MM:SS' or 'H:MM:SS' string, read value by value; None if invalid."""
+    fields = value.split(':')
+    if len(value) > 16 or len(fields) > 3 or not all(field.split('.')[0].isdigit() for field in fields):
+        return None
+    if any('.' in field for field in fields[:-1]) or fields[-1].count('.') > 1:
+        return None
+    numbers = [int(field.split('.')[0]) for field in fields]
+    if any(number >= 60 for number in numbers[1:]):
+        return None
+    seconds = 0
+    for number in numbers:
+        seconds = seconds * 60 + number
+    return seconds
+
+
+def test_clock_strings_match_to_timedelta(rng):
+    seconds = rng.integers(0, 86_400, 5000)
+    text = pd.Series([f'{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}' for s in seconds])
+    expected = pd.to_timedelta(text).dt.total_seconds().astype('int32')
+    parsed, unparsed = parse_durations(text)
+    pd.testing.assert_series_equal(parsed, expected)
+    assert unparsed == 0
+
+
+def test_mixed_strings_match_a_per_value_parser():
+    values = [
+        '45', '102:00', '1:02:03', '30:00:00', '12:34.5', '0:00', '007:05',
+        '1:60', '1:60:00', '::', '1:2:3:4', '12a', 'abc', '1.2.3', '1.5:00', 'çà', '9' * 20, ' 5:00 ',
+    ]
+    parsed, unparsed = parse_durations(pd.Series(values))
+    expected = [_seconds(value.strip()) for value in values]
+    assert unparsed == sum(value is None for value in expected)
+    expected = [np.nan if value is None else value for value in expected]
+    np.testing.assert_array_equal(parsed.astype('float64'), expected)
+
+
+def test_missing_numbers_and_days():
+    parsed, unparsed = parse_durations(pd.Series(['1 day, 02:00:00', None, '', '3600']))
+    assert parsed.dtype == 'Int32'
+    np.testing.assert_array_equal(parsed.astype('float64'), [93_600, np.nan, np.nan, 3600])
+    assert unparsed == 0
+
+    parsed, _ = parse_durations(pd.Series([59.6, 120.0]))
+    assert parsed.dtype == 'int32'
+    assert parsed.tolist() == [60, 120]
+
+    parsed, _ = parse_durations(pd.to_timedelta(pd.Series(['00:01:30', '02:00:00'])))
+    assert parsed.tolist() == [90, 7200]
+
+
+@pytest.mark.parametrize('seconds, text', [(59.6, '1:00'), (3725, '1:02:05'), (np.nan, '')])
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+
+
+@pytest.mark.parametrize('values, expected_unparsed', [
+    (['999999:00:00', '1:00', None], 1),
+    (['999999:00:00', '1:00'], 1),
+    ([1e12, 60.0, float('inf')], 2),
+    (pd.to_timedelta(['100000 days', '1 min']), 1),
+])
+def test_values_beyond_int32_are_unparsed(values, expected_unparsed):
+    parsed, unparsed = parse_durations(pd.Series(values))
+    assert parsed.dtype == 'Int32'
+    assert pd.isna(parsed[0])
+    assert parsed[1] == 60
+    assert unparsed == expected_unparsed
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strava_dashboard.efforts import (
+    EFFORT_DURATIONS,
+    EFFORT_FIELDS,
+    all_time_bests,
+    best_averages,
+    best_efforts,
+    fastest_times,
+    resample,
+)
+from strava_dashboard.tracks import Track
+
+DURATIONS = list(EFFORT_DURATIONS.values())
+
+
+def test_fastest_times_of_a_faster_stretch():
+    # 3 m/s except 200 s at 5 m/s
+    time = np.arange(3001, dtype='float64')
+    speed = np.where((time >= 1000) & (time < 1200), 5.0, 3.0)
+    distance = np.r_[0, np.cumsum(speed[:-1])]
+    best = fastest_times(time, distance, [400, 1000, 5000, 50000])
+    np.testing.assert_allclose(best[:3], [80, 200, 200 + (5000 - 1000) / 3])
+    assert np.isnan(best[3])
+
+
+def test_best_averages_match_rolling_means(rng):
+    time = np.arange(4000, dtype='float64')
+    power = rng.normal(200, 40, len(time))
+    expected = [pd.Series(power).rolling(window).mean().max() for window in DURATIONS]
+    expected = [value if window <= len(time) else np.nan for value, window in zip(expected, DURATIONS)]
+    np.testing.assert_allclose(best_averages(time, power, DURATIONS), expected)
+
+
+def test_windows_do_not_count_across_missing_heart_rate():
+    time = np.r_[np.arange(600), np.arange(900, 1500)].astype('float64')
+    heart_rate = np.r_[np.full(600, 150.0), np.full(600, 120.0)]
+    best = best_averages(time, heart_rate, [300, 600, 1200])
+    np.testing.assert_allclose(best[:2], [150, 150])
+    assert np.isnan(best[2])
+
+
+def test_clock_jump_does_not_blow_up_the_grid(rng):
+    time = 1.6e9 + np.arange(4000, dtype='float64')
+    power = rng.normal(200, 40, len(time))
+    # The same as without the corrupt first sample
+    expected = best_averages(time[1:], power[1:], DURATIONS, fill=0.0)
+    jumped = time.copy()
+    jumped[0] = 0
+    np.testing.assert_allclose(best_averages(jumped, power, DURATIONS, fill=0.0), expected)
+    assert len(resample(jumped, power, max_pause=100)) < len(time) + 100
+
+
+def test_best_efforts_and_all_time_bests(rng):
+    n = 1800
+    time = np.arange(n, dtype='float64')
+    track = Track(
+        time=time, lat=np.zeros(n), lon=np.zeros(n), elevation=np.zeros(n),
+        distance=time * 3.0, heart_rate=np.full(n, np.nan), power=rng.normal(200, 40, n),
+    )
+    efforts = best_efforts(track)
+    assert list(efforts) == list(EFFORT_FIELDS)
+    assert efforts['fastest_1 km'] == pytest.approx(1000 / 3)
+    assert np.isnan(efforts['heart_rate_5 s'])
+
+    frame = pd.DataFrame([efforts, {**efforts, 'fastest_1 km': 300.0}], index=[10, 11])
+    bests = all_time_bests(frame).set_index(['kind', 'label'])
+    assert bests.loc[('fastest', '1 km'), 'row'] == 11
+    assert ('heart_rate', '5 s') not in bests.index
@@ -0,0 +1,56 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+
+from strava_dashboard.export import EXPORT_FORMATS, ExportCache, export_bytes
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'Activity Type': pd.Categorical(['Run', 'Ride', 'Run', 'Swim'] * 30),
+        'Distance': [float(i) for i in range(120)],
+        'Activity Date': pd.date_range('2024-01-01', periods=120, freq='D'),
+    })
+
+
+@pytest.mark.parametrize('fmt', list(EXPORT_FORMATS))
+def test_exports_round_trip_in_slices(df, fmt):
+    data = export_bytes(df, fmt, chunksize=50)
+    if fmt == 'parquet':
+        result = pd.read_parquet(io.BytesIO(data))
+    else:
+        result = pd.read_csv(io.BytesIO(gzip.decompress(data) if fmt == 'csv.gz' else data), parse_dates=['Activity Date'])
+    pd.testing.assert_frame_equal(result, df, check_dtype=False, check_categorical=False)
+    assert data == export_bytes(df, fmt, chunksize=50)
+
+
+def test_export_is_reused_for_the_same_filter_state(df):
+    cache = ExportCache(maxsize=2)
+    built = []
+
+    def rows(frame):
+        def factory():
+            built.append(len(frame))
+            return frame
+        return factory
+
+    first = cache.get(('dataset', ('Run',), 'csv'), rows(df[df['Activity Type'] == 'Run']), 'csv')
+    assert cache.get(('dataset', ('Run',), 'csv'), rows(df), 'csv') is first
+    assert built == [60]
+
+    # Another filter state or format is exported anew
+    cache.get(('dataset', ('Run', 'Ride'), 'csv'), rows(df[df['Activity Type'] != 'Swim']), 'csv')
+    cache.get(('dataset', ('Run', 'Ride'), 'csv.gz'), rows(df[df['Activity Type'] != 'Swim']), 'csv.gz')
+    assert built == [60, 90, 90]
+
+    # The least recently used export was dropped
+    cache.get(('dataset', ('Run',), 'csv'), rows(df[df['Activity Type'] == 'Run']), 'csv')
+    assert built == [60, 90, 90, 60]
+
+
+def test_unknown_format(df):
+    with pytest.raises(ValueError):
+        export_bytes(df, 'xlsx')
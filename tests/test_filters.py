@@ -0,0 +1,44 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import strava_dashboard as core
+
+
+@pytest.fixture
+def dataset(write_csv):
+    df, schema = core.load_dataset(open(write_csv(2000, layout='strava', seed=3), 'rb'))
+    return df, schema, core.FilterIndex(df, schema)
+
+
+def _same_rows(left, right, schema):
+    key = [schema.activity_id]
+    left = left.sort_values(key).reset_index(drop=True)
+    right = right.sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(left[right.columns], right, check_dtype=False, check_categorical=False)
+
+
+def test_day_of_week_is_added_once_without_touching_the_input(dataset):
+    df, schema, index = dataset
+    assert 'Day of Week' not in df.columns
+    days = index.df['Day of Week']
+    assert isinstance(days.dtype, pd.CategoricalDtype)
+    assert list(days.cat.categories) == core.DAY_ORDER
+    assert (days.astype(str) == index.df[schema.date].dt.day_name()).all()
+
+
+@pytest.mark.parametrize('case', ['all', 'subset', 'empty'])
+def test_filter_index_matches_apply_filters(dataset, case):
+    df, schema, index = dataset
+    types = index.activity_options()
+    gear = index.gear_options()
+    low, high = (value.date() for value in index.date_bounds())
+    if case == 'all':
+        args = (types, gear, (low, high), index.distance_bounds())
+    elif case == 'subset':
+        args = (types[:2], gear[:1], (low + datetime.timedelta(days=90), high - datetime.timedelta(days=30)), (5.0, 25.0))
+    else:
+        args = ([], None, None, None)
+    expected = core.apply_filters(df, schema, *args)
+    _same_rows(index.filter(*args), expected, schema)
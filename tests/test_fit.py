@@ -0,0 +1,62 @@
+import struct
+
+import numpy as np
+import pytest
+
+from strava_dashboard.fit import FIT_EPOCH, decode_records
+
+
+def _fit(fields, rows):
+    """FIT bytes of record messages with ``fields`` as (number, struct code, base type) and ``rows`` of values."""
+    definition = bytes([0x40, 0, 0]) + struct.pack('<H', 20) + bytes([len(fields)])
+    definition += b''.join(bytes([number, struct.calcsize(code), base]) for number, code, base in fields)
+    layout = '<' + ''.join(code for _, code, _ in fields)
+    body = definition + b''.join(b'\x00' + struct.pack(layout, *row) for row in rows)
+    header = struct.pack('<BBHI4sH', 14, 0x20, 2132, len(body), b'.FIT', 0)
+    return header + body + b'\x00\x00'
+
+
+def test_records_are_decoded():
+    fields = [(253, 'I', 0x86), (0, 'i', 0x85), (1, 'i', 0x85), (78, 'I', 0x86), (5, 'I', 0x86), (7, 'H', 0x84)]
+    data = _fit(fields, [(1000, 2 ** 29, -(2 ** 30), 3000, 12345, 250)])
+    records = decode_records(data)
+    assert records['time'][0] == 1000 + FIT_EPOCH
+    assert records['lat'][0] == pytest.approx(45.0)
+    assert records['lon'][0] == pytest.approx(-90.0)
+    assert records['elevation'][0] == pytest.approx(100.0)
+    assert records['distance'][0] == pytest.approx(123.45)
+    assert records['power'][0] == 250
+    assert np.isnan(records['heart_rate'][0])
+
+
+def test_invalid_values_are_missing():
+    # Heart rate as uint8, then uint8z; power as uint16 with its invalid value
+    for base, invalid in ((0x02, 0xFF), (0x0A, 0)):
+        fields = [(253, 'I', 0x86), (3, 'B', base), (7, 'H', 0x84)]
+        records = decode_records(_fit(fields, [(1, invalid, 0xFFFF), (2, 140, 0)]))
+        assert np.isnan(records['heart_rate'][0])
+        assert np.isnan(records['power'][0])
+        assert records['heart_rate'][1] == 140
+        assert records['power'][1] == 0
+
+
+def test_uint32z_zero_is_missing():
+    records = decode_records(_fit([(253, 'I', 0x86), (5, 'I', 0x8C)], [(1, 0), (2, 500)]))
+    assert np.isnan(records['distance'][0])
+    assert records['distance'][1] == 5
+
+
+def test_zero_heart_rate_is_missing_as_uint8():
+    records = decode_records(_fit([(253, 'I', 0x86), (3, 'B', 0x02)], [(1, 0), (2, 150)]))
+    assert np.isnan(records['heart_rate'][0])
+    assert records['heart_rate'][1] == 150
+
+
+def test_truncated_file_is_read_up_to_the_cut():
+    data = _fit([(253, 'I', 0x86), (3, 'B', 0x02)], [(1, 120), (2, 130), (3, 140)])
+    assert len(decode_records(data[:-2 - 3])['time']) == 2
+
+
+def test_not_fit():
+    with pytest.raises(ValueError):
+        decode_records(b'<gpx></gpx>' + b'\x00' * 20)
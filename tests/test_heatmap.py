@@ -0,0 +1,107 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from strava_dashboard.heatmap import (
+    HEATMAP_ZOOMS,
+    colorize,
+    draw_heatmap,
+    encode_png,
+    mercator,
+    rasterize,
+    render_heatmap,
+    unpack,
+)
+from strava_dashboard.tracks import Track
+from strava_dashboard.trackstore import TrackStore
+
+
+def _track(rng, n=3000, lat=47.37, lon=8.54):
+    # Steps of about a metre, well under a pixel at the finest zoom
+    lat = lat + np.cumsum(rng.normal(0, 1e-5, n))
+    lon = lon + np.cumsum(rng.normal(0, 1e-5, n))
+    nothing = np.full(n, np.nan)
+    return Track(
+        time=np.arange(n, dtype='float64'), lat=lat, lon=lon, elevation=nothing,
+        distance=nothing, heart_rate=nothing, power=nothing,
+    )
+
+
+@pytest.fixture
+def tracks(rng):
+    return {f'track-{i}': _track(rng) for i in range(5)}
+
+
+@pytest.fixture
+def store(tmp_path, tracks):
+    store = TrackStore(str(tmp_path))
+    store.put_many([(key, track, None, None, None, None) for key, track in tracks.items()])
+    return store
+
+
+def test_counts_match_a_direct_histogram(store, tracks):
+    zoom = max(HEATMAP_ZOOMS)
+    cells = store.cells(list(tracks), zoom)
+    x, y = unpack(cells)
+    extent = (x.min(), y.min(), x.max(), y.max())
+    heatmap = draw_heatmap(cells, zoom, extent, zoom)
+
+    # Each activity counts once in every pixel its points fall in
+    pixels = set()
+    for key, track in tracks.items():
+        px, py = mercator(track.lat, track.lon, zoom)
+        pixels |= {(key, int(a), int(b)) for a, b in zip(np.floor(px), np.floor(py))}
+    _, px, py = zip(*pixels)
+    expected, _, _ = np.histogram2d(
+        py, px, bins=(extent[3] - extent[1] + 1, extent[2] - extent[0] + 1),
+        range=((extent[1], extent[3] + 1), (extent[0], extent[2] + 1)),
+    )
+    np.testing.assert_array_equal(heatmap.counts, expected)
+    assert heatmap.counts.max() <= len(tracks)
+    assert heatmap.cells == len(cells)
+
+
+def test_render_picks_the_finest_zoom_that_fits(store, tracks):
+    heatmap = render_heatmap(store, list(tracks), max_size=400, coverage=1.0)
+    assert max(heatmap.counts.shape) <= 400
+    # One zoom further in would not fit
+    assert 2 * max(heatmap.counts.shape) > 400 or heatmap.zoom == max(HEATMAP_ZOOMS)
+    west, south, east, north = heatmap.bounds
+    for track in tracks.values():
+        assert south <= track.lat.min() and track.lat.max() <= north
+        assert west <= track.lon.min() and track.lon.max() <= east
+
+    assert render_heatmap(store, ['unknown'], max_size=400) is None
+
+
+def test_rasterize_fills_gaps_between_points():
+    track = _track(np.random.default_rng(1), n=2)._replace(lat=np.array([47.0, 47.0]), lon=np.array([8.0, 8.01]))
+    cells = rasterize(track)[max(HEATMAP_ZOOMS)]
+    x, y = unpack(cells)
+    # A continuous row of pixels from one end to the other
+    np.testing.assert_array_equal(np.sort(x), np.arange(x.min(), x.max() + 1))
+    assert len(set(y)) == 1
+
+
+def test_png_encoding():
+    counts = np.array([[0, 1, 2], [4, 0, 8]], dtype='float32')
+    rgba = colorize(counts)
+    assert rgba.shape == (2, 3, 4)
+    assert (rgba[counts == 0, 3] == 0).all()
+    assert (rgba[counts > 0, 3] > 0).all()
+
+    png = encode_png(rgba)
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    length, tag = struct.unpack('>I4s', png[8:16])
+    assert (length, tag) == (13, b'IHDR')
+    width, height, depth, color = struct.unpack('>IIBB', png[16:26])
+    assert (width, height, depth, color) == (3, 2, 8, 6)
+    assert png[-12:] == struct.pack('>I', 0) + b'IEND' + struct.pack('>I', zlib.crc32(b'IEND'))
+
+    idat_length = struct.unpack('>I', png[33:37])[0]
+    assert png[37:41] == b'IDAT'
+    rows = np.frombuffer(zlib.decompress(png[41:41 + idat_length]), dtype='uint8').reshape(2, 1 + 3 * 4)
+    assert (rows[:, 0] == 0).all()
+    np.testing.assert_array_equal(rows[:, 1:].reshape(2, 3, 4), rgba)
@@ -0,0 +1,35 @@
+import pandas as pd
+
+import strava_dashboard as core
+from strava_dashboard.loader import load_chunked, read_header, schema_columns
+from strava_dashboard.metrics import DERIVED_COLUMNS
+
+
+def test_load_dataset_reads_only_the_schema_columns(write_csv):
+    path = write_csv(500, layout='strava', seed=2)
+    header = list(read_header(open(path, 'rb')))
+    roles = set(core.resolve_schema(header).as_dict().values())
+    assert len(roles) < len(header)
+
+    df, schema = core.load_dataset(open(path, 'rb'))
+    assert set(df.columns) - set(DERIVED_COLUMNS) == roles
+    assert [header[i] for i in schema_columns(header)] == [col for col in header if col in roles]
+
+    # The same values as a full parse
+    full = load_chunked(open(path, 'rb'))
+    for col in roles:
+        pd.testing.assert_series_equal(df[col], full[col], check_categorical=False)
+
+
+def test_store_keeps_the_columns_of_its_history(tmp_path, write_csv):
+    full = write_csv(300, layout='strava', seed=4, name='full.csv')
+    lines = full.read_text().splitlines(keepends=True)
+    half = tmp_path / 'half.csv'
+    half.write_text(''.join(lines[:151]))
+
+    store = core.ActivityStore(str(tmp_path / 'history.arrow'))
+    first, _, _ = store.ingest(open(half, 'rb'))
+    df, _, added = store.ingest(open(full, 'rb'))
+    assert added == 150
+    assert list(df.columns) == list(first.columns)
+    assert set(df.columns) - set(DERIVED_COLUMNS) == set(core.resolve_schema(df.columns).as_dict().values())
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strava_dashboard.metrics import PACE_COL, SPEED_COL, TRIMP_COL, add_derived_metrics, ewma, training_load, trimp
+from strava_dashboard.schema import ColumnSchema
+
+
+def _naive_ewma(values, days):
+    decay = np.exp(-1 / days)
+    out, previous = [], 0.0
+    for value in values:
+        previous = decay * previous + (1 - decay) * value
+        out.append(previous)
+    return np.array(out)
+
+
+@pytest.mark.parametrize('days', [1, 7, 42])
+def test_ewma_matches_the_recurrence(rng, days):
+    # Long enough to span several blocks, with rest days in between
+    values = rng.gamma(2, 50, 20_000) * (rng.random(20_000) < 0.6)
+    np.testing.assert_allclose(ewma(values, days), _naive_ewma(values, days), rtol=1e-10, atol=1e-10)
+
+
+def test_ewma_of_nothing():
+    assert len(ewma([], 7)) == 0
+
+
+def test_trimp_value():
+    # 60 minutes at 150 bpm with a 60-190 bpm range: reserve 90/130
+    assert trimp(60, 150, 60, 190) == pytest.approx(100.4402927, rel=1e-9)
+    # The reserve is clipped to [0, 1]
+    assert trimp(30, 50, 60, 190) == 0
+    assert trimp(30, 200, 60, 190) == pytest.approx(30 * 0.64 * np.exp(1.92))
+
+
+def test_derived_metrics_and_training_load():
+    schema = ColumnSchema(date='Date', distance='Distance', moving_time='Moving Time', avg_hr='Avg HR', max_hr='Max HR')
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 18:00', '2024-01-04 07:00']),
+        'Distance': [10.0, 0.0, 5.0],
+        'Moving Time': [3600, 1800, 1500],
+        'Avg HR': [150.0, np.nan, 140.0],
+        'Max HR': [190.0, 170.0, 180.0],
+    })
+    derived = add_derived_metrics(df, schema)
+    np.testing.assert_allclose(derived[PACE_COL], [6.0, np.nan, 5.0])
+    np.testing.assert_allclose(derived[SPEED_COL], [10.0, np.nan, 12.0])
+    np.testing.assert_allclose(
+        derived[TRIMP_COL], [100.4402927, np.nan, trimp(25, 140, 60, 190)], rtol=1e-6,
+    )
+
+    load = training_load(derived, 'Date')
+    assert list(load.index.day) == [1, 2, 3, 4]
+    np.testing.assert_allclose(load['load'], [100.4402927, 0, 0, trimp(25, 140, 60, 190)], rtol=1e-6)
+    np.testing.assert_allclose(load['acute'], _naive_ewma(load['load'], 7))
+    np.testing.assert_allclose(load['ratio'], load['acute'] / load['chronic'])
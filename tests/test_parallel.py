@@ -0,0 +1,80 @@
+import io
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+import sample_data_generator
+from strava_dashboard import parallel
+from strava_dashboard.archive import StravaArchive
+from strava_dashboard.parallel import parse_files
+
+
+@pytest.fixture(scope='module')
+def archive():
+    buffer = io.BytesIO()
+    sample_data_generator.write_sample_export(buffer, 12, seed=2, track_points=300)
+    with zipfile.ZipFile(buffer, 'a') as export:
+        export.writestr('export/activities/broken.gpx', b'<gpx><trkpt lat=')
+    return StravaArchive(buffer.getvalue())
+
+
+def _assert_same_result(result, expected):
+    for value, other in zip(result, expected):
+        if isinstance(value, dict):
+            assert value.keys() == other.keys()
+            for key in value:
+                np.testing.assert_array_equal(value[key], other[key])
+        elif isinstance(value, tuple) and hasattr(value, 'lat'):
+            for field, array in zip(value, other):
+                np.testing.assert_array_equal(field, array)
+        else:
+            assert value == other
+
+
+def _parse(archive, **kwargs):
+    progress = []
+    results = list(parse_files(
+        archive, archive.tracks.values(), batch_size=2,
+        progress=lambda done, total: progress.append((done, total)), **kwargs,
+    ))
+    total = len(archive.tracks)
+    assert sorted(progress) == progress and progress[-1] == (total, total)
+    return {result[0].path: result for result in results}
+
+
+def test_workers_give_the_same_results_as_one_process(archive):
+    expected = _parse(archive, workers=1)
+    assert len(expected) == 13
+    assert len(expected['activities/broken.gpx'][1].lat) == 0
+
+    results = _parse(archive, workers=2, max_in_flight=2)
+    assert results.keys() == expected.keys()
+    for path, result in results.items():
+        _assert_same_result(result, expected[path])
+
+
+class _BrokenPool:
+    """A process pool whose workers die on the first batch."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+def test_broken_pool_falls_back_to_this_process(archive, monkeypatch):
+    expected = _parse(archive, workers=1)
+    monkeypatch.setattr(parallel, 'ProcessPoolExecutor', _BrokenPool)
+    results = _parse(archive, workers=2)
+    assert results.keys() == expected.keys()
+    for path, result in results.items():
+        _assert_same_result(result, expected[path])
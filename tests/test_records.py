@@ -0,0 +1,89 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sample_data_generator
+import strava_dashboard as core
+from strava_dashboard.metrics import PACE_COL
+from strava_dashboard.records import PACE_BAND_LABELS, PACE_BANDS, RecordsIndex
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    path = tmp_path_factory.mktemp('records') / 'activities.csv'
+    sample_data_generator.write_sample_csv(path, 3000, layout='strava', seed=7)
+    df, schema = core.load_dataset(open(path, 'rb'))
+    return core.FilterIndex(df, schema), schema
+
+
+def _random_filters(index, rng):
+    types = index.activity_options()
+    gear = index.gear_options()
+    low, high = (value.date() for value in index.date_bounds())
+    start = low + datetime.timedelta(days=int(rng.integers(0, (high - low).days)))
+    end = start + datetime.timedelta(days=int(rng.integers(1, 1500)))
+    distance = np.sort(rng.uniform(*index.distance_bounds(), 2))
+    return (
+        list(rng.choice(types, rng.integers(1, len(types) + 1), replace=False)),
+        list(rng.choice(gear, rng.integers(1, len(gear) + 1), replace=False)) if rng.random() < 0.5 else None,
+        (start, end) if rng.random() < 0.7 else None,
+        tuple(distance) if rng.random() < 0.5 else None,
+    )
+
+
+def _brute_force_table(df, schema):
+    columns = {}
+    for record, col in (('distance', schema.distance), ('elevation', schema.elevation), ('calories', schema.calories)):
+        columns[record] = df.groupby(schema.activity, observed=True)[col].max()
+    band = pd.cut(df[schema.distance], PACE_BANDS, right=False, labels=PACE_BAND_LABELS)
+    pace = df[PACE_COL].where(np.isfinite(df[PACE_COL]))
+    pace = pace.groupby([df[schema.activity], band], observed=True).min()
+    for label in PACE_BAND_LABELS:
+        columns[label] = pace.xs(label, level=1) if label in pace.index.get_level_values(1) else pd.Series(dtype='float64')
+    table = pd.DataFrame(columns)
+    table.index = table.index.astype(str)
+    return table.dropna(how='all', axis=1).dropna(how='all')
+
+
+def _assert_same_table(result, expected):
+    result = result.dropna(how='all')
+    result.index = result.index.astype(str)
+    pd.testing.assert_frame_equal(
+        result.sort_index().astype('float64'), expected.sort_index().astype('float64'),
+        check_names=False, rtol=1e-6,
+    )
+
+
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_records_match_brute_force_under_random_filters(dataset, rng, k):
+    index, schema = dataset
+    records = RecordsIndex.build(index.df, schema, k=k)
+    for _ in range(15):
+        filters = _random_filters(index, rng)
+        rows = index.filter(*filters)
+        sliced = records.slice(*filters)
+
+        expected = core.key_insights(rows, schema)
+        for key, value in sliced.insights(rows=lambda: rows).items():
+            if expected[key] is None:
+                assert value is None
+            else:
+                assert value[0] == pytest.approx(expected[key][0])
+                assert str(value[1]) == str(expected[key][1])
+
+        if len(rows):
+            _assert_same_table(sliced.table(rows=lambda: rows), _brute_force_table(rows, schema))
+
+
+def test_update_matches_a_full_build(dataset):
+    index, schema = dataset
+    df = index.df
+    updated = RecordsIndex.build(df.iloc[:1000], schema, k=3).update(df.iloc[1000:])
+    built = RecordsIndex.build(df, schema, k=3)
+    key = ['record', 'activity', 'year', 'band', 'score']
+    pd.testing.assert_frame_equal(
+        updated.candidates.sort_values(key).reset_index(drop=True)[key].astype(str),
+        built.candidates.sort_values(key).reset_index(drop=True)[key].astype(str),
+    )
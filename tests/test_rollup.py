@@ -0,0 +1,76 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import strava_dashboard as core
+from strava_dashboard.aggregations import summary_metrics, weekday_summary
+from strava_dashboard.rollup import FREQUENCIES
+
+
+@pytest.fixture(params=['strava', 'legacy'])
+def dataset(request, write_csv):
+    df, schema = core.load_dataset(open(write_csv(2000, layout=request.param, seed=11), 'rb'))
+    index = core.FilterIndex(df, schema)
+    return index, schema, core.RollupCube.build(index.df, schema)
+
+
+def _filters(index, case):
+    types = index.activity_options()
+    gear = index.gear_options()
+    low, high = (value.date() for value in index.date_bounds())
+    if case == 'all':
+        return types, gear, (low, high)
+    if case == 'subset':
+        return types[1:], gear[:2] or None, (low + datetime.timedelta(days=200), high)
+    return [], None, None
+
+
+def _periods(dates, granularity):
+    """Start of each date's period, as wall-clock time."""
+    days = dates.dt.tz_localize(None).dt.normalize()
+    if granularity == 'week':
+        return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+    if granularity == 'month':
+        return days - pd.to_timedelta(days.dt.day - 1, unit='D')
+    return days
+
+
+@pytest.mark.parametrize('case', ['all', 'subset', 'empty'])
+def test_slices_match_the_rows(dataset, case):
+    index, schema, rollup = dataset
+    filters = _filters(index, case)
+    rows = index.filter(*filters)
+    cube = rollup.slice(*filters)
+
+    expected = summary_metrics(rows, schema)
+    for key, value in cube.summary().items():
+        if expected[key] is None:
+            assert value is None
+        else:
+            assert value == pytest.approx(expected[key], nan_ok=True)
+
+    pd.testing.assert_frame_equal(
+        cube.weekday().astype('float64'), weekday_summary(rows, schema).astype('float64'),
+        check_names=False, rtol=1e-6,
+    )
+
+
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month'])
+def test_series_match_grouping_the_rows(dataset, granularity):
+    index, schema, rollup = dataset
+    rows = index.df.dropna(subset=[schema.date])
+    series = rollup.series(granularity)
+    periods = series.index.tz_localize(None) if series.index.tz is not None else series.index
+
+    grouped = rows.groupby(_periods(rows[schema.date], granularity))
+    assert series['count'].sum() == len(rows)
+    active = series['count'].to_numpy() > 0
+    np.testing.assert_array_equal(periods[active], grouped.size().index)
+    np.testing.assert_array_equal(series['count'][active], grouped.size())
+    np.testing.assert_allclose(series['distance'][active], grouped[schema.distance].sum(), rtol=1e-6)
+    if schema.avg_hr:
+        np.testing.assert_allclose(series['avg_hr'][active], grouped[schema.avg_hr].mean(), rtol=1e-6)
+    # Consecutive periods, empty ones included
+    assert len(pd.date_range(periods[0], periods[-1], freq=FREQUENCIES[granularity])) == len(series)
@@ -0,0 +1,147 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import strava_dashboard as core
+from strava_dashboard.sql import SqlAggregates, SqlDataset, backend_from_env
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def backend(request):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    return request.param
+
+
+@pytest.fixture(params=['strava', 'legacy'])
+def dataset(request, write_csv, tmp_path, backend):
+    df, schema = core.load_dataset(open(write_csv(2000, layout=request.param, seed=5), 'rb'))
+    index = core.FilterIndex(df, schema)
+    path = tmp_path / f'copy{core.SQL_BACKENDS[backend]}'
+    return index, schema, SqlDataset.build(index.df, schema, backend, str(path))
+
+
+def _filters(index, case):
+    types = index.activity_options()
+    gear = index.gear_options()
+    low, high = (value.date() for value in index.date_bounds())
+    if case == 'all':
+        return types, gear, (low, high), index.distance_bounds()
+    if case == 'subset':
+        days = datetime.timedelta(days=90)
+        return types[:2], gear[:1] or None, (low + days, high - days), (5.0, 30.0)
+    return [], None, None, None
+
+
+def _assert_same(result, expected):
+    if isinstance(expected, (pd.DataFrame, pd.Series)):
+        result, expected = pd.DataFrame(result), pd.DataFrame(expected)
+        result.index, expected.index = result.index.astype(str), expected.index.astype(str)
+        pd.testing.assert_frame_equal(
+            result.astype('float64'), expected.astype('float64'), check_names=False, rtol=1e-6,
+        )
+    elif isinstance(expected, dict):
+        assert result.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, tuple):
+                assert result[key][0] == pytest.approx(value[0])
+                assert str(result[key][1]) == str(value[1])
+            elif value is None:
+                assert result[key] is None
+            else:
+                assert result[key] == pytest.approx(value, nan_ok=True)
+    else:
+        assert result is None and expected is None
+
+
+@pytest.mark.parametrize('case', ['all', 'subset', 'empty'])
+def test_sql_aggregates_match_pandas(dataset, case):
+    index, schema, sql = dataset
+    filters = _filters(index, case)
+    mask = index.combine(
+        index.activity_mask(filters[0]), index.gear_mask(filters[1]),
+        index.date_mask(filters[2]), index.distance_mask(filters[3]),
+    )
+    expected = core.Aggregates(lambda: index.take(mask), schema)
+    result = SqlAggregates(index.df, schema, sql, sql.where(*filters))
+
+    assert result.summary['activities'] == int(mask.sum())
+    for name in ('summary', 'weekday', 'activity_summary', 'max_hr', 'insights'):
+        _assert_same(getattr(result, name), getattr(expected, name))
+    for field in ('distance', 'elevation', 'avg_hr', 'calories'):
+        _assert_same(result.histogram(field), expected.histogram(field))
+    for granularity in ('day', 'week', 'month'):
+        if len(expected.series(granularity)):
+            _assert_same(result.series(granularity), expected.series(granularity))
+    for col in (schema.distance, 'Cumulative Distance', schema.avg_hr):
+        points, expected_points = result.chart_points('activity', col), expected.chart_points('activity', col)
+        _assert_same(points[[col]].reset_index(drop=True), expected_points[[col]].reset_index(drop=True))
+        assert (points[schema.date].to_numpy() == expected_points[schema.date].dt.tz_localize(None).to_numpy()).all()
+    if expected.training_load is not None:
+        _assert_same(result.training_load, expected.training_load.set_axis(result.training_load.index))
+    assert result.training_load is None or len(expected.df)
+
+    # Table pages and whole rows come from the frame, by position
+    for sort_by, ascending, search_col, search in (
+        (None, True, None, None),
+        (schema.distance, False, None, None),
+        (schema.activity, True, schema.name, 'run'),
+    ):
+        rows = result.table_rows(sort_by, ascending, search_col, search)
+        expected_rows = expected.take(expected.table_rows(sort_by, ascending, search_col, search))
+        pd.testing.assert_frame_equal(result.take(rows), expected_rows)
+    pd.testing.assert_frame_equal(result.df, expected.df)
+
+
+@pytest.mark.parametrize('case', ['all', 'subset', 'empty'])
+def test_sql_filters_match_filter_index(dataset, case):
+    index, schema, sql = dataset
+    types, gear, date_range, dist_range = _filters(index, case)
+    assert sql.activity_options() == sorted(index.activity_options())
+    masks = [index.activity_mask(types), sql.activity_mask(types)]
+    assert sql.gear_options(masks[1]) == sorted(index.gear_options(masks[0]))
+    masks = [index.combine(masks[0], index.gear_mask(gear)), sql.combine(masks[1], sql.gear_mask(gear))]
+
+    low, high = index.date_bounds(masks[0])
+    if low is None:
+        assert sql.date_bounds(masks[1]) == (None, None)
+    else:
+        assert sql.date_bounds(masks[1]) == (low.tz_localize(None), high.tz_localize(None))
+    masks = [index.combine(masks[0], index.date_mask(date_range)), sql.combine(masks[1], sql.date_mask(date_range))]
+    assert sql.distance_bounds(masks[1]) == pytest.approx(index.distance_bounds(masks[0]))
+    masks = [index.combine(masks[0], index.distance_mask(dist_range)), sql.combine(masks[1], sql.distance_mask(dist_range))]
+
+    expected = index.take(masks[0])
+    assert sql.count(masks[1]) == len(expected)
+    columns = [schema.date, schema.distance, schema.activity]
+    selected = sql.select(masks[1], columns)
+    assert list(selected.columns) == columns and len(selected) == len(expected)
+    assert (selected[schema.date].to_numpy() == expected[schema.date].dt.tz_localize(None).to_numpy()).all()
+
+
+@pytest.mark.parametrize('values', [
+    [float(i) for i in range(31)],           # every value on a bin edge
+    [0.1, 0.2, 0.30000000000000004, 0.7, 1.0, float('inf'), None],
+    [5.0, 5.0, 5.0],                         # one value: np.histogram widens the range
+    [None, None],
+])
+def test_sql_histogram_bins_like_numpy(tmp_path, backend, values):
+    schema = core.ColumnSchema(distance='Distance')
+    df = pd.DataFrame({'Distance': pd.array(values, dtype='Float64').astype('float64')})
+    sql = SqlDataset.build(df, schema, backend, str(tmp_path / f'copy{core.SQL_BACKENDS[backend]}'))
+    _assert_same(sql.histogram(None, 'distance'), core.histogram_counts(df, 'Distance'))
+
+
+def test_backend_from_env(monkeypatch):
+    monkeypatch.delenv('STRAVA_DASHBOARD_SQL', raising=False)
+    assert backend_from_env() is None
+    for value, backend in (
+        ('off', None), ('1', core.DEFAULT_SQL_BACKEND), ('auto', core.DEFAULT_SQL_BACKEND),
+        ('DuckDB', core.DEFAULT_SQL_BACKEND), ('SQLite', 'sqlite'),
+    ):
+        monkeypatch.setenv('STRAVA_DASHBOARD_SQL', value)
+        assert backend_from_env() == backend
+    monkeypatch.setenv('STRAVA_DASHBOARD_SQL', 'postgres')
+    with pytest.raises(ValueError):
+        backend_from_env()
@@ -0,0 +1,76 @@
+import pandas as pd
+
+from strava_dashboard.schema import ColumnSchema
+from strava_dashboard.store import MISSING_KEY_PART, ActivityStore, activity_keys
+
+SCHEMA = ColumnSchema(date='Date', activity='Type', distance='Distance', activity_id='ID')
+
+
+def test_keys_with_missing_fields_are_distinct():
+    df = pd.DataFrame({
+        'Date': ['2024-01-01 08:00:00', '2024-01-02 08:00:00', None, '2024-01-03 08:00:00'],
+        'Type': ['Run', 'Run', 'Ride', None],
+        'Distance': [None, None, '12.5', '3'],
+    })
+    keys = activity_keys(df, SCHEMA)
+    assert keys.notna().all()
+    assert not keys.duplicated().any()
+    assert keys[0] == f'2024-01-01 08:00:00|Run|{MISSING_KEY_PART}'
+
+
+def test_raw_and_processed_keys_match():
+    raw = pd.DataFrame({'Date': ['2024-01-01 08:00:00', None], 'Type': ['Run', 'Swim'], 'Distance': ['1,000.5', None]})
+    processed = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01 08:00:00', None]),
+        'Type': pd.Categorical(['Run', 'Swim']),
+        'Distance': [1000.5, float('nan')],
+    })
+    pd.testing.assert_series_equal(activity_keys(raw, SCHEMA), activity_keys(processed, SCHEMA))
+
+
+def test_id_keys_with_missing_ids():
+    df = pd.DataFrame({'ID': ['17', None, 'abc']})
+    keys = activity_keys(df, SCHEMA)
+    assert keys.tolist() == ['17', MISSING_KEY_PART, 'abc']
+
+
+def test_numeric_ids_are_normalised():
+    assert activity_keys(pd.DataFrame({'ID': ['17', '18.0']}), SCHEMA).tolist() == \
+        activity_keys(pd.DataFrame({'ID': [17, 18]}), SCHEMA).tolist()
+
+
+def test_incremental_ingest_keeps_rows_with_missing_fields(tmp_path, write_csv):
+    # The legacy layout has no Activity ID and leaves some distances blank
+    full = write_csv(400, layout='legacy', seed=1, name='full.csv')
+    lines = full.read_text().splitlines(keepends=True)
+    half = tmp_path / 'half.csv'
+    half.write_text(''.join(lines[:201]))
+
+    store = ActivityStore(str(tmp_path / 'history.arrow'))
+    _, _, added = store.ingest(open(half, 'rb'))
+    assert added == 200
+    df, schema, added = store.ingest(open(full, 'rb'))
+    assert df[schema.distance].isna().any()
+    assert added == 200
+    assert len(df) == 400
+
+    # Importing the same export again adds nothing
+    _, _, added = store.ingest(open(full, 'rb'))
+    assert added == 0
+
+
+def test_blank_ids_do_not_break_dedupe(tmp_path, write_csv):
+    path = write_csv(3, layout='strava', seed=0)
+    lines = path.read_text().splitlines(keepends=True)
+    lines[2] = ',' + lines[2].split(',', 1)[1]
+    path.write_text(''.join(lines))
+
+    store = ActivityStore(str(tmp_path / 'history.arrow'))
+    df, schema, added = store.ingest(open(path, 'rb'))
+    assert added == 3
+    assert activity_keys(df, schema).tolist() == \
+        activity_keys(pd.read_csv(path, dtype=str), schema).tolist()
+    for _ in range(2):
+        df, _, added = store.ingest(open(path, 'rb'))
+        assert added == 0
+        assert len(df) == 3
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from strava_dashboard.table import page_bounds, searchable_columns, table_rows
+
+
+@pytest.mark.parametrize('total, page, expected', [
+    (250, 1, (0, 100, 3)),
+    (250, 3, (200, 250, 3)),      # last, partial page
+    (300, 3, (200, 300, 3)),      # last page exactly full
+    (250, 7, (200, 250, 3)),      # past the end: the last page
+    (250, 0, (0, 100, 3)),        # before the start: the first page
+    (250, -2, (0, 100, 3)),
+    (0, 1, (0, 0, 1)),            # empty frame: one empty page
+    (0, 5, (0, 0, 1)),
+    (1, 1, (0, 1, 1)),
+])
+def test_page_bounds(total, page, expected):
+    assert page_bounds(total, page, page_size=100) == expected
+
+
+def test_pages_cover_every_row_once():
+    total = 1234
+    pages = page_bounds(total, 1, 100)[2]
+    shown = np.concatenate([np.arange(*page_bounds(total, page, 100)[:2]) for page in range(1, pages + 1)])
+    np.testing.assert_array_equal(shown, np.arange(total))
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'Activity Type': pd.Categorical(['Run', 'Ride', 'Trail Run', 'Swim', None]),
+        'Activity Name': ['Morning run', 'Commute', 'Hills', None, 'Evening RUN'],
+        'Distance': [10.0, np.nan, 21.1, 1.5, 5.0],
+    })
+
+
+def test_table_rows_match_pandas(df):
+    assert searchable_columns(df) == ['Activity Type', 'Activity Name']
+    np.testing.assert_array_equal(table_rows(df), np.arange(5))
+    expected = df.reset_index(drop=True).sort_values('Distance', ascending=False, na_position='last').index
+    np.testing.assert_array_equal(table_rows(df, 'Distance', ascending=False), expected)
+    np.testing.assert_array_equal(table_rows(df, search_col='Activity Type', search='run'), [0, 2])
+    np.testing.assert_array_equal(
+        table_rows(df, 'Distance', search_col='Activity Name', search='run'), [4, 0],
+    )
+    assert len(table_rows(df.iloc[:0], 'Distance', search_col='Activity Name', search='x')) == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from strava_dashboard.tracks import project, simplify
+
+
+def _douglas_peucker(x, y, first, last, tolerance):
+    """Kept positions between ``first`` and ``last``, recursively as in the textbook."""
+    best, furthest = 0.0, None
+    for i in range(first + 1, last):
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        length = np.hypot(dx, dy)
+        px, py = x[i] - x[first], y[i] - y[first]
+        distance = abs(dx * py - dy * px) / length if length > 0 else np.hypot(px, py)
+        if distance > best:
+            best, furthest = distance, i
+    if furthest is None or best <= tolerance:
+        return [first, last]
+    left = _douglas_peucker(x, y, first, furthest, tolerance)
+    return left[:-1] + _douglas_peucker(x, y, furthest, last, tolerance)
+
+
+def _route(rng, n):
+    lat = 47 + np.cumsum(rng.normal(0, 5e-5, n))
+    lon = 8 + np.cumsum(rng.normal(0, 5e-5, n))
+    return lat, lon
+
+
+@pytest.mark.parametrize('tolerance', [1.0, 5.0, 25.0])
+def test_simplify_matches_the_recursive_algorithm(rng, tolerance):
+    lat, lon = _route(rng, 1500)
+    x, y = project(lat, lon)
+    expected = _douglas_peucker(x, y, 0, len(lat) - 1, tolerance)
+    assert simplify(lat, lon, tolerance).tolist() == expected
+
+
+def test_dropped_points_stay_within_tolerance(rng):
+    lat, lon = _route(rng, 3000)
+    kept = simplify(lat, lon, 5.0)
+    assert kept[0] == 0 and kept[-1] == len(lat) - 1
+    assert len(kept) < len(lat)
+    x, y = project(lat, lon)
+    for first, last in zip(kept[:-1], kept[1:]):
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        assert np.all(np.abs(dx * py - dy * px) / np.hypot(dx, dy) <= 5.0)
+
+
+def test_straight_and_short_routes():
+    lat = np.linspace(47, 47.01, 200)
+    assert simplify(lat, np.full(200, 8.0)).tolist() == [0, 199]
+    assert simplify(lat[:2], np.full(2, 8.0)).tolist() == [0, 1]
+    # A loop back to the start keeps the point furthest from it
+    loop = np.r_[lat, lat[::-1]]
+    assert simplify(loop, np.full(400, 8.0)).tolist() == [0, 199, 399]
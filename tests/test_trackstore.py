@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from strava_dashboard.tracks import Track, simplified
+from strava_dashboard.trackstore import TrackStore
+
+
+def _track(rng, n=500):
+    time = np.arange(n, dtype='float64')
+    lat = 47 + np.cumsum(rng.normal(0, 1e-4, n))
+    lon = 8 + np.cumsum(rng.normal(0, 1e-4, n))
+    return Track(
+        time=time, lat=lat, lon=lon, elevation=np.zeros(n), distance=time * 3,
+        heart_rate=np.full(n, 140.0), power=np.full(n, np.nan),
+    )
+
+
+def _put(store, tracks, used=()):
+    store.put_many([(key, track, None, None, None, None) for key, track in tracks.items()], used)
+
+
+@pytest.fixture
+def tracks(rng):
+    return {f'track-{i}': _track(rng) for i in range(8)}
+
+
+def test_tracks_round_trip(tmp_path, tracks):
+    store = TrackStore(str(tmp_path))
+    _put(store, tracks)
+    assert len(store) == len(tracks)
+    for key, track in tracks.items():
+        stored = store.get(key)
+        for field in Track._fields:
+            np.testing.assert_allclose(getattr(stored, field), getattr(track, field), rtol=1e-6)
+        assert len(store.get(key, simplified=True).lat) <= len(track.lat)
+    summaries = store.summaries(list(tracks) + ['unknown'])
+    assert summaries.loc['unknown'].isna().all()
+    assert summaries.drop('unknown')['distance'].notna().all()
+
+
+def test_eviction_drops_least_recently_used_tracks(tmp_path, tracks):
+    keys = list(tracks)
+    probe = TrackStore(str(tmp_path / 'probe'))
+    _put(probe, {keys[0]: tracks[keys[0]]})
+    track_size = probe._size()
+
+    # Room for about four tracks
+    store = TrackStore(str(tmp_path / 'store'), max_bytes=int(4.5 * track_size))
+    for key in keys[:5]:
+        _put(store, {key: tracks[key]})
+    store.touch([keys[0]])
+
+    # Over budget: the next append first drops the least recently used
+    # tracks, keeping those in use
+    _put(store, {keys[5]: tracks[keys[5]]}, used=[keys[1]])
+    kept = [key for key in keys[:6] if key in store]
+    assert kept == [keys[0], keys[1], keys[4], keys[5]]
+    assert store._size() <= store.max_bytes
+    for key in kept:
+        np.testing.assert_allclose(store.get(key).lat, tracks[key].lat)
+        np.testing.assert_allclose(store.get(key, simplified=True).lat, simplified(tracks[key]).lat)
+
+    # Another store on the same directory sees the same tracks
+    other = TrackStore(str(tmp_path / 'store'))
+    assert [key for key in keys[:6] if key in other] == kept
+    np.testing.assert_allclose(other.get(keys[4]).lon, tracks[keys[4]].lon)